@@ -1,149 +1,323 @@
 import os
+import json
 import uuid
+import mimetypes
 import threading
 import time
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, render_template
+from werkzeug.utils import safe_join
 from flask_cors import CORS
-import yt_dlp
+from job_store import create_job_store
+from scheduler import DownloadScheduler, QueueFull
+from info_cache import InfoCache, cache_key, video_id_from_url
+from content_cache import ContentCache
+from serving import send_download, content_disposition
+from events import ProgressBroker, StreamLimit, max_streams, event_stream, SSE_HEADERS, POLL_INTERVAL
+from tuning import connection_budget, tuned_options
+from zip_stream import stream_zip, unique_name
+from journal import JobJournal, reclaim_partials
+from storage import ExpiryScheduler, StorageJanitor
+from workers import create_runner
+from ydl_pool import preload_yt_dlp
+from search_cache import SearchCache
+from ffmpeg_registry import FFmpegRegistry, AUDIO_FORMATS, audio_postprocessor, best_audio_format
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
 
 # Configuration
 DOWNLOAD_FOLDER = os.path.join(os.getcwd(), 'downloads')
 if not os.path.exists(DOWNLOAD_FOLDER):
     os.makedirs(DOWNLOAD_FOLDER)
 
-# In-memory storage for job statuses
-jobs = {}
+YOUTUBE_EXTRACTOR_ARGS = {
+    'youtube': {
+        'player_client': ['android_vr', 'ios'],
+        'formats': ['missing_pot'],
+    }
+}
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+}
+# Options of /api/formats; the prefetch after a search uses the same ones, so
+# both share info cache entries
+FORMATS_YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'nocheckcertificate': True,
+    'extractor_args': YOUTUBE_EXTRACTOR_ARGS,
+    'http_headers': BROWSER_HEADERS,
+}
+
+# Bitrate (kbps) MP3s are encoded at: YouTube's own audio is around 128-160
+# kbps, more would only make them bigger
+AUDIO_BITRATE = int(os.environ.get('AUDIO_BITRATE', 128))
+
+# Search results per page, and how many of the first page's videos get their
+# formats extracted in the background (0 turns the prefetch off)
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 10))
+SEARCH_PREFETCH = int(os.environ.get('SEARCH_PREFETCH', 2))
+
+# Streaming downloads: how long /api/file waits for the file to appear and
+# how much it sends at a time while following the growing file
+STREAM_WAIT = 60
+STREAM_CHUNK = 256 * 1024
+# Makes the merged MP4 playable while ffmpeg is still writing it
+FRAGMENTED_MP4_ARGS = ['-movflags', '+frag_keyframe+empty_moov+default_base_moof']
+
+# Playlists/channels: videos taken per batch, and how many videos of one
+# batch are queued or downloading at a time
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 200))
+BATCH_PARALLEL = int(os.environ.get('BATCH_PARALLEL', 2))
+
+# Searches with their continuations, so further pages don't search again
+search_cache = SearchCache({
+    'quiet': True,
+    'no_warnings': True,
+    'extractor_args': YOUTUBE_EXTRACTOR_ARGS,
+    'http_headers': BROWSER_HEADERS,
+})
+prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='prefetch')
+prefetching = set()  # URLs queued for or being prefetched
+prefetching_lock = threading.Lock()
+
+# ffmpeg of the Render build (./ffmpeg), of the desktop app in development,
+# or from PATH; found and probed once
+ffmpeg = FFmpegRegistry([
+    os.path.join(os.getcwd(), 'ffmpeg', 'ffmpeg'),
+    os.path.abspath(os.path.join(os.getcwd(), '..', 'python_desktop', 'bin', 'ffmpeg.exe')),
+    'ffmpeg',
+])
+# Job statuses; set JOB_STORE=sqlite to share them between gunicorn workers.
+# Identical downloads in flight share one job there too: the leader runs it
+# and every job of jobs.members(leader) mirrors its status
+jobs = create_job_store(os.path.join(DOWNLOAD_FOLDER, 'jobs.sqlite3'))
+scheduler = DownloadScheduler()
+# yt-dlp runs in this process's threads, or with JOB_EXECUTION=process in
+# worker processes that don't compete with request handling for the GIL
+runner = create_runner(scheduler.slots, scheduler.ffmpeg_slots)
+# Info dicts from /api/formats, reused by the download of the same video
+info_cache = InfoCache(disk_dir=os.environ.get('INFO_CACHE_DIR'))
+# Finished files, served again to every later request for the same download
+content_cache = ContentCache(
+    os.path.join(DOWNLOAD_FOLDER, 'cache'),
+    int(os.environ.get('CONTENT_CACHE_QUOTA_MB', 1024)) * 1024 * 1024
+)
 
-def update_job_status(job_id, status, text=None, progress=0, filename=None, downloaded_bytes="0 MB", total_bytes="? MB"):
-    jobs[job_id] = {
+# Pushes status changes to /api/events streams
+broker = ProgressBroker()
+# gunicorn's --threads per worker; render.yaml passes the same WEB_THREADS
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+# Open /api/events streams of this worker, each holding a server thread
+stream_limit = StreamLimit(max_streams(WEB_THREADS))
+# Job transitions on disk, so a restart resumes interrupted jobs
+journal = JobJournal(os.environ.get('JOB_JOURNAL_PATH', os.path.join(DOWNLOAD_FOLDER, 'journal.jsonl')))
+# Job records are dropped, with their leftover files, the moment they expire
+expiry = ExpiryScheduler(lambda job_id: expire_job(job_id))
+# Everything under downloads/ counts against DOWNLOADS_QUOTA_MB; past it the
+# least recently used cached files are evicted
+janitor = StorageJanitor(DOWNLOAD_FOLDER, int(os.environ.get('DOWNLOADS_QUOTA_MB', 2048)) * 1024 * 1024)
+# How often reconcile() looks for what the expiry heap cannot see
+RECONCILE_INTERVAL = 600
+
+def update_job_status(job_id, status, text=None, progress=0, filename=None, downloaded_bytes=None, total_bytes=None, stream_path=None, speed=None, eta=None):
+    # Progress is stored as raw numbers; job_status() formats it for clients
+    job = {
         'status': status,
         'text': text,
         'progress': progress,
         'filename': filename,
-        'downloaded_mb': downloaded_bytes,
-        'total_mb': total_bytes,
+        'downloaded_bytes': downloaded_bytes,
+        'total_bytes': total_bytes,
+        'speed': speed,
+        'eta': eta,
+        # File that is being written right now and may be streamed to clients
+        'stream_path': stream_path,
         'timestamp': time.time()
     }
+    for shared_id in jobs.members(job_id):
+        jobs.set(shared_id, job)
+        expiry.schedule(shared_id, job['timestamp'] + jobs.ttl)
+        if status in ('completed', 'error'):
+            journal.record(shared_id, status, text=text, filename=filename)
+    broker.publish()
+
+def finish_job(job_id, download_key, *args, **kwargs):
+    # The shared download is released before the final status is written: a
+    # job that joined until then gets it, a later one starts over (and finds
+    # the file in the content cache)
+    for shared_id in jobs.release(download_key, job_id):
+        update_job_status(shared_id, *args, **kwargs)
+
+def format_has_audio(url, format_id):
+    # Uses the info dict cached by /api/formats, extracting only on a miss
+    try:
+        info = extract_info_cached({'quiet': True, 'extractor_args': YOUTUBE_EXTRACTOR_ARGS}, url)
+    except Exception:
+        return False  # the download itself will report the extraction error
+    return any(f.get('format_id') == format_id and f.get('acodec') not in (None, 'none')
+               for f in info.get('formats', []))
+
+def extract_info_cached(ydl_opts, url):
+    return info_cache.get_or_extract(
+        cache_key(url, ydl_opts.get('extractor_args')),
+        lambda: runner.extract(ydl_opts, url)
+    )
+
+def download_relpath(path):
+    return os.path.relpath(path, DOWNLOAD_FOLDER).replace(os.sep, '/')
+
+def format_duration(seconds):
+    if seconds is None: return None
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
 
 def format_bytes(b):
     if b is None: return "? MB"
     return f"{b / (1024 * 1024):.2f} MB"
 
-def progress_hook(job_id):
-    def hook(d):
-        if d['status'] == 'downloading':
-            p_str = d.get('_percent_str', '0%').replace('%', '').strip()
-            downloaded = format_bytes(d.get('downloaded_bytes'))
-            total = format_bytes(d.get('total_bytes') or d.get('total_bytes_estimate'))
-            
-            try:
-                progress = float(p_str)
-            except:
-                progress = 0
-                
+def job_progress(job_id, stream):
+    # Applies the events of workers.progress_hooks to the job's status
+    piped = None  # merged file that ffmpeg writes while the streams download
+
+    def emit(event, *args):
+        nonlocal piped
+        if event == 'downloading':
+            percent, downloaded, total, speed, eta, tmpfilename = args
+            if stream == 'fmp4' and piped:
+                stream_path = download_relpath(piped)
+            elif stream == 'progressive' and tmpfilename:
+                stream_path = download_relpath(tmpfilename)
+            else:
+                stream_path = None
             update_job_status(
-                job_id, 
-                'downloading', 
-                f"Сваляне: {p_str}% ({downloaded} от {total})", 
-                progress,
+                job_id,
+                'downloading',
+                progress=percent,
                 downloaded_bytes=downloaded,
-                total_bytes=total
+                total_bytes=total,
+                speed=speed,
+                eta=eta,
+                stream_path=stream_path
             )
-        elif d['status'] == 'finished':
+        elif event == 'piping':
+            piped = args[0]
+        elif event == 'finished' and piped:
+            pass  # one of the piped streams; the other may still be downloading
+        elif event == 'finished':
             update_job_status(job_id, 'processing', "Обработка и сливане на файловете...", 100)
-    return hook
+        elif event == 'merging' and stream == 'fmp4':
+            update_job_status(job_id, 'processing', "Обработка и сливане на файловете...", 100,
+                              stream_path=download_relpath(args[0]))
+    return emit
 
-def download_task(job_id, url, format_opts):
+def download_task(job_id, url, format_opts, download_key):
+    gate = scheduler.postprocess_gate()
+    update_job_status(job_id, 'starting', "Инициализиране...")
     try:
-        # Detect ffmpeg (common Render path vs local)
-        ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg', 'ffmpeg')
-        
-        # Check if we are in dev environment and ffmpeg is in sibling python_desktop/bin
-        if not os.path.exists(ffmpeg_path):
-            potential_path = os.path.abspath(os.path.join(os.getcwd(), '..', 'python_desktop', 'bin', 'ffmpeg.exe'))
-            if os.path.exists(potential_path):
-                ffmpeg_path = potential_path
-        
-        if not os.path.exists(ffmpeg_path):
-            ffmpeg_path = 'ffmpeg' # Fallback to system path
-
         ydl_opts = {
             'outtmpl': os.path.join(DOWNLOAD_FOLDER, f'{job_id}_%(title)s.%(ext)s'),
-            'progress_hooks': [progress_hook(job_id)],
             'format': format_opts.get('format_id', 'best'),
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['android_vr', 'ios'],
-                    'formats': ['missing_pot'],
-                }
-            },
+            'extractor_args': YOUTUBE_EXTRACTOR_ARGS,
             'nocheckcertificate': True,
             'quiet': False,
             'no_warnings': False,
             'http_headers': {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             },
-            'ffmpeg_location': ffmpeg_path,
+            'ffmpeg_location': ffmpeg.location,
             'merge_output_format': 'mp4',
             'postprocessors': format_opts.get('postprocessors', [])
         }
+        if format_opts.get('stream') == 'progressive':
+            # Fixups rewrite the finished file; streamed bytes must stay final
+            ydl_opts['fixup'] = 'never'
+        elif format_opts.get('stream') == 'fmp4':
+            ydl_opts['postprocessor_args'] = {'merger+ffmpeg_o': FRAGMENTED_MP4_ARGS}
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
-            
-            if format_opts.get('is_audio'):
-                filename = os.path.splitext(filename)[0] + '.mp3'
+        info = extract_info_cached(ydl_opts, url)
+        audio = format_opts.get('audio')
+        if audio:
+            postprocessor = audio_postprocessor(ffmpeg.get(), audio['format'], audio['bitrate'],
+                                                best_audio_format(info))
+            ydl_opts['postprocessors'] = [postprocessor] if postprocessor else []
+        with connection_budget.lease() as connections:
+            filename = runner.download(job_id, {**ydl_opts, **tuned_options(connections)}, info,
+                                       job_progress(job_id, format_opts.get('stream')), gate)
 
-            update_job_status(job_id, 'completed', "Завършено успешно!", 100, os.path.basename(filename))
+        name = os.path.basename(filename).replace(f'{job_id}_', '', 1)
+        cached_path = content_cache.store(ContentCache.key(download_key), filename, name)
+        enforce_quota()
+        finish_job(job_id, download_key, 'completed', "Завършено успешно!", 100, download_relpath(cached_path))
             
     except Exception as e:
-        update_job_status(job_id, 'error', f"Грешка: {str(e)}")
+        finish_job(job_id, download_key, 'error', f"Грешка: {str(e)}")
+    finally:
+        gate.release()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def prefetch_formats(url):
+    try:
+        extract_info_cached(FORMATS_YDL_OPTS, url)
+    except Exception:
+        pass  # /api/formats reports the error if the video is opened
+    finally:
+        with prefetching_lock:
+            prefetching.discard(url)
+
+def schedule_prefetch(urls):
+    # Extracts formats of search results ahead of the click on one of them;
+    # at most a couple are queued, so fast typing doesn't pile up extractions
+    for url in urls:
+        with prefetching_lock:
+            if url in prefetching or len(prefetching) >= 2 * SEARCH_PREFETCH:
+                continue
+            prefetching.add(url)
+        if info_cache.get(cache_key(url, YOUTUBE_EXTRACTOR_ARGS)) is not None:
+            with prefetching_lock:
+                prefetching.discard(url)
+            continue
+        prefetch_pool.submit(prefetch_formats, url)
+
 @app.route('/api/search', methods=['POST'])
 def search_videos():
     data = request.json
     query = data.get('query')
     if not query:
         return jsonify({'error': 'Моля въведете ключова дума'}), 400
+    # The cursor is the next_cursor of the previous page
+    cursor = str(data.get('cursor') or 0)
+    if not cursor.isdigit():
+        return jsonify({'error': 'Невалиден курсор'}), 400
 
     try:
-        ydl_opts = {
-            'extract_flat': True,
-            'quiet': True,
-            'no_warnings': True,
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['android_vr', 'ios'],
-                    'formats': ['missing_pot'],
-                }
-            },
-            'http_headers': {
-                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            }
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            search_result = ydl.extract_info(f"ytsearch5:{query}", download=False)
-            results = []
-            
-            if 'entries' in search_result:
-                for entry in search_result['entries']:
-                    results.append({
-                        'id': entry.get('id'),
-                        'title': entry.get('title'),
-                        'thumbnail': entry.get('thumbnails')[0]['url'] if entry.get('thumbnails') else None,
-                        'channel': entry.get('uploader'),
-                        'duration': entry.get('duration_string'),
-                        'url': f"https://www.youtube.com/watch?v={entry.get('id')}"
-                    })
-            return jsonify(results)
+        # Runs here even with JOB_EXECUTION=process: the search continuation
+        # lives in this process between pages
+        entries, next_offset = search_cache.page(query, int(cursor), SEARCH_PAGE_SIZE)
+        results = []
+        
+        for entry in entries:
+            results.append({
+                'id': entry.get('id'),
+                'title': entry.get('title'),
+                'thumbnail': entry.get('thumbnails')[0]['url'] if entry.get('thumbnails') else None,
+                'channel': entry.get('uploader') or entry.get('channel'),
+                'duration': entry.get('duration_string') or format_duration(entry.get('duration')),
+                'url': f"https://www.youtube.com/watch?v={entry.get('id')}"
+            })
+        if cursor == '0' and SEARCH_PREFETCH:
+            schedule_prefetch([r['url'] for r in results[:SEARCH_PREFETCH]])
+        return jsonify({
+            'results': results,
+            'next_cursor': str(next_offset) if next_offset is not None else None
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -160,119 +334,493 @@ def get_formats():
         url = url_or_id
 
     try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'nocheckcertificate': True,
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['android_vr', 'ios'],
-                    'formats': ['missing_pot'],
-                }
-            },
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            }
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            formats = []
-            
-            for f in info.get('formats', []):
-                if f.get('vcodec') != 'none':
-                    res = f.get('height')
-                    if res in [360, 480, 720, 1080]:
-                        formats.append({
-                            'id': f.get('format_id'),
-                            'ext': f.get('ext'),
-                            'quality': f'{res}p',
-                            'note': f.get('format_note', ''),
-                            'filesize': f.get('filesize_approx') or f.get('filesize'),
-                            'has_audio': f.get('acodec') != 'none'
-                        })
-            
-            formats.sort(key=lambda x: (int(x['quality'].replace('p', '')), x['has_audio']), reverse=True)
-            seen_quality = set()
-            unique_formats = []
-            for f in formats:
-                if f['quality'] not in seen_quality:
-                    unique_formats.append(f)
-                    seen_quality.add(f['quality'])
-
-            return jsonify({
-                'title': info.get('title'),
-                'thumbnail': info.get('thumbnail'),
-                'formats': unique_formats
-            })
+        info = extract_info_cached(FORMATS_YDL_OPTS, url)
+        formats = []
+        
+        for f in info.get('formats', []):
+            if f.get('vcodec') != 'none':
+                res = f.get('height')
+                if res in [360, 480, 720, 1080]:
+                    formats.append({
+                        'id': f.get('format_id'),
+                        'ext': f.get('ext'),
+                        'quality': f'{res}p',
+                        'note': f.get('format_note', ''),
+                        'filesize': f.get('filesize_approx') or f.get('filesize'),
+                        'has_audio': f.get('acodec') != 'none'
+                    })
+        
+        formats.sort(key=lambda x: (int(x['quality'].replace('p', '')), x['has_audio']), reverse=True)
+        seen_quality = set()
+        unique_formats = []
+        for f in formats:
+            if f['quality'] not in seen_quality:
+                unique_formats.append(f)
+                seen_quality.add(f['quality'])
+
+        return jsonify({
+            'title': info.get('title'),
+            'thumbnail': info.get('thumbnail'),
+            'formats': unique_formats
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def format_options(type, format_id=None, url=None, stream=False, audio_format='auto'):
+    # Picks the cheapest postprocessing the ffmpeg found can do; without ffmpeg
+    # (or the needed encoder/muxer) files are kept as YouTube serves them
+    caps = ffmpeg.get()
+    can_merge = caps is not None and caps.can_mux('mp4')
+    if type == 'audio' and (stream or caps is None):
+        # No MP3 conversion, so the downloaded file is the final file
+        return {
+            'format_id': 'bestaudio[ext=m4a]/bestaudio',
+            'stream': 'progressive'
+        }
+    elif type == 'audio':
+        # Copy or MP3 is decided by download_task once the source is known
+        return {
+            'format_id': 'bestaudio/best',
+            'audio': {'format': audio_format, 'bitrate': AUDIO_BITRATE}
+        }
+    elif (stream or not can_merge) and format_id and format_has_audio(url, format_id):
+        return {
+            'format_id': format_id,
+            'stream': 'progressive'
+        }
+    elif not can_merge:
+        # A single file that has both video and audio
+        return {
+            'format_id': 'best',
+            'stream': 'progressive'
+        }
+    elif stream:
+        return {
+            'format_id': f'{format_id or "bestvideo"}+bestaudio[ext=m4a]/best',
+            'stream': 'fmp4'
+        }
+    else:
+        return {
+            'format_id': f'{format_id}+bestaudio/best' if format_id else 'bestvideo+bestaudio/best'
+        }
+
+def queue_download(job_id, url, format_opts, priority):
+    """Starts the download for an already created job; returns its queue position.
+
+    A download already in the content cache completes at once, and one that is
+    in flight already is joined instead of started again. Raises QueueFull
+    (the job record is left to the caller).
+    """
+    download_key = f"{video_id_from_url(url)}|{json.dumps(format_opts, sort_keys=True)}"
+    cached_path = content_cache.lookup(ContentCache.key(download_key))
+    if cached_path:
+        update_job_status(job_id, 'completed', "Завършено успешно!", 100, download_relpath(cached_path))
+        return None
+
+    # Joined in the job store, so identical requests share the download
+    # whichever gunicorn worker they reach (with JOB_STORE=sqlite)
+    leader_id = jobs.join(download_key, job_id)
+    if leader_id != job_id:
+        journal.record(job_id, 'queued', url=url, format_opts=format_opts, priority=priority)
+        return scheduler.position(leader_id)
+
+    try:
+        scheduler.submit(job_id, download_task, url, format_opts, download_key, priority=priority)
+    except QueueFull:
+        # Jobs that joined in the meantime fail; this job's own record is
+        # left to the caller
+        for shared_id in jobs.release(download_key, job_id):
+            if shared_id != job_id:
+                update_job_status(shared_id, 'error', "Грешка: сървърът е зает, опитайте отново")
+        raise
+    journal.record(job_id, 'queued', url=url, format_opts=format_opts, priority=priority)
+    return scheduler.position(job_id)
+
 @app.route('/api/download', methods=['POST'])
 def start_download():
     data = request.json
     url = data.get('url')
     type = data.get('type') 
     format_id = data.get('format_id')
+    # Streaming: the client may fetch /api/file while the file is still downloading
+    stream = bool(data.get('stream'))
+    # Audio: 'auto', 'original' (the native stream, not re-encoded) or 'mp3'
+    audio_format = data.get('audio_format') or 'auto'
     
     if not url:
         return jsonify({'error': 'URL е задължителен'}), 400
+    if audio_format not in AUDIO_FORMATS:
+        return jsonify({'error': 'Невалиден аудио формат'}), 400
 
     job_id = str(uuid.uuid4())
-    update_job_status(job_id, 'starting', "Инициализиране...")
+    update_job_status(job_id, 'queued', "В опашка...")
 
-    format_opts = {}
-    if type == 'audio':
-        format_opts = {
-            'format_id': 'bestaudio/best',
-            'is_audio': True,
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }]
-        }
-    else:
-        format_opts = {
-            'format_id': f'{format_id}+bestaudio/best' if format_id else 'bestvideo+bestaudio/best'
-        }
+    # Audio jobs are short, so they skip ahead of queued video merges
+    priority = 0 if type == 'audio' else 1
+    try:
+        position = queue_download(job_id, url, format_options(type, format_id, url, stream, audio_format), priority)
+    except QueueFull as e:
+        jobs.delete(job_id)
+        response = jsonify({'error': 'Сървърът е зает, опитайте отново след малко'})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+
+    return jsonify({'job_id': job_id, 'queue_position': position})
+
+def expand_playlist(url):
+    """Title and videos of a playlist or channel, without extracting each video."""
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'playlistend': BATCH_MAX_ITEMS,
+        'quiet': True,
+        'no_warnings': True,
+        'extractor_args': YOUTUBE_EXTRACTOR_ARGS,
+    }
+    info = runner.extract(ydl_opts, url, remove_private_keys=False)
+    entries = info.get('entries') if info.get('_type') == 'playlist' else [info]
+    items = []
+    for entry in entries or []:
+        if not entry or not entry.get('id') or entry.get('_type') == 'playlist' or entry.get('ie_key', 'Youtube') != 'Youtube':
+            continue  # nested playlists / channel tabs
+        items.append({
+            'id': entry['id'],
+            'title': entry.get('title'),
+            'url': f"https://www.youtube.com/watch?v={entry['id']}"
+        })
+    return info.get('title'), items[:BATCH_MAX_ITEMS]
+
+def run_batch(batch_id, items, format_opts):
+    # Keeps BATCH_PARALLEL items of the batch in the scheduler at a time, so a
+    # long playlist neither fills the queue nor starves single downloads.
+    # Items already in the content cache complete without a download.
+    pending = list(items)
+    active = []
+    version = broker.version
+    touched = time.time()
+    while pending or active:
+        active = [job_id for job_id in active if not is_final(jobs.get(job_id) or {'status': 'error'})]
+        while pending and len(active) < BATCH_PARALLEL:
+            item = pending[0]
+            try:
+                queue_download(item['job_id'], item['url'], format_opts, priority=2)
+            except QueueFull:
+                break  # retried when a queue place frees up
+            pending.pop(0)
+            active.append(item['job_id'])
+        if time.time() - touched > 60:
+            # Waiting items must not expire before their turn comes
+            touched = time.time()
+            for job_id in [batch_id] + [item['job_id'] for item in pending]:
+                jobs.update(job_id, timestamp=touched)
+                expiry.schedule(job_id, touched + jobs.ttl)
+        version = broker.wait(version, POLL_INTERVAL)
+    journal.record(batch_id, 'completed')
+
+@app.route('/api/batch', methods=['POST'])
+def start_batch():
+    data = request.json
+    url = data.get('url')
+    audio_format = data.get('audio_format') or 'auto'
+    if not url:
+        return jsonify({'error': 'URL е задължителен'}), 400
+    if audio_format not in AUDIO_FORMATS:
+        return jsonify({'error': 'Невалиден аудио формат'}), 400
+
+    try:
+        title, entries = expand_playlist(url)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if not entries:
+        return jsonify({'error': 'Няма намерени видеа'}), 404
+
+    batch_id = str(uuid.uuid4())
+    items = []
+    for entry in entries:
+        job_id = str(uuid.uuid4())
+        update_job_status(job_id, 'queued', "В опашка...")
+        items.append(dict(entry, job_id=job_id))
+    jobs.set(batch_id, {
+        'status': 'batch',
+        'text': title,
+        'progress': 0,
+        'filename': None,
+        'items': items,
+        'timestamp': time.time()
+    })
+    expiry.schedule(batch_id, time.time() + jobs.ttl)
+    format_opts = format_options(data.get('type'), data.get('format_id'), audio_format=audio_format)
+    journal.record(batch_id, 'batch', title=title, items=items, format_opts=format_opts)
+    threading.Thread(target=run_batch, args=(batch_id, items, format_opts), daemon=True).start()
+    return jsonify({'batch_id': batch_id, 'title': title, 'items': items})
+
+def get_batch_record(batch_id):
+    batch = jobs.get(batch_id)
+    return batch if batch and batch['status'] == 'batch' else None
+
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    batch = get_batch_record(batch_id)
+    if not batch:
+        return jsonify({'error': 'Задачата не е намерена'}), 404
+    items = [dict(item, **(job_status(item['job_id']) or {'status': 'error', 'text': 'Задачата не е намерена'}))
+             for item in batch['items']]
+    return jsonify({
+        'batch_id': batch_id,
+        'title': batch['text'],
+        'total': len(items),
+        'completed': sum(1 for item in items if item['status'] == 'completed'),
+        'failed': sum(1 for item in items if item['status'] == 'error'),
+        'items': items
+    })
+
+@app.route('/api/batch/<batch_id>/events', methods=['GET'])
+def batch_events(batch_id):
+    batch = get_batch_record(batch_id)
+    if not batch:
+        return jsonify({'error': 'Задачата не е намерена'}), 404
+    return events_response([item['job_id'] for item in batch['items']])
+
+def finished_files(job_ids):
+    """(name, path) of each job's file as soon as it completes; failed jobs are skipped."""
+    remaining = list(job_ids)
+    used_names = set()
+    version = broker.version
+    while remaining:
+        for job_id in list(remaining):
+            job = jobs.get(job_id)
+            if job and job['status'] == 'completed':
+                remaining.remove(job_id)
+                path = safe_join(DOWNLOAD_FOLDER, job['filename'])
+                if path:
+                    yield unique_name(os.path.basename(path), used_names), path
+            elif not job or job['status'] == 'error':
+                remaining.remove(job_id)
+        if remaining:
+            version = broker.wait(version, POLL_INTERVAL)
 
-    thread = threading.Thread(target=download_task, args=(job_id, url, format_opts))
-    thread.start()
+@app.route('/api/batch/<batch_id>/zip', methods=['GET'])
+def batch_zip(batch_id):
+    # Sent while the batch runs: each file goes into the archive once it is ready
+    batch = get_batch_record(batch_id)
+    if not batch:
+        return jsonify({'error': 'Задачата не е намерена'}), 404
+    response = Response(stream_zip(finished_files([item['job_id'] for item in batch['items']])),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = content_disposition(f"{batch['text'] or 'playlist'}.zip")
+    return response
+
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return None
+    if job['status'] == 'queued':
+        job['queue_position'] = scheduler.position(job_id)
+    job['downloaded_mb'] = format_bytes(job.get('downloaded_bytes') or 0)
+    job['total_mb'] = format_bytes(job.get('total_bytes'))
+    if job['status'] == 'downloading' and not job['text']:
+        job['text'] = f"Сваляне: {job['progress']}% ({job['downloaded_mb']} от {job['total_mb']})"
+        if job.get('speed'):
+            job['text'] += f", {format_bytes(job['speed'])}/s"
+        if job.get('eta') is not None:
+            job['text'] += f", остават {int(job['eta'])} сек."
+    return job
 
-    return jsonify({'job_id': job_id})
+def is_final(job):
+    return job['status'] in ('completed', 'error')
 
 @app.route('/api/status/<job_id>', methods=['GET'])
 def get_status(job_id):
-    job = jobs.get(job_id)
+    job = job_status(job_id)
     if not job:
         return jsonify({'error': 'Задачата не е намерена'}), 404
     return jsonify(job)
 
+def events_response(job_ids):
+    # Past the limit the page gets a 503 and polls /api/status instead, so
+    # open streams never take every thread from the other routes
+    if not stream_limit.acquire():
+        response = jsonify({'error': 'Твърде много отворени връзки, опитайте /api/status'})
+        response.headers['Retry-After'] = str(int(POLL_INTERVAL))
+        return response, 503
+    response = Response(event_stream(job_ids, job_status, is_final, broker),
+                        mimetype='text/event-stream', headers=SSE_HEADERS)
+    # Also runs when the client goes away before the stream ends
+    response.call_on_close(stream_limit.release)
+    return response
+
+@app.route('/api/events/<job_id>', methods=['GET'])
+def job_events(job_id):
+    return events_response([job_id])
+
+@app.route('/api/events', methods=['GET'])
+def jobs_events():
+    # One stream for many jobs: /api/events?jobs=<id>,<id>,...
+    job_ids = [j for j in request.args.get('jobs', '').split(',') if j][:50]
+    if not job_ids:
+        return jsonify({'error': 'Няма задачи'}), 400
+    return events_response(job_ids)
+
 @app.route('/api/file/<job_id>', methods=['GET'])
 def download_file(job_id):
     job = jobs.get(job_id)
+    if job and job['status'] != 'completed' and request.args.get('stream'):
+        return stream_file(job_id)
     if not job or job['status'] != 'completed':
         return jsonify({'error': 'Файлът не е готов'}), 404
-    return send_from_directory(DOWNLOAD_FOLDER, job['filename'], as_attachment=True)
+    file_path = safe_join(DOWNLOAD_FOLDER, job['filename'])
+    if not file_path or not os.path.isfile(file_path):
+        return jsonify({'error': 'Файлът не е намерен'}), 404
+    return send_download(file_path, os.path.basename(file_path), DOWNLOAD_FOLDER)
+
+def stream_file(job_id):
+    # Wait until the job writes its output file (or finishes)
+    deadline = time.time() + STREAM_WAIT
+    while True:
+        job = jobs.get(job_id)
+        if not job or job['status'] == 'error':
+            return jsonify({'error': 'Файлът не е готов'}), 404
+        if job['status'] == 'completed':
+            return download_file(job_id)
+        path = job['stream_path'] and safe_join(DOWNLOAD_FOLDER, job['stream_path'])
+        if path:
+            try:
+                f = open(path, 'rb')
+                break
+            except OSError:
+                pass  # renamed in the meantime; the next status tells where it went
+        if time.time() > deadline:
+            return jsonify({'error': 'Файлът не е готов'}), 404
+        time.sleep(0.25)
+
+    # "<job id>_<title>.m4a.part" / "<job id>_<title>.temp.mp4" -> "<title>.m4a" / "<title>.mp4"
+    name = os.path.basename(path).split('_', 1)[-1]
+    if name.endswith('.part'):
+        name = name[:-len('.part')]
+    name = name.replace('.temp.', '.')
+    response = Response(follow_file(job_id, f, job['stream_path']),
+                        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+    response.headers['Content-Disposition'] = content_disposition(name)
+    return response
+
+def follow_file(job_id, f, stream_path):
+    """Yields a file while yt-dlp/ffmpeg is still writing it, until the writer is done."""
+    with f:
+        while True:
+            chunk = f.read(STREAM_CHUNK)
+            if chunk:
+                yield chunk
+                continue
+            job = jobs.get(job_id)
+            if not job or job['status'] == 'error':
+                # Abort the connection so the client doesn't keep a truncated file
+                raise IOError(f"Download {job_id} failed while streaming")
+            if job['status'] == 'completed' or job['stream_path'] != stream_path:
+                # Renamed or replaced, but our descriptor still has the whole file
+                while chunk := f.read(STREAM_CHUNK):
+                    yield chunk
+                return
+            time.sleep(0.25)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    # hits/misses are counted per worker process
+    return jsonify(dict(content_cache.stats(), worker=os.getpid()))
+
+@app.route('/api/storage/stats', methods=['GET'])
+def storage_stats():
+    # Reclaimed bytes are counted per worker process
+    return jsonify(dict(janitor.stats(), scheduled_expiries=len(expiry), worker=os.getpid()))
+
+def expire_job(job_id):
+    job = jobs.get(job_id)
+    if job and job['timestamp'] + jobs.ttl > time.time():
+        # Updated by another worker in the meantime
+        expiry.schedule(job_id, job['timestamp'] + jobs.ttl)
+        return
+    jobs.delete(job_id)
+    # Finished files live in content_cache; what is left here are partials
+    for path in janitor.files_of(job_id):
+        janitor.remove(path, 'expired')
+
+def enforce_quota():
+    usage = janitor.usage()
+    if usage <= janitor.quota_bytes:
+        return
+    entries = content_cache.entries()
+    cache_bytes = sum(size for _, size, _ in entries)
+    # Shrink the cache until all of downloads/ is back under the low watermark
+    target = max(0, cache_bytes - (usage - int(janitor.quota_bytes * janitor.low_watermark)))
+    remaining = content_cache.evict(target_bytes=target)
+    janitor.count('quota', cache_bytes - remaining, len(entries) - len(content_cache.entries()))
+
+def reconcile():
+    # Records the expiry heap of this worker never saw (other or crashed workers)
+    for job_id, job in jobs.expired():
+        expire_job(job_id)
+    # Files of jobs nobody knows about, e.g. partials of a crashed worker
+    now = time.time()
+    for job_id, path in janitor.job_files():
+        try:
+            idle = now - os.path.getmtime(path)
+        except OSError:
+            continue
+        if idle > jobs.ttl and jobs.get(job_id) is None:
+            janitor.remove(path, 'orphaned')
+    enforce_quota()
 
 def cleanup():
     while True:
-        now = time.time()
-        for job_id in list(jobs.keys()):
-            if now - jobs[job_id]['timestamp'] > 3600:
-                filename = jobs[job_id].get('filename')
-                if filename:
-                    file_path = os.path.join(DOWNLOAD_FOLDER, filename)
-                    if os.path.exists(file_path):
-                        try:
-                            os.remove(file_path)
-                        except:
-                            pass
-                del jobs[job_id]
-        time.sleep(300)
-
-cleanup_thread = threading.Thread(target=cleanup, daemon=True)
-cleanup_thread.start()
+        reconcile()
+        time.sleep(RECONCILE_INTERVAL)
+
+def resume_jobs():
+    # Replays the journal: finished jobs stay servable, and jobs interrupted by
+    # a restart are queued again. yt-dlp continues from their .part files,
+    # because the output names start with the unchanged job id.
+    recovered, claimed = journal.recover()
+    for job_id, entry in recovered.items():
+        if entry['state'] in ('completed', 'error') and not jobs.get(job_id):
+            jobs.set(job_id, {
+                'status': entry['state'],
+                'text': entry.get('text'),
+                'progress': 100 if entry['state'] == 'completed' else 0,
+                'filename': entry.get('filename'),
+                'stream_path': None,
+                'timestamp': entry['at']
+            })
+            expiry.schedule(job_id, entry['at'] + jobs.ttl)
+
+    for job_id in claimed:
+        entry = recovered[job_id]
+        if entry['state'] == 'batch':
+            # Items that were handed to the scheduler are resumed on their own
+            pending = [item for item in entry['items'] if item['job_id'] not in recovered]
+            for item in pending:
+                update_job_status(item['job_id'], 'queued', "В опашка...")
+            jobs.set(job_id, {'status': 'batch', 'text': entry['title'], 'progress': 0, 'filename': None,
+                              'items': entry['items'], 'timestamp': time.time()})
+            expiry.schedule(job_id, time.time() + jobs.ttl)
+            threading.Thread(target=run_batch, args=(job_id, pending, entry['format_opts']), daemon=True).start()
+            continue
+        update_job_status(job_id, 'queued', "Възобновяване...")
+        try:
+            queue_download(job_id, entry['url'], entry['format_opts'], entry['priority'])
+        except QueueFull:
+            update_job_status(job_id, 'error', "Грешка: сървърът е зает, опитайте отново")
+
+    freed, files = reclaim_partials(DOWNLOAD_FOLDER, recovered)
+    janitor.count('orphaned', freed, files)
+    if claimed or freed:
+        print(f"Journal: resumed {len(claimed)} job(s), freed {freed / (1024 * 1024):.1f} MB of partial files")
+
+# With JOB_EXECUTION=process under `python app.py`, worker processes import
+# this script again as __mp_main__; only the server itself starts up
+if __name__ != '__mp_main__':
+    preload_yt_dlp()
+    resume_jobs()
+
+    cleanup_thread = threading.Thread(target=cleanup, daemon=True)
+    cleanup_thread.start()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,107 @@
+import os
+import hashlib
+import threading
+
+
+class ContentCache:
+    """Finished downloads stored once per (video id, format, postprocessors).
+
+    Each entry is a directory `<root>/<key>/` holding the single output file.
+    The file's mtime is bumped on every hit, and entries are evicted
+    least-recently-used first once the cache grows past quota_bytes. All state
+    lives on disk, so every gunicorn worker sees the same entries.
+    """
+
+    def __init__(self, root, quota_bytes):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(download_key):
+        return hashlib.sha256(download_key.encode()).hexdigest()[:32]
+
+    def _entry_file(self, key):
+        entry_dir = os.path.join(self.root, key)
+        try:
+            names = [n for n in os.listdir(entry_dir) if not n.endswith('.tmp')]
+        except OSError:
+            return None
+        return os.path.join(entry_dir, names[0]) if names else None
+
+    def lookup(self, key):
+        """Path of the cached file for key (and marks it recently used), or None."""
+        path = self._entry_file(key)
+        if path:
+            try:
+                os.utime(path)
+            except OSError:
+                path = None  # evicted by another worker in the meantime
+        with self._lock:
+            if path:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return path
+
+    def store(self, key, path, name):
+        """Moves a finished download into the cache under the given file name."""
+        entry_dir = os.path.join(self.root, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        cached_path = os.path.join(entry_dir, name)
+        os.replace(path, cached_path)
+        self.evict(keep=key)
+        return cached_path
+
+    def entries(self):
+        """(mtime, size, key) of every cache entry, oldest first."""
+        entries = []
+        for key in os.listdir(self.root):
+            path = self._entry_file(key)
+            if path is None:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, key))
+        entries.sort()
+        return entries
+
+    def remove(self, key):
+        entry_dir = os.path.join(self.root, key)
+        try:
+            for name in os.listdir(entry_dir):
+                os.remove(os.path.join(entry_dir, name))
+            os.rmdir(entry_dir)
+        except OSError:
+            pass
+
+    def evict(self, keep=None, target_bytes=None):
+        """Removes least recently used entries until the cache fits its quota
+        (or target_bytes, when space is needed elsewhere); returns the new size."""
+        limit = self.quota_bytes if target_bytes is None else target_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= limit:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= size
+        return total
+
+    def stats(self):
+        entries = self.entries()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'quota_bytes': self.quota_bytes,
+            }
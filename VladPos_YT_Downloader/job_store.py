@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# How long a job (and its file) is kept after its last status change
+JOB_TTL = 3600
+# A download led by a job in one of these states can't be joined any more
+FINAL_STATUSES = ('completed', 'error')
+
+
+class MemoryJobStore:
+    """Job storage local to the current process (default, single worker)."""
+
+    def __init__(self, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._jobs = {}
+        self._downloads = {}  # download key -> leader job id
+        self._members = {}  # leader job id -> job ids sharing its download
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def set(self, job_id, job):
+        with self._lock:
+            self._jobs[job_id] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._members.pop(job_id, None)
+
+    def join(self, key, job_id):
+        """Lets job_id share the download `key` with the job running it; returns that job's id.
+
+        Without a running job (or with a finished one) job_id becomes the
+        leader of the download and gets its own id back. A job that joins gets
+        a copy of the leader's record.
+        """
+        with self._lock:
+            leader_id = self._downloads.get(key)
+            leader = self._jobs.get(leader_id)
+            if leader is None or leader['status'] in FINAL_STATUSES:
+                self._downloads[key] = job_id
+                self._members[job_id] = [job_id]
+                return job_id
+            self._members.setdefault(leader_id, [leader_id]).append(job_id)
+            self._jobs[job_id] = dict(leader)
+            return leader_id
+
+    def members(self, job_id):
+        """Ids of the jobs sharing job_id's download, job_id included."""
+        with self._lock:
+            return list(self._members.get(job_id, [job_id]))
+
+    def release(self, key, job_id):
+        """Ends the download `key` led by job_id; returns the ids that shared it.
+
+        Later joins start a new download.
+        """
+        with self._lock:
+            if self._downloads.get(key) == job_id:
+                del self._downloads[key]
+            return self._members.pop(job_id, [job_id])
+
+    def expired(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return [(job_id, dict(job)) for job_id, job in self._jobs.items()
+                    if job['timestamp'] + self.ttl <= now]
+
+    def items(self):
+        with self._lock:
+            return [(job_id, dict(job)) for job_id, job in self._jobs.items()]
+
+
+class SQLiteJobStore:
+    """Job storage in a SQLite database in WAL mode, shared by every gunicorn worker.
+
+    Downloads shared by several jobs are tracked here as well, so identical
+    requests join one download whichever worker they reach.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            filename TEXT,
+            expires_at REAL NOT NULL,
+            data TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+        CREATE TABLE IF NOT EXISTS downloads (
+            download_key TEXT PRIMARY KEY,
+            leader_id TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS download_members (
+            leader_id TEXT NOT NULL,
+            job_id TEXT NOT NULL,
+            PRIMARY KEY (leader_id, job_id)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path, ttl=JOB_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        # One connection per thread; a forked worker must not reuse its parent's
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _row(self, job_id, job):
+        return (job_id, job['status'], job.get('filename'), job['timestamp'] + self.ttl, json.dumps(job))
+
+    def get(self, job_id):
+        row = self._connect().execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, job_id, job):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO jobs (job_id, status, filename, expires_at, data) VALUES (?, ?, ?, ?, ?)',
+            self._row(job_id, job)
+        )
+
+    def update(self, job_id, **fields):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            job = json.loads(row[0])
+            job.update(fields)
+            conn.execute(
+                'INSERT OR REPLACE INTO jobs (job_id, status, filename, expires_at, data) VALUES (?, ?, ?, ?, ?)',
+                self._row(job_id, job)
+            )
+            conn.execute('COMMIT')
+            return job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete(self, job_id):
+        conn = self._connect()
+        conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+        conn.execute('DELETE FROM download_members WHERE leader_id = ?', (job_id,))
+
+    def join(self, key, job_id):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT d.leader_id, j.data FROM downloads d JOIN jobs j ON j.job_id = d.leader_id '
+                'WHERE d.download_key = ? AND j.expires_at > ? AND j.status NOT IN (?, ?)',
+                (key, now, *FINAL_STATUSES)
+            ).fetchone()
+            if row is None:
+                # The previous leader, if any, finished or died with its worker
+                conn.execute('INSERT OR REPLACE INTO downloads (download_key, leader_id) VALUES (?, ?)', (key, job_id))
+                leader_id = job_id
+            else:
+                leader_id = row[0]
+                conn.execute(
+                    'INSERT OR REPLACE INTO jobs (job_id, status, filename, expires_at, data) VALUES (?, ?, ?, ?, ?)',
+                    self._row(job_id, json.loads(row[1]))
+                )
+            conn.execute('INSERT OR IGNORE INTO download_members (leader_id, job_id) VALUES (?, ?)', (leader_id, job_id))
+            conn.execute('COMMIT')
+            return leader_id
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def members(self, job_id):
+        rows = self._connect().execute('SELECT job_id FROM download_members WHERE leader_id = ?', (job_id,)).fetchall()
+        return [row[0] for row in rows] or [job_id]
+
+    def release(self, key, job_id):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('SELECT job_id FROM download_members WHERE leader_id = ?', (job_id,)).fetchall()
+            conn.execute('DELETE FROM download_members WHERE leader_id = ?', (job_id,))
+            conn.execute('DELETE FROM downloads WHERE download_key = ? AND leader_id = ?', (key, job_id))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [row[0] for row in rows] or [job_id]
+
+    def expired(self, now=None):
+        now = time.time() if now is None else now
+        rows = self._connect().execute('SELECT job_id, data FROM jobs WHERE expires_at <= ?', (now,)).fetchall()
+        return [(job_id, json.loads(data)) for job_id, data in rows]
+
+    def items(self):
+        rows = self._connect().execute('SELECT job_id, data FROM jobs').fetchall()
+        return [(job_id, json.loads(data)) for job_id, data in rows]
+
+
+def create_job_store(default_path):
+    """Builds the store selected by the JOB_STORE env var ('memory' or 'sqlite')."""
+    backend = os.environ.get('JOB_STORE', 'memory').lower()
+    if backend == 'sqlite':
+        return SQLiteJobStore(os.environ.get('JOB_STORE_PATH', default_path))
+    if backend == 'memory':
+        return MemoryJobStore()
+    raise ValueError(f"Unknown JOB_STORE backend: {backend}")
@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# How long the results of a query are reused, in seconds
+SEARCH_TTL = int(os.environ.get('SEARCH_TTL', 600))
+# Queries kept at once; each holds its YoutubeDL and search continuation
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 100))
+
+
+def normalize_query(query):
+    """Queries that differ only in case or whitespace share one search."""
+    return ' '.join(query.casefold().split())
+
+
+class _Search:
+    def __init__(self, ydl, entries, expires_at):
+        self.ydl = ydl
+        self.entries = entries  # yt-dlp's lazy generator, paging through YouTube
+        self.results = []  # entries fetched so far
+        self.exhausted = False
+        self.expires_at = expires_at
+        self.lock = threading.Lock()
+
+    def fetch(self, count):
+        # Only pulls the results that are not fetched yet, continuing
+        # where the previous page stopped
+        while len(self.results) < count and not self.exhausted:
+            entry = next(self.entries, None)
+            if entry is None:
+                self.exhausted = True
+            else:
+                self.results.append(entry)
+
+
+class SearchCache:
+    """LRU cache of YouTube searches, paged without searching again.
+
+    A query is searched with "ytsearchall:", whose results yt-dlp produces
+    lazily, one YouTube continuation at a time. The generator is kept with the
+    results fetched so far, so page 2..N of the same query (in the same
+    process) continue it instead of starting over. Entries expire after ttl;
+    the least recently used query is dropped past max_entries.
+    """
+
+    def __init__(self, ydl_opts, max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_TTL):
+        self.ydl_opts = dict(ydl_opts, extract_flat=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._searches = OrderedDict()  # normalized query -> _Search
+        self._lock = threading.Lock()
+
+    def page(self, query, offset, size):
+        """(entries, next offset or None) of the flat search results offset..offset+size."""
+        key = normalize_query(query)
+        search = self._get(key)
+        try:
+            with search.lock:
+                search.fetch(offset + size)
+                entries = search.results[offset:offset + size]
+                more = len(search.results) > offset + size or not search.exhausted
+        except Exception:
+            self._drop(key, search)
+            raise
+        return entries, offset + size if more and entries else None
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            search = self._searches.get(key)
+            if search is not None and search.expires_at > now:
+                self._searches.move_to_end(key)
+                return search
+
+        import yt_dlp
+        # Nothing is requested from YouTube until the first page is fetched
+        ydl = yt_dlp.YoutubeDL(self.ydl_opts)
+        result = ydl.extract_info(f'ytsearchall:{key}', download=False, process=False)
+        new = _Search(ydl, iter(result.get('entries') or []), now + self.ttl)
+
+        closing = []
+        with self._lock:
+            search = self._searches.get(key)
+            if search is not None and search.expires_at > now:
+                closing.append(new)  # another request started this search meanwhile
+            else:
+                if search is not None:
+                    closing.append(search)
+                search = self._searches[key] = new
+            self._searches.move_to_end(key)
+            while len(self._searches) > self.max_entries:
+                closing.append(self._searches.popitem(last=False)[1])
+        for old in closing:
+            self._close(old)
+        return search
+
+    def _drop(self, key, search):
+        with self._lock:
+            if self._searches.get(key) is search:
+                del self._searches[key]
+        self._close(search)
+
+    @staticmethod
+    def _close(search):
+        # Waits for a page that is still being fetched with it
+        with search.lock:
+            search.ydl.close()
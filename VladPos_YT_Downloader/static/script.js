@@ -3,6 +3,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const searchBtn = document.getElementById('search-btn');
     const errorMsg = document.getElementById('error-msg');
     const searchResults = document.getElementById('search-results');
+    const loadMoreBtn = document.getElementById('load-more-btn');
+    let searchQuery = '';
+    let searchCursor = null;
 
     // Progress UI
     const progressContainer = document.getElementById('progress-container');
@@ -25,6 +28,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const modalQualitySelect = document.getElementById('modal-quality-select');
     const modalQualityGroup = document.getElementById('modal-quality-group');
     const modalStartDownloadBtn = document.getElementById('modal-start-download-btn');
+    const modalStreamCheckbox = document.getElementById('modal-stream-checkbox');
+    const modalAudioFormatGroup = document.getElementById('modal-audio-format-group');
+    const modalAudioFormatSelect = document.getElementById('modal-audio-format-select');
 
     let currentVideo = null;
 
@@ -63,20 +69,11 @@ document.addEventListener('DOMContentLoaded', () => {
         errorMsg.innerText = '';
         searchResults.classList.add('hidden');
         searchResults.innerHTML = '';
+        loadMoreBtn.classList.add('hidden');
+        searchQuery = query;
 
         try {
-            const response = await fetch('/api/search', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ query })
-            });
-            const data = await response.json();
-            if (data.error) throw new Error(data.error);
-
-            data.forEach(video => {
-                const card = createVideoCard(video);
-                searchResults.appendChild(card);
-            });
+            await loadSearchPage(null);
             searchResults.classList.remove('hidden');
         } catch (err) {
             errorMsg.innerText = "Грешка: " + err.message;
@@ -86,6 +83,37 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Next pages continue the same search on the server
+    async function loadSearchPage(cursor) {
+        const response = await fetch('/api/search', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ query: searchQuery, cursor })
+        });
+        const data = await response.json();
+        if (data.error) throw new Error(data.error);
+
+        data.results.forEach(video => {
+            const card = createVideoCard(video);
+            searchResults.appendChild(card);
+        });
+        searchCursor = data.next_cursor;
+        loadMoreBtn.classList.toggle('hidden', !searchCursor);
+    }
+
+    loadMoreBtn.addEventListener('click', async () => {
+        loadMoreBtn.disabled = true;
+        loadMoreBtn.innerText = 'Зареждане...';
+        try {
+            await loadSearchPage(searchCursor);
+        } catch (err) {
+            errorMsg.innerText = "Грешка: " + err.message;
+        } finally {
+            loadMoreBtn.disabled = false;
+            loadMoreBtn.innerText = 'Още резултати';
+        }
+    });
+
     function createVideoCard(video) {
         const div = document.createElement('div');
         div.className = 'video-card';
@@ -168,14 +196,18 @@ document.addEventListener('DOMContentLoaded', () => {
     modalTypeSelect.addEventListener('change', () => {
         if (modalTypeSelect.value === 'audio') {
             modalQualityGroup.classList.add('hidden');
+            modalAudioFormatGroup.classList.remove('hidden');
         } else {
             modalQualityGroup.classList.remove('hidden');
+            modalAudioFormatGroup.classList.add('hidden');
         }
     });
 
     modalStartDownloadBtn.addEventListener('click', async () => {
         const type = modalTypeSelect.value;
         const format_id = modalQualitySelect.value;
+        const stream = modalStreamCheckbox.checked;
+        const audio_format = modalAudioFormatSelect.value;
 
         hideModal(downloadModal);
         progressContainer.classList.remove('hidden');
@@ -189,11 +221,16 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch('/api/download', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ url: currentVideo.url, type, format_id })
+                body: JSON.stringify({ url: currentVideo.url, type, format_id, stream, audio_format })
             });
             const data = await response.json();
             if (data.error) throw new Error(data.error);
-            pollStatus(data.job_id);
+            if (stream) {
+                // The server sends the file while it is still being downloaded
+                finalLink.classList.remove('hidden');
+                downloadLink.href = `/api/file/${data.job_id}?stream=1`;
+            }
+            watchStatus(data.job_id);
         } catch (err) {
             statusText.innerText = 'Грешка: ' + err.message;
         }
@@ -211,31 +248,53 @@ document.addEventListener('DOMContentLoaded', () => {
         openDownloadModal(vidObj);
     }
 
-    // --- Polling Logic ---
+    // --- Status Updates ---
+    function showJobStatus(job_id, data) {
+        progressBarFill.style.width = `${data.progress}%`;
+        statusText.innerText = data.text;
+
+        if (data.status === 'downloading') {
+            progressDetails.innerText = `Изтеглени: ${data.downloaded_mb} от ${data.total_mb}`;
+        } else if (data.status === 'queued' && data.queue_position) {
+            progressDetails.innerText = `Позиция в опашката: ${data.queue_position}`;
+        }
+
+        if (data.status === 'completed') {
+            statusText.innerText = 'Готово!';
+            progressDetails.innerText = '';
+            finalLink.classList.remove('hidden');
+            downloadLink.href = `/api/file/${job_id}`;
+        } else if (data.status === 'error') {
+            statusText.innerText = data.text || data.error;
+            progressDetails.innerText = '';
+        }
+        return data.status === 'completed' || data.status === 'error';
+    }
+
+    // Pushed updates; falls back to polling if the event stream is unavailable
+    function watchStatus(job_id) {
+        if (!window.EventSource) {
+            pollStatus(job_id);
+            return;
+        }
+        const events = new EventSource(`/api/events/${job_id}`);
+        let finished = false;
+        events.onmessage = (event) => {
+            finished = showJobStatus(job_id, JSON.parse(event.data));
+            if (finished) events.close();
+        };
+        events.onerror = () => {
+            events.close();
+            if (!finished) pollStatus(job_id);
+        };
+    }
+
     async function pollStatus(job_id) {
         const interval = setInterval(async () => {
             try {
                 const response = await fetch(`/api/status/${job_id}`);
                 const data = await response.json();
-
-                progressBarFill.style.width = `${data.progress}%`;
-                statusText.innerText = data.text;
-
-                if (data.status === 'downloading') {
-                    progressDetails.innerText = `Изтеглени: ${data.downloaded_mb} от ${data.total_mb}`;
-                }
-
-                if (data.status === 'completed') {
-                    clearInterval(interval);
-                    statusText.innerText = 'Готово!';
-                    progressDetails.innerText = '';
-                    finalLink.classList.remove('hidden');
-                    downloadLink.href = `/api/file/${job_id}`;
-                } else if (data.status === 'error') {
-                    clearInterval(interval);
-                    statusText.innerText = data.text;
-                    progressDetails.innerText = '';
-                }
+                if (showJobStatus(job_id, data)) clearInterval(interval);
             } catch (err) {
                 clearInterval(interval);
                 statusText.innerText = 'Грешка при връзката.';
@@ -0,0 +1,26 @@
+import pytest
+from job_store import MemoryJobStore
+from journal import JobJournal
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+FORMAT_OPTS = {'format_id': 'bestaudio/best'}
+
+
+def test_queue_full_fails_joined_jobs_and_keeps_the_leader_record(app, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'jobs', MemoryJobStore())
+    monkeypatch.setattr(app, 'journal', JobJournal(str(tmp_path / 'journal.jsonl')))
+
+    def submit(job_id, *args, priority=0):
+        # An identical request joins before the scheduler turns the leader down
+        app.update_job_status('joiner', 'queued', "В опашка...")
+        app.queue_download('joiner', URL, FORMAT_OPTS, priority)
+        raise app.QueueFull(5)
+
+    monkeypatch.setattr(app.scheduler, 'submit', submit)
+    app.update_job_status('leader', 'queued', "В опашка...")
+    with pytest.raises(app.QueueFull):
+        app.queue_download('leader', URL, FORMAT_OPTS, 1)
+
+    assert app.jobs.get('leader')['status'] == 'queued'  # the caller deletes it
+    assert app.jobs.get('joiner')['status'] == 'error'
+    assert app.jobs.members('leader') == ['leader']
@@ -0,0 +1,40 @@
+import os
+import time
+
+from content_cache import ContentCache
+
+
+def add(cache, tmp_path, download_key, size, age):
+    source = tmp_path / f'{download_key}.m4a'
+    source.write_bytes(b'x' * size)
+    key = cache.key(download_key)
+    path = cache.store(key, str(source), 'Song.m4a')
+    os.utime(path, (time.time() - age, time.time() - age))
+    return key
+
+
+def test_hit_returns_the_stored_file_and_counts(tmp_path):
+    cache = ContentCache(str(tmp_path / 'cache'), 1024)
+    key = add(cache, tmp_path, 'abc|audio|m4a', 10, age=0)
+    assert cache.lookup(key) == str(tmp_path / 'cache' / key / 'Song.m4a')
+    assert cache.lookup(cache.key('other|audio|m4a')) is None
+    assert not (tmp_path / 'abc|audio|m4a.m4a').exists()
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['bytes']) == (1, 1, 1, 10)
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ContentCache(str(tmp_path / 'cache'), 250)
+    old = add(cache, tmp_path, 'old', 100, age=300)
+    used = add(cache, tmp_path, 'used', 100, age=200)
+    cache.lookup(old)  # a hit makes it the most recent one
+    new = add(cache, tmp_path, 'new', 100, age=100)
+    assert cache.lookup(used) is None
+    assert cache.lookup(old) and cache.lookup(new)
+
+
+def test_the_entry_just_stored_is_kept_even_over_quota(tmp_path):
+    cache = ContentCache(str(tmp_path / 'cache'), 50)
+    key = add(cache, tmp_path, 'big', 100, age=0)
+    assert cache.lookup(key)
+    assert cache.evict(target_bytes=0) == 0 and cache.lookup(key) is None
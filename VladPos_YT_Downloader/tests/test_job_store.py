@@ -0,0 +1,55 @@
+import time
+import pytest
+from job_store import MemoryJobStore, SQLiteJobStore
+
+
+def job(status):
+    return {'status': status, 'text': None, 'progress': 0, 'filename': None, 'timestamp': time.time()}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_identical_downloads_share_the_leader(store):
+    store.set('a', job('downloading'))
+    assert store.join('key', 'a') == 'a'
+    assert store.join('key', 'b') == 'a'
+    assert store.get('b')['status'] == 'downloading'
+    assert sorted(store.members('a')) == ['a', 'b']
+    assert store.members('b') == ['b']
+
+    assert sorted(store.release('key', 'a')) == ['a', 'b']
+    assert store.members('a') == ['a']
+
+
+def test_finished_or_missing_leader_is_replaced(store):
+    store.set('a', job('completed'))
+    store.join('key', 'a')
+    store.set('b', job('queued'))
+    assert store.join('key', 'b') == 'b'
+
+    store.delete('b')
+    assert store.join('key', 'c') == 'c'
+
+
+def test_release_keeps_a_newer_leader(store):
+    store.set('a', job('error'))
+    store.join('key', 'a')
+    store.set('b', job('queued'))
+    store.join('key', 'b')
+    assert store.release('key', 'a') == ['a']
+    assert store.join('key', 'c') == 'b'
+
+
+def test_sqlite_downloads_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    first, second = SQLiteJobStore(path), SQLiteJobStore(path)
+    first.set('a', job('downloading'))
+    assert first.join('key', 'a') == 'a'
+    assert second.join('key', 'b') == 'a'
+    assert sorted(first.release('key', 'a')) == ['a', 'b']
+    assert second.join('key', 'c') == 'c'
@@ -0,0 +1,55 @@
+import pytest
+
+from search_cache import SearchCache
+
+
+class FakeYoutubeDL:
+    """Searches yield 25 numbered entries lazily and are recorded."""
+    searches = []
+
+    def __init__(self, params):
+        self.params = params
+        self.closed = False
+
+    def extract_info(self, url, download=False, process=True):
+        self.searches.append(url)
+
+        def entries():
+            for n in range(25):
+                yield {'id': f'{url}-{n}'}
+        return {'entries': entries()}
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_ydl(monkeypatch):
+    yt_dlp = pytest.importorskip('yt_dlp')
+    monkeypatch.setattr(yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    monkeypatch.setattr(FakeYoutubeDL, 'searches', [])
+    return FakeYoutubeDL
+
+
+def test_pages_continue_one_search(fake_ydl):
+    cache = SearchCache({})
+    first, cursor = cache.page('Lofi  Beats', 0, 10)
+    assert cursor == 10 and first[0]['id'] == 'ytsearchall:lofi beats-0'
+    second, cursor = cache.page('lofi beats', cursor, 10)
+    assert cursor == 20 and second[0]['id'] == 'ytsearchall:lofi beats-10'
+    last, cursor = cache.page('LOFI BEATS', cursor, 10)
+    assert len(last) == 5 and cursor is None
+    assert fake_ydl.searches == ['ytsearchall:lofi beats']
+
+
+def test_expired_and_least_recently_used_searches_start_over(fake_ydl):
+    cache = SearchCache({}, max_entries=1)
+    cache.page('a', 0, 10)
+    cache.page('b', 0, 10)
+    cache.page('a', 0, 10)
+    assert fake_ydl.searches == ['ytsearchall:a', 'ytsearchall:b', 'ytsearchall:a']
+
+    expiring = SearchCache({}, ttl=-1)
+    expiring.page('c', 0, 10)
+    expiring.page('c', 10, 10)
+    assert fake_ydl.searches[-2:] == ['ytsearchall:c', 'ytsearchall:c']
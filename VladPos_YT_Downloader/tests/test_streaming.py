@@ -0,0 +1,54 @@
+import os
+import uuid
+import threading
+
+import pytest
+
+DATA = os.urandom(600 * 1024)
+
+
+@pytest.fixture
+def job(app):
+    """A job that has written the first part of its file."""
+    job_id = str(uuid.uuid4())
+    part = os.path.join(app.DOWNLOAD_FOLDER, f'{job_id}_Song.m4a.part')
+    with open(part, 'wb') as f:
+        f.write(DATA[:200 * 1024])
+    app.update_job_status(job_id, 'downloading', stream_path=app.download_relpath(part))
+    yield job_id, part
+    app.jobs.delete(job_id)
+
+
+def finish_later(app, job_id, part, status):
+    def finish():
+        with open(part, 'ab') as f:
+            f.write(DATA[200 * 1024:])
+        if status == 'completed':
+            final = part[:-len('.part')]
+            os.replace(part, final)
+            app.update_job_status(job_id, 'completed', filename=os.path.basename(final))
+        else:
+            app.update_job_status(job_id, 'error', text="Грешка")
+    timer = threading.Timer(0.5, finish)
+    timer.start()
+    return timer
+
+
+def test_file_is_streamed_while_it_is_written(app, job):
+    job_id, part = job
+    timer = finish_later(app, job_id, part, 'completed')
+    response = app.app.test_client().get(f'/api/file/{job_id}', query_string={'stream': 1})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'audio/mp4'
+    assert "filename*=UTF-8''Song.m4a" in response.headers['Content-Disposition']
+    assert response.data == DATA
+    timer.join()
+
+
+def test_failed_download_breaks_off_the_stream(app, job):
+    job_id, part = job
+    timer = finish_later(app, job_id, part, 'error')
+    response = app.app.test_client().get(f'/api/file/{job_id}', query_string={'stream': 1})
+    with pytest.raises(IOError):
+        response.get_data()
+    timer.join()
@@ -0,0 +1,37 @@
+import time
+
+import workers
+from progress import CombinedProgress
+
+VIDEO = 'clip.f137.mp4'
+AUDIO = 'clip.f140.m4a'
+
+
+def test_streams_downloading_together_make_one_rising_percentage(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+    progress = CombinedProgress()
+    # As merge_streams_piped announces both streams before they start
+    progress.expect(VIDEO, 8_000_000)
+    progress.expect(AUDIO, 2_000_000)
+    events = []
+    hook, _ = workers.progress_hooks(lambda *event: events.append(event), progress)
+
+    # The audio, a quarter of the video's size, finishes first: its hook calls
+    # alternate with the video's, each file counting from 0 on its own
+    for i in range(1, 401):
+        clock[0] = i * 0.05
+        hook({'status': 'downloading', 'filename': VIDEO, 'tmpfilename': 'clip.temp.mp4',
+              'downloaded_bytes': i * 20_000, 'total_bytes': 8_000_000})
+        if i <= 100:
+            hook({'status': 'downloading', 'filename': AUDIO, 'tmpfilename': 'clip.temp.mp4',
+                  'downloaded_bytes': i * 20_000, 'total_bytes': 2_000_000})
+
+    percents = [event[1] for event in events if event[0] == 'downloading']
+    assert len(percents) > 10
+    assert percents == sorted(percents)
+    assert percents[-1] == 100.0
+    for _, _, downloaded, total, speed, eta, _ in events[1:]:
+        assert total == 10_000_000
+        assert speed is not None and speed > 0
+        assert eta is not None
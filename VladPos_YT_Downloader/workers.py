@@ -0,0 +1,224 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from progress import ProgressTracker, CombinedProgress
+from scheduler import PostprocessGate
+from ydl_pool import ydl_pool, extract_options
+from pipe_merge import merge_streams_piped
+
+# A worker process is replaced after this many jobs, so memory that yt-dlp
+# and ffmpeg wrappers accumulate is given back regularly
+WORKER_MAX_TASKS = int(os.environ.get('WORKER_MAX_TASKS', 20))
+# Worker processes for extraction (/api/formats, search, playlists); downloads
+# get their own pool so extraction never waits behind them
+EXTRACT_PROCESSES = int(os.environ.get('EXTRACT_PROCESSES', 2))
+# How long a finished download waits for its last progress messages
+DRAIN_TIMEOUT = 5
+
+
+class WorkerError(Exception):
+    """An error raised by yt-dlp in a worker process, carried back as its message."""
+
+
+def extract(ydl_opts, url, remove_private_keys=True):
+    """JSON-serializable info dict of url (playlists keep their entries with remove_private_keys=False).
+
+    Runs on a warm session of the pool; options that only matter for
+    downloading are ignored.
+    """
+    with ydl_pool.session(extract_options(ydl_opts)) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(url, download=False), remove_private_keys=remove_private_keys)
+
+
+def progress_hooks(emit, progress=None):
+    """yt-dlp progress and postprocessor hooks that report through emit(event, *args).
+
+    Events are small tuples so they can cross a process boundary:
+    ('downloading', percent, downloaded, total, speed, eta, tmpfilename) as
+    often as ProgressTracker allows, ('finished',) after each file and
+    ('merging', path) with the file ffmpeg is merging into. The numbers are
+    summed over every file of the download by progress (a CombinedProgress),
+    so video and audio that download at the same time make one percentage.
+    """
+    tracker = ProgressTracker()
+    progress = progress or CombinedProgress()
+
+    def hook(d):
+        if d['status'] == 'downloading':
+            # Runs for every chunk: only report when the tracker says so
+            if tracker.update(*progress.update(d)):
+                emit('downloading', round(tracker.percent, 1), tracker.downloaded, tracker.total,
+                     tracker.speed, tracker.eta, d.get('tmpfilename'))
+        elif d['status'] == 'finished':
+            emit('finished')
+
+    def postprocessor_hook(d):
+        if d['postprocessor'] == 'Merger' and d['status'] == 'started':
+            from yt_dlp.utils import prepend_extension
+            emit('merging', prepend_extension(d['info_dict']['filepath'], 'temp'))
+
+    return hook, postprocessor_hook
+
+
+def download(ydl_opts, info, emit, gate):
+    """Downloads an extracted info dict; returns the path of the finished file.
+
+    Video and audio that are merged go straight into ffmpeg when they can;
+    emit('piping', path) then names the merged file, which grows while they
+    download, and emit('piping', None) follows if the usual download and
+    merge takes over.
+    """
+    import yt_dlp  # loaded on first use (or by preload_yt_dlp) to keep startup fast
+    progress = CombinedProgress()
+    hook, postprocessor_hook = progress_hooks(emit, progress)
+    ydl_opts = dict(ydl_opts, progress_hooks=[hook], postprocessor_hooks=[gate.hook, postprocessor_hook])
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        merged = merge_streams_piped(ydl, info, progress, started=lambda path: emit('piping', path))
+        if merged:
+            return merged
+        emit('piping', None)
+        result = ydl.process_ie_result(info, download=True)
+        # Where the file ended up after postprocessing (audio extraction
+        # changes its extension)
+        downloads = result.get('requested_downloads') or [{}]
+        return downloads[-1].get('filepath') or ydl.prepare_filename(result)
+
+
+class ThreadRunner:
+    """Runs yt-dlp in the calling thread of the web worker."""
+
+    def extract(self, ydl_opts, url, remove_private_keys=True):
+        return extract(ydl_opts, url, remove_private_keys)
+
+    def download(self, job_id, ydl_opts, info, emit, gate):
+        return download(ydl_opts, info, emit, gate)
+
+
+# Set in every worker process by _init_worker
+_events = None
+_ffmpeg = None
+
+
+def _init_worker(events, ffmpeg):
+    global _events, _ffmpeg
+    _events, _ffmpeg = events, ffmpeg
+
+
+def _extract_in_worker(ydl_opts, url, remove_private_keys):
+    try:
+        return extract(ydl_opts, url, remove_private_keys)
+    except Exception as e:
+        raise WorkerError(str(e)) from None
+
+
+def _download_in_worker(job_id, ydl_opts, info):
+    def emit(*event):
+        _events.put((job_id,) + event)
+
+    gate = PostprocessGate(_ffmpeg)
+    try:
+        return download(ydl_opts, info, emit, gate)
+    except Exception as e:
+        raise WorkerError(str(e)) from None
+    finally:
+        gate.release()
+        _events.put((job_id, 'done'))
+
+
+class ProcessRunner:
+    """Runs yt-dlp in pools of worker processes, off the web worker's GIL.
+
+    Progress comes back over one queue as (job id, event, *args) tuples and
+    is handed to the job's emit() on a reader thread, in order and before the
+    job's result. The ffmpeg slots are a semaphore shared by all workers.
+    """
+
+    def __init__(self, download_processes, ffmpeg_slots, extract_processes=EXTRACT_PROCESSES,
+                 max_tasks=WORKER_MAX_TASKS):
+        # Worker recycling rules out 'fork'; the fork server preloads only
+        # this module and yt-dlp, so workers never import (and start) the web
+        # app and don't each pay for importing yt-dlp
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context('forkserver')
+            self._context.set_forkserver_preload(['workers', 'yt_dlp'])
+        else:
+            self._context = multiprocessing.get_context('spawn')
+        self._sizes = {'extract': extract_processes, 'download': download_processes}
+        self._ffmpeg_slots = ffmpeg_slots
+        self._max_tasks = max_tasks
+        self._events = None  # created with the first pool
+        self._ffmpeg = None
+        self._pools = {}
+        self._jobs = {}  # job id -> (emit, event set once its messages are drained)
+        self._lock = threading.Lock()
+
+    def _submit(self, kind, fn, *args):
+        with self._lock:
+            if self._events is None:
+                self._events = self._context.Queue()
+                self._ffmpeg = self._context.BoundedSemaphore(self._ffmpeg_slots)
+                threading.Thread(target=self._read_events, daemon=True).start()
+            pool = self._pools.get(kind)
+            if pool is None:
+                pool = self._pools[kind] = ProcessPoolExecutor(
+                    self._sizes[kind], mp_context=self._context, initializer=_init_worker,
+                    initargs=(self._events, self._ffmpeg), max_tasks_per_child=self._max_tasks)
+        return pool, pool.submit(fn, *args)
+
+    def _result(self, kind, pool, future):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); later jobs get a new pool
+            with self._lock:
+                if self._pools.get(kind) is pool:
+                    del self._pools[kind]
+            pool.shutdown(wait=False)
+            raise
+
+    def extract(self, ydl_opts, url, remove_private_keys=True):
+        return self._result('extract', *self._submit('extract', _extract_in_worker, ydl_opts, url, remove_private_keys))
+
+    def download(self, job_id, ydl_opts, info, emit, gate):
+        # `gate` belongs to the web worker; in the worker process ffmpeg waits
+        # for the shared semaphore instead
+        drained = threading.Event()
+        with self._lock:
+            self._jobs[job_id] = (emit, drained)
+        try:
+            pool, future = self._submit('download', _download_in_worker, job_id, ydl_opts, info)
+            if not isinstance(future.exception(), BrokenProcessPool):
+                # Late progress messages must not overwrite the final status
+                drained.wait(DRAIN_TIMEOUT)
+            return self._result('download', pool, future)
+        finally:
+            with self._lock:
+                del self._jobs[job_id]
+
+    def _read_events(self):
+        while True:
+            job_id, event, *args = self._events.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            emit, drained = job
+            if event == 'done':
+                drained.set()
+                continue
+            try:
+                emit(event, *args)
+            except Exception as e:
+                print(f"Progress of {job_id} failed: {e}")
+
+
+def create_runner(download_processes, ffmpeg_slots):
+    """Builds the runner selected by the JOB_EXECUTION env var ('thread' or 'process')."""
+    mode = os.environ.get('JOB_EXECUTION', 'thread').lower()
+    if mode == 'process':
+        return ProcessRunner(download_processes, ffmpeg_slots)
+    if mode == 'thread':
+        return ThreadRunner()
+    raise ValueError(f"Unknown JOB_EXECUTION mode: {mode}")
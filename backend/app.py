@@ -1,17 +1,39 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from downloader import YoutubeDownloader
+from scheduler import QueueFull
+from ffmpeg_registry import AUDIO_FORMATS
+from serving import send_download, content_disposition
+from events import StreamLimit, max_streams, event_stream, SSE_HEADERS, POLL_INTERVAL
+from zip_stream import stream_zip
+from sessions import (download_sessions, batch_sessions, downloader, scheduler, broker,
+                      expiry, janitor, display_name, queue_download,
+                      queue_batch, session_status, is_final, finished_files)
 import os
-import threading
-import uuid
-from typing import Dict
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+# gunicorn's --threads; the Procfile passes the same WEB_THREADS
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 16))
+# Open /events streams of this process, each holding a server thread
+stream_limit = StreamLimit(max_streams(WEB_THREADS))
 
-# Global storage for download sessions
-download_sessions: Dict[str, Dict] = {}
-downloader = YoutubeDownloader()
+
+def events_response(session_ids):
+    """Server-Sent Events for sessions, or 503 when too many streams are open.
+
+    The 503 makes the frontend fall back to polling /status, so open streams
+    never take every thread from the other routes.
+    """
+    if not stream_limit.acquire():
+        response = jsonify({'error': 'Too many open event streams, poll /status instead'})
+        response.headers['Retry-After'] = str(int(POLL_INTERVAL))
+        return response, 503
+    response = Response(event_stream(session_ids, session_status, is_final, broker),
+                        mimetype='text/event-stream', headers=SSE_HEADERS)
+    # Also runs when the client goes away before the stream ends
+    response.call_on_close(stream_limit.release)
+    return response
 
 
 @app.route('/formats', methods=['POST'])
@@ -39,40 +61,21 @@ def start_download():
         url = data.get('url')
         quality = data.get('quality')
         mode = data.get('mode', 'video_audio')
+        audio_format = data.get('audio_format', 'auto')
         
         if not url or not quality:
             return jsonify({'error': 'URL and quality are required'}), 400
+        if audio_format not in AUDIO_FORMATS:
+            return jsonify({'error': f"audio_format must be one of {', '.join(AUDIO_FORMATS)}"}), 400
         
-        # Create session ID
-        session_id = str(uuid.uuid4())
-        download_sessions[session_id] = {
-            'status': 'starting',
-            'progress': 0,
-            'file_path': None,
-            'error': None
-        }
-        
-        # Define progress callback
-        def update_progress(percent):
-            download_sessions[session_id]['progress'] = percent
-            download_sessions[session_id]['status'] = 'downloading'
+        try:
+            session_id = queue_download(url, quality, mode, audio_format)
+        except QueueFull as e:
+            response = jsonify({'error': 'Server is busy, try again later'})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
         
-        # Start download in background thread
-        def download_task():
-            try:
-                downloader.progress_callback = update_progress
-                file_path = downloader.download(url, quality, mode)
-                download_sessions[session_id]['status'] = 'completed'
-                download_sessions[session_id]['progress'] = 100
-                download_sessions[session_id]['file_path'] = file_path
-            except Exception as e:
-                download_sessions[session_id]['status'] = 'error'
-                download_sessions[session_id]['error'] = str(e)
-        
-        thread = threading.Thread(target=download_task)
-        thread.start()
-        
-        return jsonify({'session_id': session_id}), 200
+        return jsonify({'session_id': session_id, 'queue_position': scheduler.position(session_id)}), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -81,24 +84,29 @@ def start_download():
 @app.route('/status/<session_id>', methods=['GET'])
 def get_status(session_id):
     """Get download status for a session."""
-    session = download_sessions.get(session_id)
+    response = session_status(session_id)
     
-    if not session:
+    if not response:
         return jsonify({'error': 'Session not found'}), 404
     
-    response = {
-        'status': session['status'],
-        'progress': session['progress']
-    }
-    
-    if session['status'] == 'error':
-        response['error'] = session['error']
-    elif session['status'] == 'completed':
-        response['filename'] = os.path.basename(session['file_path'])
-    
     return jsonify(response), 200
 
 
+@app.route('/events/<session_id>', methods=['GET'])
+def session_events(session_id):
+    """Stream status changes of a session as Server-Sent Events."""
+    return events_response([session_id])
+
+
+@app.route('/events', methods=['GET'])
+def sessions_events():
+    """Stream status changes of several sessions: /events?sessions=<id>,<id>,..."""
+    session_ids = [s for s in request.args.get('sessions', '').split(',') if s][:50]
+    if not session_ids:
+        return jsonify({'error': 'No sessions given'}), 400
+    return events_response(session_ids)
+
+
 @app.route('/file/<session_id>', methods=['GET'])
 def download_file(session_id):
     """Download the completed file."""
@@ -112,11 +120,90 @@ def download_file(session_id):
     if not os.path.exists(file_path):
         return jsonify({'error': 'File not found'}), 404
     
-    return send_file(
-        file_path,
-        as_attachment=True,
-        download_name=os.path.basename(file_path)
-    )
+    return send_download(file_path, display_name(file_path), downloader.download_dir)
+
+
+@app.route('/batch', methods=['POST'])
+def start_batch():
+    """Start downloading every video of a playlist or channel."""
+    try:
+        data = request.get_json()
+        url = data.get('url')
+        quality = data.get('quality')
+        mode = data.get('mode', 'video_audio')
+        audio_format = data.get('audio_format', 'auto')
+        
+        if not url or not quality:
+            return jsonify({'error': 'URL and quality are required'}), 400
+        if audio_format not in AUDIO_FORMATS:
+            return jsonify({'error': f"audio_format must be one of {', '.join(AUDIO_FORMATS)}"}), 400
+        
+        title, items = downloader.expand_playlist(url)
+        if not items:
+            return jsonify({'error': 'No videos found'}), 404
+        
+        batch_id = queue_batch(title, items, quality, mode, audio_format)
+        
+        return jsonify({
+            'batch_id': batch_id,
+            'title': title,
+            'items': [{k: item[k] for k in ('session_id', 'id', 'title', 'url')} for item in items]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Status of every video of a batch."""
+    batch = batch_sessions.get(batch_id)
+    
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    items = [dict(session_status(item['session_id']), session_id=item['session_id'], title=item['title'])
+             for item in batch['items']]
+    return jsonify({
+        'batch_id': batch_id,
+        'title': batch['title'],
+        'total': len(items),
+        'completed': sum(1 for item in items if item['status'] == 'completed'),
+        'failed': sum(1 for item in items if item['status'] == 'error'),
+        'items': items
+    }), 200
+
+
+@app.route('/batch/<batch_id>/events', methods=['GET'])
+def batch_events(batch_id):
+    """Stream status changes of every video of a batch."""
+    batch = batch_sessions.get(batch_id)
+    
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    session_ids = [item['session_id'] for item in batch['items']]
+    return events_response(session_ids)
+
+
+@app.route('/batch/<batch_id>/zip', methods=['GET'])
+def batch_zip(batch_id):
+    """ZIP of a batch, streamed while it downloads: each file is added once ready."""
+    batch = batch_sessions.get(batch_id)
+    
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    session_ids = [item['session_id'] for item in batch['items']]
+    response = Response(stream_zip(finished_files(session_ids)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = content_disposition(f"{batch['title'] or 'playlist'}.zip")
+    return response
+
+
+@app.route('/storage/stats', methods=['GET'])
+def storage_stats():
+    """Disk usage of the downloads folder and the bytes reclaimed so far."""
+    return jsonify(dict(janitor.stats(), scheduled_expiries=len(expiry))), 200
 
 
 if __name__ == '__main__':
@@ -126,5 +213,9 @@ if __name__ == '__main__':
     print("   POST /formats - Get available formats")
     print("   POST /download - Start download")
     print("   GET  /status/<session_id> - Check progress")
+    print("   GET  /events/<session_id> - Progress as Server-Sent Events")
     print("   GET  /file/<session_id> - Download file")
+    print("   POST /batch - Download a playlist or channel")
+    print("   GET  /batch/<batch_id>[/events|/zip] - Batch status, events, ZIP")
+    print("   GET  /storage/stats - Disk usage and reclaimed bytes")
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,220 @@
+"""ASGI server for the /formats, /download, /status, /events and /file API.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Same API and sessions as app.py, but no connection holds a thread while it
+waits: extraction runs on a bounded thread pool, downloads on the shared
+scheduler, files are streamed with aiofiles and /events and /status?wait=
+await session changes instead of polling.
+"""
+import os
+import asyncio
+import mimetypes
+from email.utils import formatdate
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from scheduler import QueueFull
+from ffmpeg_registry import AUDIO_FORMATS
+from events import AsyncBroker, async_event_stream, SSE_HEADERS
+from serving import content_disposition
+from sessions import (download_sessions, downloader, scheduler, broker, display_name,
+                      queue_download, session_status, is_final)
+
+# extract_info calls running at once; each holds a thread for its HTTP round trips
+EXTRACT_WORKERS = int(os.environ.get('EXTRACT_WORKERS', 8))
+# Longest /status?wait= a client may ask for, in seconds
+MAX_STATUS_WAIT = 60
+CHUNK = 256 * 1024
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+
+extract_pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix='extract')
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.changes = AsyncBroker(broker, asyncio.get_running_loop())
+    yield
+    app.state.changes.close()
+    extract_pool.shutdown(wait=False)
+
+
+app = FastAPI(title='YouTube Downloader Backend', lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+
+
+def error(message: str, status_code: int, headers=None) -> JSONResponse:
+    return JSONResponse({'error': message}, status_code=status_code, headers=headers)
+
+
+async def json_body(request: Request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@app.post('/formats')
+async def get_formats(request: Request):
+    """Extract available formats for a YouTube URL."""
+    url = (await json_body(request)).get('url')
+    if not url:
+        return error('URL is required', 400)
+
+    try:
+        formats = await asyncio.get_running_loop().run_in_executor(extract_pool, downloader.get_formats, url)
+    except Exception as e:
+        return error(str(e), 500)
+    return JSONResponse(formats)
+
+
+@app.post('/download')
+async def start_download(request: Request):
+    """Start a download job."""
+    data = await json_body(request)
+    url = data.get('url')
+    quality = data.get('quality')
+    mode = data.get('mode', 'video_audio')
+    audio_format = data.get('audio_format', 'auto')
+
+    if not url or not quality:
+        return error('URL and quality are required', 400)
+    if audio_format not in AUDIO_FORMATS:
+        return error(f"audio_format must be one of {', '.join(AUDIO_FORMATS)}", 400)
+
+    try:
+        # The journal write fsyncs, so it stays off the event loop
+        session_id = await run_in_threadpool(queue_download, url, quality, mode, audio_format)
+    except QueueFull as e:
+        return error('Server is busy, try again later', 429, {'Retry-After': str(e.retry_after)})
+    except Exception as e:
+        return error(str(e), 500)
+
+    return {'session_id': session_id, 'queue_position': scheduler.position(session_id)}
+
+
+@app.get('/status/{session_id}')
+async def get_status(session_id: str, request: Request, wait: float = 0):
+    """Get download status for a session.
+
+    With ?wait=<seconds> the response is held until the status changes (or
+    the time is up), so clients can long-poll instead of polling on a timer.
+    """
+    status = session_status(session_id)
+    if status is not None and wait > 0 and not is_final(status):
+        changes = request.app.state.changes
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(wait, MAX_STATUS_WAIT)
+        version = changes.version
+        while status == (current := session_status(session_id)) and loop.time() < deadline:
+            version = await changes.wait(version, deadline - loop.time())
+        status = current
+
+    if not status:
+        return error('Session not found', 404)
+    return status
+
+
+@app.get('/events/{session_id}')
+async def session_events(session_id: str, request: Request):
+    """Stream status changes of a session as Server-Sent Events."""
+    return StreamingResponse(async_event_stream([session_id], session_status, is_final, request.app.state.changes),
+                             media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.get('/events')
+async def sessions_events(request: Request, sessions: str = ''):
+    """Stream status changes of several sessions: /events?sessions=<id>,<id>,..."""
+    session_ids = [s for s in sessions.split(',') if s][:50]
+    if not session_ids:
+        return error('No sessions given', 400)
+    return StreamingResponse(async_event_stream(session_ids, session_status, is_final, request.app.state.changes),
+                             media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+def parse_range(header: str, size: int):
+    """(start, end) of a single "bytes=" range; None to send the whole file, False if unsatisfiable."""
+    unit, _, spec = (header or '').partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None  # multiple ranges are answered with the whole file
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    return (start, end) if start <= end else False
+
+
+async def file_chunks(path: str, start: int, length: int):
+    async with aiofiles.open(path, 'rb') as f:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(CHUNK, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@app.api_route('/file/{session_id}', methods=['GET', 'HEAD'])
+async def download_file(session_id: str, request: Request):
+    """Download the completed file, with Range, If-Range and ETag support."""
+    session = download_sessions.get(session_id)
+
+    if not session or session['status'] != 'completed':
+        return error('File not ready', 404)
+
+    file_path = session['file_path']
+    try:
+        st = await aiofiles.os.stat(file_path)
+    except OSError:
+        return error('File not found', 404)
+
+    name = display_name(file_path)
+    media_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    headers = {'Content-Disposition': content_disposition(name)}
+    if X_ACCEL_REDIRECT_PREFIX:
+        relpath = os.path.relpath(file_path, downloader.download_dir).replace(os.sep, '/')
+        headers['X-Accel-Redirect'] = X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(relpath)
+        return Response(media_type=media_type, headers=headers)
+
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers.update({'Accept-Ranges': 'bytes', 'ETag': etag,
+                    'Last-Modified': formatdate(st.st_mtime, usegmt=True)})
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    status_code, start, end = 200, 0, st.st_size - 1
+    if_range = request.headers.get('if-range')
+    byte_range = parse_range(request.headers.get('range'), st.st_size) if if_range in (None, etag) else None
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{st.st_size}'
+        return Response(status_code=416, headers=headers)
+    if byte_range:
+        status_code, (start, end) = 206, byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+    headers['Content-Length'] = str(end - start + 1)
+
+    if request.method == 'HEAD':
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(file_chunks(file_path, start, end - start + 1), status_code=status_code,
+                             headers=headers, media_type=media_type)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    print("🚀 YouTube Downloader Backend (ASGI) starting...")
+    print("📡 Server running on http://localhost:5000")
+    uvicorn.run(app, host='0.0.0.0', port=5000)
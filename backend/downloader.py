@@ -1,13 +1,85 @@
 import os
-import yt_dlp
-from typing import Dict, List, Callable, Optional
+import json
+import uuid
+import threading
+import functools
+from ydl_pool import ydl_pool, extract_options
+from ffmpeg_registry import FFmpegRegistry, audio_postprocessor, best_audio_format
+from typing import Dict, List, Callable, Optional, Tuple
+from info_cache import InfoCache, cache_key
+from tuning import connection_budget, tuned_options
+from progress import CombinedProgress, ProgressTracker
+from parallel_streams import fetch_streams_parallel
+from pipe_merge import merge_streams_piped
+
+# Videos taken from one playlist, and how many of them are in the download
+# queue at a time
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 200))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 3))
+
+
+class DownloadArchive:
+    """Finished downloads by video id, quality, mode and audio format, in a JSON-lines file.
+
+    Lets batches skip videos that were downloaded before, as long as the
+    file is still on disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    key, file_path = json.loads(line)
+                    self._entries[key] = file_path
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(video_id: str, quality: str, mode: str, audio_format: str = 'auto') -> str:
+        key = f"{video_id}|{quality}|{mode}"
+        return f"{key}|{audio_format}" if mode == 'audio_only' else key
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            file_path = self._entries.get(key)
+        return file_path if file_path and os.path.exists(file_path) else None
+
+    def add(self, key: str, file_path: str):
+        with self._lock:
+            self._entries[key] = file_path
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps([key, file_path]) + '\n')
 
 
 class YoutubeDownloader:
+    """Thread-safe: every download gets its own YoutubeDL and progress sink."""
+
     def __init__(self):
+        # Default sink for callers that don't pass one to download()
         self.progress_callback: Optional[Callable] = None
-        self.download_dir = os.path.join(os.path.dirname(__file__), 'downloads')
+        self.download_dir = os.environ.get('DOWNLOAD_DIR') or os.path.join(os.path.dirname(__file__), 'downloads')
         os.makedirs(self.download_dir, exist_ok=True)
+        self._sinks: Dict[str, Callable] = {}
+        self._progress: Dict[str, CombinedProgress] = {}
+        self._trackers: Dict[str, ProgressTracker] = {}
+        self._sinks_lock = threading.Lock()
+        # Shared by get_formats and download, so a format query followed by a
+        # download of the same video extracts it only once
+        self.info_cache = InfoCache(disk_dir=os.environ.get('INFO_CACHE_DIR'))
+        self.archive = DownloadArchive(os.path.join(self.download_dir, 'archive.jsonl'))
+        # FFMPEG_PATH, else ffmpeg from PATH; probed once per process
+        self.ffmpeg = FFmpegRegistry([os.environ.get('FFMPEG_PATH') or 'ffmpeg'])
+
+    def _extract_info(self, ydl_opts: Dict, url: str) -> Dict:
+        """Info dict for a URL; only runs the extractor on a cache miss, on a warm pooled session."""
+        def extract():
+            with ydl_pool.session(extract_options(ydl_opts)) as ydl:
+                return ydl.sanitize_info(ydl.extract_info(url, download=False), remove_private_keys=True)
+
+        return self.info_cache.get_or_extract(cache_key(url, ydl_opts.get('extractor_args')), extract)
 
     def get_formats(self, url: str) -> Dict:
         """Extract video information and available formats."""
@@ -17,64 +89,127 @@ class YoutubeDownloader:
             'extract_flat': False,
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = self._extract_info(ydl_opts, url)
+        
+        # Extract unique video resolutions
+        video_formats = []
+        seen_heights = set()
+        
+        for f in info.get('formats', []):
+            if f.get('vcodec') != 'none' and f.get('height'):
+                height = f['height']
+                if height not in seen_heights:
+                    seen_heights.add(height)
+                    video_formats.append({
+                        'resolution': f"{height}p",
+                        'height': height
+                    })
+        
+        # Sort by resolution descending
+        video_formats.sort(key=lambda x: x['height'], reverse=True)
+        
+        # Extract audio bitrates
+        audio_formats = []
+        seen_bitrates = set()
+        
+        for f in info.get('formats', []):
+            if f.get('acodec') != 'none' and f.get('abr'):
+                abr = int(f['abr'])
+                if abr not in seen_bitrates:
+                    seen_bitrates.add(abr)
+                    audio_formats.append({
+                        'bitrate': f"{abr}kbps",
+                        'abr': abr
+                    })
+        
+        audio_formats.sort(key=lambda x: x['abr'], reverse=True)
+        
+        return {
+            'title': info.get('title', 'Unknown'),
+            'thumbnail': info.get('thumbnail'),
+            'duration': info.get('duration'),
+            'video_formats': [f['resolution'] for f in video_formats],
+            'audio_formats': [f['bitrate'] for f in audio_formats]
+        }
+
+    def expand_playlist(self, url: str) -> Tuple[Optional[str], List[Dict]]:
+        """Title and videos ({'id', 'title', 'url'}) of a playlist or channel.
+
+        Uses flat extraction, so no video is extracted until it is downloaded.
+        """
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': 'in_playlist',
+            'playlistend': BATCH_MAX_ITEMS,
+        }
+
+        with ydl_pool.session(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=False)
-            
-            # Extract unique video resolutions
-            video_formats = []
-            seen_heights = set()
-            
-            for f in info.get('formats', []):
-                if f.get('vcodec') != 'none' and f.get('height'):
-                    height = f['height']
-                    if height not in seen_heights:
-                        seen_heights.add(height)
-                        video_formats.append({
-                            'resolution': f"{height}p",
-                            'height': height
-                        })
-            
-            # Sort by resolution descending
-            video_formats.sort(key=lambda x: x['height'], reverse=True)
-            
-            # Extract audio bitrates
-            audio_formats = []
-            seen_bitrates = set()
-            
-            for f in info.get('formats', []):
-                if f.get('acodec') != 'none' and f.get('abr'):
-                    abr = int(f['abr'])
-                    if abr not in seen_bitrates:
-                        seen_bitrates.add(abr)
-                        audio_formats.append({
-                            'bitrate': f"{abr}kbps",
-                            'abr': abr
-                        })
-            
-            audio_formats.sort(key=lambda x: x['abr'], reverse=True)
-            
-            return {
-                'title': info.get('title', 'Unknown'),
-                'thumbnail': info.get('thumbnail'),
-                'duration': info.get('duration'),
-                'video_formats': [f['resolution'] for f in video_formats],
-                'audio_formats': [f['bitrate'] for f in audio_formats]
-            }
-
-    def _progress_hook(self, d):
-        """Progress callback for yt-dlp."""
+
+        entries = info.get('entries') if info.get('_type') == 'playlist' else [info]
+        items = []
+        for entry in entries or []:
+            # Skip nested playlists and channel tabs
+            if not entry or not entry.get('id') or entry.get('_type') == 'playlist' \
+                    or entry.get('ie_key', 'Youtube') != 'Youtube':
+                continue
+            items.append({
+                'id': entry['id'],
+                'title': entry.get('title'),
+                'url': f"https://www.youtube.com/watch?v={entry['id']}"
+            })
+        return info.get('title'), items[:BATCH_MAX_ITEMS]
+
+    def download_item(self, item: Dict, quality: str, mode: str,
+                      progress_callback: Optional[Callable] = None,
+                      postprocessor_hooks: Optional[List[Callable]] = None,
+                      audio_format: str = 'auto') -> str:
+        """
+        Download one video of a playlist, or reuse it from the download archive.
+        
+        Args:
+            item: Dict with 'id', 'url' and 'job_id' (e.g. from expand_playlist
+                plus a job id)
+            quality, mode, progress_callback, postprocessor_hooks, audio_format:
+                As for download()
+        
+        Returns:
+            Path of the file; an archived one is returned without downloading
+        """
+        key = DownloadArchive.key(item['id'], quality, mode, audio_format)
+        file_path = self.archive.get(key)
+        if file_path:
+            return file_path
+        file_path = self.download(item['url'], quality, mode,
+                                  progress_callback=progress_callback,
+                                  job_id=item['job_id'],
+                                  postprocessor_hooks=postprocessor_hooks,
+                                  audio_format=audio_format)
+        self.archive.add(key, file_path)
+        return file_path
+
+    def _progress_hook(self, job_id: str, d):
+        """Progress callback for yt-dlp, routed to the sink of the job it belongs to."""
         if d['status'] == 'downloading':
-            if self.progress_callback:
+            with self._sinks_lock:
+                sink = self._sinks.get(job_id)
+                progress = self._progress.get(job_id)
+                tracker = self._trackers.get(job_id)
+            if sink:
                 try:
-                    total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                    downloaded = d.get('downloaded_bytes', 0)
-                    if total > 0:
-                        percent = (downloaded / total) * 100
-                        self.progress_callback(percent)
+                    # Runs for every chunk: only report when the tracker says so
+                    downloaded, total = progress.update(d)
+                    if total > 0 and tracker.update(downloaded, total):
+                        sink(tracker.percent)
                 except:
                     pass
 
-    def download(self, url: str, quality: str, mode: str) -> str:
+    def download(self, url: str, quality: str, mode: str,
+                 progress_callback: Optional[Callable] = None,
+                 job_id: Optional[str] = None,
+                 postprocessor_hooks: Optional[List[Callable]] = None,
+                 audio_format: str = 'auto') -> str:
         """
         Download video/audio from YouTube.
         
@@ -82,41 +217,92 @@ class YoutubeDownloader:
             url: YouTube URL
             quality: Resolution (e.g., "1080p") or bitrate (e.g., "192kbps")
             mode: "video_only", "audio_only", or "video_audio"
+            progress_callback: Receives the percent of this download only
+            job_id: Identifies the download; also prefixes the output file
+                so concurrent downloads of the same video don't collide
+            postprocessor_hooks: Extra yt-dlp postprocessor hooks for this download
+            audio_format: For audio_only, "original" keeps the native stream
+                (m4a/opus) without re-encoding, "mp3" converts, "auto" keeps it
+                too unless ffmpeg can't write its codec as it is
         
         Returns:
             Path to downloaded file
         """
+        if job_id is None:
+            job_id = str(uuid.uuid4())
+            outtmpl = '%(title)s.%(ext)s'
+        else:
+            outtmpl = f'{job_id}_%(title)s.%(ext)s'
+
+        with self._sinks_lock:
+            self._sinks[job_id] = progress_callback or self.progress_callback
+            self._progress[job_id] = CombinedProgress()
+            self._trackers[job_id] = ProgressTracker()
+        try:
+            return self._download(url, quality, mode, job_id, outtmpl, postprocessor_hooks, audio_format)
+        finally:
+            with self._sinks_lock:
+                self._sinks.pop(job_id, None)
+                self._progress.pop(job_id, None)
+                self._trackers.pop(job_id, None)
+
+    def _download(self, url: str, quality: str, mode: str, job_id: str, outtmpl: str,
+                  postprocessor_hooks: Optional[List[Callable]], audio_format: str) -> str:
         ydl_opts = {
-            'outtmpl': os.path.join(self.download_dir, '%(title)s.%(ext)s'),
-            'progress_hooks': [self._progress_hook],
+            'outtmpl': os.path.join(self.download_dir, outtmpl),
+            'progress_hooks': [functools.partial(self._progress_hook, job_id)],
+            'postprocessor_hooks': postprocessor_hooks or [],
             'quiet': True,
             'no_warnings': True,
         }
         
-        if mode == 'audio_only':
-            # Extract audio only
+        # The cheapest postprocessing the ffmpeg found can do; without it files
+        # are kept as YouTube serves them
+        ffmpeg = self.ffmpeg.get()
+        ydl_opts['ffmpeg_location'] = ffmpeg.path if ffmpeg else None
+
+        if mode == 'audio_only' and ffmpeg is not None:
+            # Copy or MP3 is decided below, once the source codec is known
             ydl_opts['format'] = 'bestaudio/best'
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': quality.replace('kbps', ''),
-            }]
+        elif mode == 'audio_only':
+            ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio'
         elif mode == 'video_only':
             # Video only (no audio)
             height = quality.replace('p', '')
             ydl_opts['format'] = f'bestvideo[height<={height}]'
-        else:  # video_audio
+        elif ffmpeg is not None and ffmpeg.can_mux('mp4'):  # video_audio
             # Best video + audio, merge with ffmpeg
             height = quality.replace('p', '')
             ydl_opts['format'] = f'bestvideo[height<={height}]+bestaudio/best[height<={height}]'
             ydl_opts['merge_output_format'] = 'mp4'
+        else:
+            # Nothing to merge with: a single file that has both
+            height = quality.replace('p', '')
+            ydl_opts['format'] = f'best[height<={height}]/best'
+
+        if mode == 'audio_only':
+            # The extracted info is cached, so this costs no extra request
+            bitrate = quality.replace('kbps', '')
+            postprocessor = audio_postprocessor(ffmpeg, audio_format,
+                                                int(bitrate) if bitrate.isdigit() else None,
+                                                best_audio_format(self._extract_info(ydl_opts, url)))
+            if postprocessor:
+                ydl_opts['postprocessors'] = [postprocessor]
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
-            
-            # Handle audio conversion
-            if mode == 'audio_only':
-                filename = filename.rsplit('.', 1)[0] + '.mp3'
+        import yt_dlp  # loaded on first use (or by preload_yt_dlp) to keep startup fast
+        with connection_budget.lease() as connections, yt_dlp.YoutubeDL({**ydl_opts, **tuned_options(connections)}) as ydl:
+            if mode == 'video_audio':
+                with self._sinks_lock:
+                    progress = self._progress.get(job_id)
+                # Straight from the network into ffmpeg when the streams allow it
+                merged = merge_streams_piped(ydl, self._extract_info(ydl_opts, url), progress)
+                if merged:
+                    return merged
+                # Otherwise fetch both streams at once; the pass below then only merges
+                fetch_streams_parallel(ydl, self._extract_info(ydl_opts, url), progress)
+            info = ydl.process_ie_result(self._extract_info(ydl_opts, url), download=True)
             
-            return filename
+            # Where the file ended up after postprocessing (audio extraction
+            # changes its extension)
+            downloads = info.get('requested_downloads') or [{}]
+            return downloads[-1].get('filepath') or ydl.prepare_filename(info)
@@ -0,0 +1,177 @@
+# Copied from shared/events.py by shared/sync.py: edit that file, not this copy
+import os
+import json
+import time
+import asyncio
+import threading
+
+# At most this many updates per second are sent per stream; newer states
+# replace older ones that were not sent yet
+MIN_INTERVAL = 0.25
+# Re-read job state this often even without a local publish (e.g. when the
+# job runs in another worker process)
+POLL_INTERVAL = 1.0
+# Comment line that keeps proxies from closing an idle stream
+HEARTBEAT = 15.0
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Threads of a server process kept free for the other requests, however
+# many event streams are open: this share of them, at least MIN_RESERVED
+RESERVED_SHARE = 0.25
+MIN_RESERVED = 2
+
+
+class ProgressBroker:
+    """Wakes up event streams whenever a job status changes in this process."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._listeners = []
+        self.version = 0
+
+    def publish(self):
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+        for listener in list(self._listeners):
+            listener()
+
+    def add_listener(self, listener):
+        """Calls listener() after every publish, on the publishing thread."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def wait(self, version, timeout):
+        """Blocks until something is published after `version` (or timeout)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class AsyncBroker:
+    """Lets coroutines of one event loop await the publishes of a ProgressBroker.
+
+    Publishes come from download threads; at most one wake-up per loop
+    iteration is handed to the loop however many of them arrive meanwhile.
+    """
+
+    def __init__(self, broker, loop):
+        self._broker = broker
+        self._loop = loop
+        self._changed = asyncio.Event()
+        self._pending = False
+        self.version = broker.version
+        broker.add_listener(self._notify)
+
+    def close(self):
+        self._broker.remove_listener(self._notify)
+
+    def _notify(self):
+        if not self._pending:
+            self._pending = True
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Cleared before reading the version, so a publish racing with this
+        # either is seen here or schedules another wake-up
+        self._pending = False
+        self.version = self._broker.version
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, version, timeout):
+        """Waits until something is published after `version` (or timeout)."""
+        if self.version == version:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.version
+
+
+def max_streams(threads):
+    """Event streams a threaded server process keeps open at once.
+
+    Each open stream holds one of the process's `threads` server threads, so
+    past this limit a stream gets a 503 and the client polls the status
+    route instead. SSE_MAX_STREAMS overrides it.
+    """
+    if os.environ.get('SSE_MAX_STREAMS'):
+        return int(os.environ['SSE_MAX_STREAMS'])
+    return max(1, threads - max(MIN_RESERVED, int(threads * RESERVED_SHARE)))
+
+
+class StreamLimit:
+    """Counts the event streams a threaded server has open; at most `limit` at once."""
+
+    def __init__(self, limit):
+        self._slots = threading.BoundedSemaphore(max(0, limit))
+
+    def acquire(self):
+        """Takes a slot for a new stream without waiting; False when all are in use."""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+
+def event_stream(job_ids, read_status, is_final, broker):
+    """Server-Sent Events for a set of jobs.
+
+    read_status(job_id) returns the status dict sent to clients (None if the
+    job is unknown); every changed status is sent as one `data:` message with
+    its job_id. The stream ends once every job is final.
+    """
+    sent = {}
+    last_write = time.monotonic()
+    version = broker.version
+    while True:
+        changed = False
+        statuses = {job_id: read_status(job_id) for job_id in job_ids}
+        for job_id, status in statuses.items():
+            if status != sent.get(job_id, {}):
+                sent[job_id] = status
+                payload = dict(status or {'status': 'error', 'error': 'not found'}, job_id=job_id)
+                yield f"data: {json.dumps(payload)}\n\n"
+                changed = True
+        if all(status is None or is_final(status) for status in statuses.values()):
+            return
+
+        now = time.monotonic()
+        if changed:
+            last_write = now
+            time.sleep(MIN_INTERVAL)
+        elif now - last_write >= HEARTBEAT:
+            last_write = now
+            yield ": keepalive\n\n"
+        version = broker.wait(version, POLL_INTERVAL)
+
+
+async def async_event_stream(job_ids, read_status, is_final, broker):
+    """event_stream for ASGI servers; `broker` is an AsyncBroker."""
+    sent = {}
+    last_write = time.monotonic()
+    version = broker.version
+    while True:
+        changed = False
+        statuses = {job_id: read_status(job_id) for job_id in job_ids}
+        for job_id, status in statuses.items():
+            if status != sent.get(job_id, {}):
+                sent[job_id] = status
+                payload = dict(status or {'status': 'error', 'error': 'not found'}, job_id=job_id)
+                yield f"data: {json.dumps(payload)}\n\n"
+                changed = True
+        if all(status is None or is_final(status) for status in statuses.values()):
+            return
+
+        now = time.monotonic()
+        if changed:
+            last_write = now
+            await asyncio.sleep(MIN_INTERVAL)
+        elif now - last_write >= HEARTBEAT:
+            last_write = now
+            yield ": keepalive\n\n"
+        version = await broker.wait(version, POLL_INTERVAL)
@@ -0,0 +1,172 @@
+# Copied from shared/ffmpeg_registry.py by shared/sync.py: edit that file, not this copy
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+PROBE_TIMEOUT = 10
+# Encoders that produce a codec yt-dlp may be asked to convert to
+ENCODERS = {
+    'mp3': ('libmp3lame', 'libshine', 'mp3_mf'),
+    'aac': ('aac', 'libfdk_aac', 'aac_mf'),
+    'opus': ('libopus', 'opus'),
+}
+# Audio outputs: 'original' keeps the best native stream (m4a/opus/...) and
+# only remuxes it, 'mp3' re-encodes, 'auto' copies too and re-encodes only
+# when this ffmpeg can't write the stream's codec as it is
+AUDIO_FORMATS = ('auto', 'original', 'mp3')
+# Files FFmpegExtractAudio keeps untouched when copying
+KEPT_AUDIO_EXTS = ('m4a', 'mp3', 'ogg', 'opus', 'flac', 'wav', 'mka')
+# Muxer FFmpegExtractAudio needs to copy each codec into its own file
+COPY_MUXERS = {'mp4a': 'ipod', 'aac': 'ipod', 'opus': 'opus', 'vorbis': 'ogg', 'mp3': 'mp3', 'flac': 'flac'}
+
+
+def _run(path, *args):
+    result = subprocess.run(
+        [path, '-hide_banner', *args], capture_output=True, text=True, timeout=PROBE_TIMEOUT,
+        # No console window flashing up from a frozen Windows GUI
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    )
+    return result.stdout
+
+
+def _listing(output, flag):
+    """Names from an ffmpeg -muxers/-encoders listing whose flags contain flag."""
+    names = set()
+    started = False
+    for line in output.splitlines():
+        if not started:
+            started = re.fullmatch(r'\s*-{2,}\s*', line) is not None
+            continue
+        parts = line.split()
+        if len(parts) >= 2 and flag in parts[0]:
+            names.update(parts[1].split(','))
+    return names
+
+
+class FFmpeg:
+    """One ffmpeg binary: where it is, its version and what it can write."""
+
+    def __init__(self, path, ffprobe, version, muxers, encoders):
+        self.path = path
+        self.ffprobe = ffprobe
+        self.version = version
+        self.muxers = muxers
+        self.encoders = encoders
+        self.threads = os.cpu_count() or 1
+
+    @classmethod
+    def probe(cls, path):
+        version_output = _run(path, '-version')
+        match = re.match(r'ffmpeg version (\S+)', version_output)
+        if not match:
+            raise OSError(f"{path} is not ffmpeg")
+        name = os.path.basename(path).replace('ffmpeg', 'ffprobe', 1)
+        ffprobe = os.path.join(os.path.dirname(path), name)
+        if not os.path.isfile(ffprobe):
+            ffprobe = shutil.which('ffprobe')
+        return cls(path, ffprobe, match.group(1),
+                   _listing(_run(path, '-muxers'), 'E'), _listing(_run(path, '-encoders'), 'A'))
+
+    def can_mux(self, container):
+        return container in self.muxers
+
+    def can_encode(self, codec):
+        return any(encoder in self.encoders for encoder in ENCODERS.get(codec, (codec,)))
+
+    def as_dict(self):
+        return {'path': self.path, 'ffprobe': self.ffprobe, 'version': self.version,
+                'threads': self.threads, 'muxers': len(self.muxers), 'encoders': len(self.encoders)}
+
+
+class FFmpegRegistry:
+    """Finds and probes ffmpeg once per process.
+
+    candidates are paths or command names (looked up on PATH), best first.
+    The result, also "no ffmpeg", is kept; it is only looked up again when
+    the chosen binary changes on disk (one stat per get) or after
+    invalidate(), e.g. once ffmpeg has been installed.
+    """
+
+    def __init__(self, candidates):
+        self.candidates = list(candidates)
+        self._ffmpeg = None
+        self._signature = None
+        self._resolved = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _resolve(self):
+        for candidate in self.candidates:
+            path = candidate if os.path.dirname(candidate) else shutil.which(candidate)
+            if not path or not os.path.isfile(path):
+                continue
+            try:
+                return FFmpeg.probe(path)
+            except (OSError, subprocess.SubprocessError):
+                continue
+        return None
+
+    def get(self):
+        """The FFmpeg in use, or None if there is none."""
+        with self._lock:
+            if self._resolved and (self._ffmpeg is None or self._stat(self._ffmpeg.path) == self._signature):
+                return self._ffmpeg
+            self._ffmpeg = self._resolve()
+            self._signature = self._stat(self._ffmpeg.path) if self._ffmpeg else None
+            self._resolved = True
+            return self._ffmpeg
+
+    def invalidate(self):
+        with self._lock:
+            self._resolved = False
+
+    @property
+    def location(self):
+        """Value for yt-dlp's ffmpeg_location (None lets yt-dlp search PATH)."""
+        ffmpeg = self.get()
+        return ffmpeg.path if ffmpeg else None
+
+
+def best_audio_format(info):
+    """The audio-only format of an info dict with the highest bitrate, if there is one."""
+    formats = [f for f in info.get('formats') or []
+               if f.get('acodec') not in (None, 'none') and f.get('vcodec') in (None, 'none')]
+    return max(formats, key=lambda f: f.get('abr') or 0) if formats else None
+
+
+def can_copy_audio(ffmpeg, source):
+    """Whether ffmpeg can keep the stream of the audio format source without re-encoding it."""
+    if not source or source.get('ext') in KEPT_AUDIO_EXTS:
+        return True
+    muxer = COPY_MUXERS.get((source.get('acodec') or '').split('.')[0])
+    return muxer is not None and ffmpeg.can_mux(muxer)
+
+
+def audio_postprocessor(ffmpeg, audio_format='auto', bitrate=None, source=None):
+    """yt-dlp FFmpegExtractAudio settings for an audio download, None to keep the file as downloaded.
+
+    Copying the stream costs next to nothing; re-encoding to MP3 decodes and
+    encodes the whole track and loses quality, so it only happens when MP3
+    is asked for, or with 'auto' when ffmpeg can't write the codec of source
+    (the format from best_audio_format) as it is. Without an MP3 encoder the
+    stream is copied anyway.
+    """
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unknown audio format: {audio_format}")
+    if ffmpeg is None:
+        return None
+    if audio_format == 'auto':
+        audio_format = 'original' if can_copy_audio(ffmpeg, source) else 'mp3'
+    if audio_format == 'mp3' and ffmpeg.can_encode('mp3'):
+        return {'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': str(bitrate or 192)}
+    # 'best' keeps the codec: m4a/opus files stay as they are, others are remuxed
+    return {'key': 'FFmpegExtractAudio', 'preferredcodec': 'best'}
@@ -0,0 +1,221 @@
+# Copied from shared/pipe_merge.py by shared/sync.py: edit that file, not this copy
+import os
+import re
+import copy
+import threading
+import subprocess
+
+from tuning import connection_budget
+
+# Bytes read from the network and written to ffmpeg at a time
+BLOCK_SIZE = 256 * 1024
+# Attempts per stream after network errors in a row; each resumes where it
+# stopped, and a response that brings data resets the count
+RETRIES = 3
+# Containers ffmpeg can read front to back from a pipe. MP4 only when it is
+# fragmented (DASH), with the index at the start instead of the end
+_PIPEABLE = re.compile(r'(webm|mp4|m4a)_dash|webm')
+
+_CONTENT_RANGE_RE = re.compile(r'bytes \d+-\d+/(\d+)')
+
+
+def can_pipe(selected):
+    """Whether a merged format selection can be downloaded straight into ffmpeg.
+
+    Needs plain HTTP(S) streams (not HLS/DASH fragments) in a container ffmpeg
+    reads sequentially, and inherited pipe descriptors, which Windows lacks.
+    """
+    formats = selected.get('requested_formats') or []
+    return (os.name == 'posix' and len(formats) == 2 and all(
+        fmt.get('protocol') in ('http', 'https') and fmt.get('url')
+        and _PIPEABLE.fullmatch(fmt.get('container') or fmt.get('ext') or '')
+        for fmt in formats))
+
+
+def _stream(ydl, fmt, pipe, report):
+    """Writes fmt's file into pipe, in the chunks YouTube expects, resuming after network errors."""
+    from yt_dlp.networking import Request
+    from yt_dlp.networking.exceptions import TransportError
+
+    chunk_size = (fmt.get('downloader_options') or {}).get('http_chunk_size') or ydl.params.get('http_chunk_size')
+    size = fmt.get('filesize')
+    done = 0
+    attempt = 0
+    while size is None or done < size:
+        headers = dict(fmt.get('http_headers') or {})
+        if chunk_size:
+            end = done + chunk_size - 1
+            headers['Range'] = f"bytes={done}-{min(end, size - 1) if size else end}"
+        elif done:
+            headers['Range'] = f"bytes={done}-"
+        received = 0
+        try:
+            with ydl.urlopen(Request(fmt['url'], headers=headers)) as response:
+                if response.status != 206:
+                    if done:
+                        raise TransportError(f"format {fmt['format_id']}: the server can't resume the download")
+                    chunk_size = None  # the whole file comes in this response
+                if size is None:
+                    match = _CONTENT_RANGE_RE.match(response.headers.get('Content-Range') or '')
+                    length = response.headers.get('Content-Length') or ''
+                    if match:
+                        size = int(match.group(1))
+                    elif response.status != 206 and length.isdigit():
+                        size = int(length)
+                while block := response.read(BLOCK_SIZE):
+                    pipe.write(block)
+                    done += len(block)
+                    received += len(block)
+                    report(done, size)
+        except TransportError:
+            if received:
+                attempt = 0  # only failures in a row count
+            if attempt >= RETRIES:
+                raise
+            attempt += 1
+            continue
+        if received:
+            attempt = 0
+        if size is None:
+            break  # read to the end of a file of unknown length
+        if done < size and (not received or not chunk_size):
+            # The response ended early without an error
+            if attempt >= RETRIES:
+                raise TransportError(f"format {fmt['format_id']}: the download stopped at {done} of {size} bytes")
+            attempt += 1
+    return done
+
+
+def merge_streams_piped(ydl, info, progress=None, started=None):
+    """Downloads the video and audio of a merged selection straight into ffmpeg.
+
+    yt-dlp writes both streams to .fNNN files and then lets ffmpeg read them
+    back into a third file: about three times the size in disk I/O. Here both
+    streams go from the network into ffmpeg through pipes and only the merged
+    file (ext from merge_output_format) is written, in one pass, with the
+    'merger+ffmpeg_o' postprocessor arguments of ydl.
+
+    Progress is reported to ydl's progress hooks like a normal download;
+    progress, if given, gets expect(filename, size) for both streams up front
+    and started(path) is called with the file ffmpeg writes into. No ffmpeg slot
+    of the scheduler is taken: a stream copy costs next to no CPU.
+
+    Returns the path of the merged file, or None when the selection can't be
+    piped, ffmpeg could not read it or a stream failed with a network or HTTP
+    error (yt-dlp's RequestError) after its retries, or when the job can't
+    get a connection of tuning.connection_budget for each stream without
+    waiting; the caller then downloads it the usual way (info is not
+    modified). Other errors are raised.
+    """
+    from yt_dlp.utils import prepend_extension
+
+    ffmpeg = ydl.params.get('ffmpeg_location')
+    if not ffmpeg or os.path.isdir(ffmpeg):
+        return None
+    selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+    if not can_pipe(selected):
+        return None
+    formats = selected['requested_formats']
+    filename = ydl.prepare_filename(selected)
+    if os.path.exists(filename) and not ydl.params.get('overwrites'):
+        return None  # yt-dlp reports it as already downloaded
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    # The names yt-dlp would give the separate files, for the progress hooks
+    base = os.path.splitext(filename)[0]
+    stream_filenames = [prepend_extension(f"{base}.{fmt['ext']}", f"f{fmt['format_id']}", fmt['ext'])
+                        for fmt in formats]
+    if progress is not None:
+        for fmt, stream_filename in zip(formats, stream_filenames):
+            progress.expect(stream_filename, fmt.get('filesize') or fmt.get('filesize_approx'))
+
+    # Both streams are open at once. A job that holds fewer connections doesn't
+    # wait for more while holding its own, which could deadlock with jobs doing
+    # the same: the usual download then fetches one stream after the other
+    granted = ydl.params.get('concurrent_fragment_downloads') or 1
+    with connection_budget.top_up(granted, len(formats)) as extra:
+        if granted + extra < len(formats):
+            return None
+        return _merge(ydl, ffmpeg, selected, formats, filename, stream_filenames, started)
+
+
+def _merge(ydl, ffmpeg, selected, formats, filename, stream_filenames, started):
+    """The piping part of merge_streams_piped, with connections for every stream."""
+    from yt_dlp.utils import prepend_extension
+    from yt_dlp.networking.exceptions import RequestError
+
+    tmp_filename = prepend_extension(filename, 'temp')
+    # Mapped like yt-dlp's merger: each input contributes its video or audio
+    maps = []
+    for i, fmt in enumerate(formats):
+        if fmt.get('vcodec') != 'none':
+            maps += ['-map', f'{i}:v:0']
+        if fmt.get('acodec') != 'none':
+            maps += ['-map', f'{i}:a:0']
+    output_args = (ydl.params.get('postprocessor_args') or {}).get('merger+ffmpeg_o') or []
+
+    pipes = [os.pipe() for _ in formats]
+    inputs = ['pipe:0'] + [f'pipe:{read_fd}' for read_fd, _ in pipes[1:]]
+    command = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y']
+    for source in inputs:
+        command += ['-i', source]
+    command += [*maps, '-c', 'copy', *output_args, tmp_filename]
+    try:
+        proc = subprocess.Popen(command, stdin=pipes[0][0], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                pass_fds=[read_fd for read_fd, _ in pipes[1:]])
+    except OSError:
+        for read_fd, write_fd in pipes:
+            os.close(read_fd)
+            os.close(write_fd)
+        return None
+    for read_fd, _ in pipes:
+        os.close(read_fd)
+    if started:
+        started(tmp_filename)
+
+    hooks = ydl.params.get('progress_hooks') or []
+    errors = []
+    stopped = threading.Event()  # ffmpeg quit before it had all the data
+
+    def feed(fmt, stream_filename, write_fd):
+        total = fmt.get('filesize') or fmt.get('filesize_approx')
+
+        def report(downloaded, size):
+            d = {'status': 'downloading', 'filename': stream_filename, 'tmpfilename': tmp_filename,
+                 'downloaded_bytes': downloaded, 'info_dict': selected}
+            d['total_bytes' if size else 'total_bytes_estimate'] = size or total
+            for hook in hooks:
+                hook(d)
+
+        # Closing the pipe, also after an error, is what lets ffmpeg finish
+        try:
+            with open(write_fd, 'wb') as pipe:
+                downloaded = _stream(ydl, fmt, pipe, report)
+        except BrokenPipeError:
+            stopped.set()
+            return
+        except Exception as e:
+            errors.append(e)
+            proc.kill()  # the other stream stops with a broken pipe
+            return
+        for hook in hooks:
+            hook({'status': 'finished', 'filename': stream_filename, 'downloaded_bytes': downloaded,
+                  'total_bytes': downloaded, 'info_dict': selected})
+
+    threads = [threading.Thread(target=feed, args=(fmt, stream_filename, write_fd), daemon=True)
+               for fmt, stream_filename, (_, write_fd) in zip(formats, stream_filenames, pipes)]
+    for thread in threads:
+        thread.start()
+    _, stderr = proc.communicate()
+    for thread in threads:
+        thread.join()
+
+    if errors or stopped.is_set() or proc.returncode != 0:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        if errors and not isinstance(errors[0], RequestError):
+            raise errors[0]
+        reason = errors[0] if errors else stderr.decode(errors='replace').strip()[-300:]
+        ydl.report_warning(f"Merging through pipes failed, using temporary files: {reason}")
+        return None
+    os.replace(tmp_filename, filename)
+    return filename
@@ -0,0 +1,106 @@
+# Copied from shared/scheduler.py by shared/sync.py: edit that file, not this copy
+import os
+import math
+import time
+import heapq
+import itertools
+import threading
+
+# Postprocessors that run ffmpeg over the whole file and therefore need a slot
+FFMPEG_POSTPROCESSORS = ('Merger', 'ExtractAudio', 'VideoRemuxer', 'VideoConvertor')
+
+
+class QueueFull(Exception):
+    """Raised by DownloadScheduler.submit when no more jobs can be queued."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Download queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PostprocessGate:
+    """Holds one ffmpeg slot while a job's ffmpeg postprocessors run.
+
+    `hook` is registered as a yt-dlp postprocessor hook; `release` must be called
+    when the job ends so a failed postprocessor never leaks its slot.
+    """
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._held = False
+
+    def hook(self, d):
+        if d.get('postprocessor') not in FFMPEG_POSTPROCESSORS:
+            return
+        if d['status'] == 'started' and not self._held:
+            self._semaphore.acquire()
+            self._held = True
+        elif d['status'] == 'finished':
+            self.release()
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._semaphore.release()
+
+
+class DownloadScheduler:
+    """Runs download jobs on a fixed number of worker threads.
+
+    Jobs wait in a priority queue (lower priority value first, FIFO within the
+    same priority). Limits come from DOWNLOAD_SLOTS, FFMPEG_SLOTS and MAX_QUEUE.
+    """
+
+    def __init__(self, slots=None, ffmpeg_slots=None, max_queue=None):
+        self.slots = slots or int(os.environ.get('DOWNLOAD_SLOTS', 2))
+        self.max_queue = max_queue or int(os.environ.get('MAX_QUEUE', 20))
+        self.ffmpeg_slots = ffmpeg_slots or int(os.environ.get('FFMPEG_SLOTS', 1))
+        self._ffmpeg = threading.BoundedSemaphore(self.ffmpeg_slots)
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = 0
+        # Moving average of job duration, used to estimate Retry-After
+        self._avg_duration = 60.0
+
+    def submit(self, job_id, fn, *args, priority=0):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull(self.retry_after())
+            heapq.heappush(self._queue, (priority, next(self._seq), job_id, fn, args))
+            if len(self._workers) < self.slots:
+                worker = threading.Thread(target=self._work, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify()
+
+    def position(self, job_id):
+        """1-based place of a job in the queue, or None once it has started."""
+        with self._cond:
+            for pos, entry in enumerate(sorted(self._queue), 1):
+                if entry[2] == job_id:
+                    return pos
+        return None
+
+    def retry_after(self):
+        # A queue place frees up roughly every avg_duration / slots seconds
+        return max(1, math.ceil(self._avg_duration / self.slots))
+
+    def postprocess_gate(self):
+        return PostprocessGate(self._ffmpeg)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job_id, fn, args = heapq.heappop(self._queue)
+                self._running += 1
+            started = time.monotonic()
+            try:
+                fn(job_id, *args)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
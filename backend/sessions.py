@@ -0,0 +1,289 @@
+"""Download sessions shared by the Flask (app.py) and ASGI (asgi.py) servers.
+
+Everything here is framework-free: session state, the scheduler tasks that
+fill it, the journal that lets a restart resume it and the janitor that
+expires it. Importing the module restores the journal and starts cleanup.
+"""
+from downloader import YoutubeDownloader, BATCH_WORKERS
+from scheduler import DownloadScheduler, QueueFull
+from events import ProgressBroker, POLL_INTERVAL
+from zip_stream import unique_name
+from journal import JobJournal, reclaim_partials
+from storage import ExpiryScheduler, StorageJanitor, JOB_FILE
+from ydl_pool import preload_yt_dlp
+import os
+import re
+import time
+import uuid
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Global storage for download sessions
+download_sessions: Dict[str, Dict] = {}
+# Playlist batches: batch id -> title and the sessions of its videos
+batch_sessions: Dict[str, Dict] = {}
+downloader = YoutubeDownloader()
+scheduler = DownloadScheduler()
+# Pushes session changes to /events streams
+broker = ProgressBroker()
+# Session transitions on disk, so a restart resumes interrupted downloads
+journal = JobJournal(os.environ.get('JOB_JOURNAL_PATH', os.path.join(downloader.download_dir, 'journal.jsonl')))
+# Finished sessions and their files are kept this long, then removed by `expiry`
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 3600))
+expiry = ExpiryScheduler(lambda key: expire_session(key))
+# Past DOWNLOADS_QUOTA_MB the oldest finished files are deleted early
+janitor = StorageJanitor(downloader.download_dir, int(os.environ.get('DOWNLOADS_QUOTA_MB', 2048)) * 1024 * 1024)
+# How often reconcile() looks for files no session knows about
+RECONCILE_INTERVAL = 600
+
+
+def new_session() -> Dict:
+    return {'status': 'queued', 'progress': 0, 'file_path': None, 'error': None}
+
+
+def update_session(session_id: str, **fields):
+    """Update a download session and wake up its event streams."""
+    download_sessions[session_id].update(fields)
+    if fields.get('status') in ('completed', 'error'):
+        journal.record(session_id, fields['status'],
+                       file_path=fields.get('file_path'), error=fields.get('error'))
+        expiry.schedule(session_id, time.time() + SESSION_TTL)
+    broker.publish()
+
+
+def display_name(file_path: str) -> str:
+    """File name without the "<session id>_" prefix it was downloaded under."""
+    return re.sub(r'^[0-9a-f-]{36}_', '', os.path.basename(file_path))
+
+
+def run_download(session_id: str, fetch: Callable):
+    """Runs fetch(progress_callback, postprocessor_hooks) -> file path on a scheduler worker thread."""
+    def update_progress(percent):
+        update_session(session_id, progress=percent, status='downloading')
+
+    gate = scheduler.postprocess_gate()
+    update_session(session_id, status='starting')
+    try:
+        file_path = fetch(update_progress, [gate.hook])
+        update_session(session_id, status='completed', progress=100, file_path=file_path)
+        enforce_quota()
+    except Exception as e:
+        update_session(session_id, status='error', error=str(e))
+    finally:
+        gate.release()
+
+
+def download_task(session_id: str, url: str, quality: str, mode: str, audio_format: str = 'auto'):
+    """Runs one download on a scheduler worker thread."""
+    run_download(session_id, lambda progress_callback, postprocessor_hooks: downloader.download(
+        url, quality, mode, progress_callback=progress_callback, job_id=session_id,
+        postprocessor_hooks=postprocessor_hooks, audio_format=audio_format))
+
+
+def batch_item_task(session_id: str, item: Dict, quality: str, mode: str, audio_format: str = 'auto'):
+    """Runs one video of a batch; videos in the download archive complete at once."""
+    run_download(session_id, lambda progress_callback, postprocessor_hooks: downloader.download_item(
+        item, quality, mode, progress_callback=progress_callback,
+        postprocessor_hooks=postprocessor_hooks, audio_format=audio_format))
+
+
+def queue_download(url: str, quality: str, mode: str, audio_format: str = 'auto') -> str:
+    """Creates a session for one video and queues it; raises QueueFull when busy."""
+    session_id = str(uuid.uuid4())
+    download_sessions[session_id] = new_session()
+
+    # Audio jobs are short, so they skip ahead of queued video merges
+    priority = 0 if mode == 'audio_only' else 1
+    try:
+        scheduler.submit(session_id, download_task, url, quality, mode, audio_format, priority=priority)
+    except QueueFull:
+        del download_sessions[session_id]
+        raise
+    journal.record(session_id, 'queued', url=url, quality=quality, mode=mode, audio_format=audio_format,
+                   priority=priority)
+    return session_id
+
+
+def run_batch(batch_id: str, items: List[Dict], quality: str, mode: str, audio_format: str = 'auto'):
+    """Keeps BATCH_WORKERS videos of a batch in the scheduler at a time, on its own thread.
+
+    Every video is a scheduler job of its own, so a batch holds a download
+    slot for each video that is running, and a long playlist neither fills
+    the queue nor starves single downloads.
+    """
+    pending = list(items)
+    active = []
+    version = broker.version
+    while pending or active:
+        active = [session_id for session_id in active
+                  if not is_final(download_sessions.get(session_id) or {'status': 'error'})]
+        while pending and len(active) < BATCH_WORKERS:
+            item = pending[0]
+            try:
+                scheduler.submit(item['session_id'], batch_item_task, item, quality, mode, audio_format,
+                                 priority=2)
+            except QueueFull:
+                break  # retried when a queue place frees up
+            pending.pop(0)
+            active.append(item['session_id'])
+        version = broker.wait(version, POLL_INTERVAL)
+    journal.record(batch_id, 'completed')
+    expiry.schedule(batch_id, time.time() + SESSION_TTL)
+
+
+def queue_batch(title: str, items: List[Dict], quality: str, mode: str, audio_format: str = 'auto') -> str:
+    """Creates the sessions of a batch and starts queueing its videos."""
+    batch_id = str(uuid.uuid4())
+    for item in items:
+        item['session_id'] = item['job_id'] = str(uuid.uuid4())
+        download_sessions[item['session_id']] = new_session()
+    batch_sessions[batch_id] = {'title': title, 'items': items}
+    journal.record(batch_id, 'batch', title=title, items=items, quality=quality, mode=mode,
+                   audio_format=audio_format)
+    threading.Thread(target=run_batch, args=(batch_id, items, quality, mode, audio_format), daemon=True).start()
+    return batch_id
+
+
+def session_status(session_id: str) -> Optional[Dict]:
+    """Status of a session as sent to clients, or None if it doesn't exist."""
+    session = download_sessions.get(session_id)
+
+    if not session:
+        return None
+
+    response = {
+        'status': session['status'],
+        'progress': session['progress']
+    }
+
+    if session['status'] == 'queued':
+        response['queue_position'] = scheduler.position(session_id)
+    elif session['status'] == 'error':
+        response['error'] = session['error']
+    elif session['status'] == 'completed':
+        response['filename'] = display_name(session['file_path'])
+
+    return response
+
+
+def is_final(status: Dict) -> bool:
+    return status['status'] in ('completed', 'error')
+
+
+def finished_files(session_ids):
+    """(name, path) of each session's file as soon as it completes; failed ones are skipped."""
+    remaining = list(session_ids)
+    used_names = set()
+    version = broker.version
+    while remaining:
+        for session_id in list(remaining):
+            session = download_sessions.get(session_id)
+            if session and session['status'] == 'completed':
+                remaining.remove(session_id)
+                yield unique_name(display_name(session['file_path']), used_names), session['file_path']
+            elif not session or session['status'] == 'error':
+                remaining.remove(session_id)
+        if remaining:
+            version = broker.wait(version, POLL_INTERVAL)
+
+
+def referenced_files() -> set:
+    # Batch items served from the archive share the file of an older session
+    return {s['file_path'] for s in list(download_sessions.values()) if s.get('file_path')}
+
+
+def expire_session(key: str):
+    """Drops an expired session (or batch) and the files only it uses."""
+    if batch_sessions.pop(key, None) is not None:
+        return
+    download_sessions.pop(key, None)
+    in_use = referenced_files()
+    for path in janitor.files_of(key):
+        if path not in in_use:
+            janitor.remove(path, 'expired')
+
+
+def enforce_quota():
+    """Deletes the oldest finished files once the folder is over its quota."""
+    files = janitor.files()
+    usage = sum(size for _, size, _ in files)
+    if usage <= janitor.quota_bytes:
+        return
+    target = janitor.quota_bytes * janitor.low_watermark
+    running = {sid for sid, s in list(download_sessions.items()) if s['status'] not in ('completed', 'error')}
+    for _, size, path in files:
+        if usage <= target:
+            break
+        match = JOB_FILE.match(os.path.basename(path))
+        # Only session files; the journal and the archive stay
+        if not match or match.group('job_id') in running:
+            continue
+        usage -= janitor.remove(path, 'quota')
+
+
+def reconcile():
+    """Catches what the expiry heap can't see: files of sessions lost in a crash."""
+    now = time.time()
+    in_use = referenced_files()
+    for session_id, path in janitor.job_files():
+        if session_id in download_sessions or path in in_use:
+            continue
+        try:
+            idle = now - os.path.getmtime(path)
+        except OSError:
+            continue
+        if idle > SESSION_TTL:
+            janitor.remove(path, 'orphaned')
+    enforce_quota()
+
+
+def cleanup():
+    while True:
+        reconcile()
+        time.sleep(RECONCILE_INTERVAL)
+
+
+def resume_sessions():
+    """Restores sessions from the journal and queues interrupted downloads again.
+
+    The output files keep their "<session id>_" prefix, so yt-dlp continues
+    from the .part files of the interrupted run.
+    """
+    recovered, claimed = journal.recover()
+    for session_id, entry in recovered.items():
+        if entry['state'] in ('completed', 'error'):
+            download_sessions[session_id] = {
+                'status': entry['state'],
+                'progress': 100 if entry['state'] == 'completed' else 0,
+                'file_path': entry.get('file_path'),
+                'error': entry.get('error')
+            }
+            expiry.schedule(session_id, entry['at'] + SESSION_TTL)
+
+    for job_id in claimed:
+        entry = recovered[job_id]
+        if entry['state'] == 'batch':
+            for item in entry['items']:
+                if item['session_id'] not in download_sessions:
+                    download_sessions[item['session_id']] = new_session()
+            batch_sessions[job_id] = {'title': entry['title'], 'items': entry['items']}
+            # Items that finished before the restart were restored above
+            pending = [item for item in entry['items'] if not is_final(download_sessions[item['session_id']])]
+            threading.Thread(target=run_batch, args=(job_id, pending, entry['quality'], entry['mode'],
+                                                     entry.get('audio_format', 'auto')), daemon=True).start()
+            continue
+        download_sessions[job_id] = new_session()
+        try:
+            scheduler.submit(job_id, download_task, entry['url'], entry['quality'], entry['mode'],
+                             entry.get('audio_format', 'auto'), priority=entry['priority'])
+        except QueueFull:
+            journal.record(job_id, 'dropped')
+            download_sessions[job_id].update(status='error', error='Server is busy, try again later')
+
+    freed, files = reclaim_partials(downloader.download_dir, recovered)
+    janitor.count('orphaned', freed, files)
+
+
+preload_yt_dlp()
+resume_sessions()
+threading.Thread(target=cleanup, daemon=True).start()
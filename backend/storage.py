@@ -0,0 +1,159 @@
+# Copied from shared/storage.py by shared/sync.py: edit that file, not this copy
+import os
+import re
+import glob
+import time
+import heapq
+import threading
+from collections import Counter
+
+# Files downloaded for a job are named "<job id>_<title>..."
+JOB_FILE = re.compile(r'^(?P<job_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})_')
+
+
+class ExpiryScheduler:
+    """Calls on_expire(key) when a key's deadline passes.
+
+    Deadlines sit in a min-heap served by one timer thread, so each key is
+    handled at its expiry time instead of by periodic scans. `schedule` may be
+    called again to move a deadline; only the latest one counts.
+    """
+
+    def __init__(self, on_expire):
+        self.on_expire = on_expire
+        self._deadlines = {}  # key -> current deadline
+        self._queued = {}  # key -> time of its live heap entry
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, key, at):
+        with self._cond:
+            self._deadlines[key] = at
+            # A later deadline is picked up when the queued entry comes due;
+            # only an earlier one needs a new heap entry
+            if key not in self._queued or at < self._queued[key]:
+                self._queued[key] = at
+                heapq.heappush(self._heap, (at, key))
+                self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def cancel(self, key):
+        with self._cond:
+            self._deadlines.pop(key, None)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._deadlines)
+
+    def _next_expired(self):
+        with self._cond:
+            while True:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                at, key = self._heap[0]
+                now = time.time()
+                if at > now:
+                    self._cond.wait(at - now)
+                    continue
+                heapq.heappop(self._heap)
+                if self._queued.get(key) != at:
+                    continue  # superseded by an earlier entry
+                del self._queued[key]
+                deadline = self._deadlines.get(key)
+                if deadline is None:
+                    continue  # cancelled
+                if deadline > now:
+                    self._queued[key] = deadline
+                    heapq.heappush(self._heap, (deadline, key))
+                    continue
+                del self._deadlines[key]
+                return key
+
+    def _run(self):
+        while True:
+            key = self._next_expired()
+            try:
+                self.on_expire(key)
+            except Exception as e:
+                print(f"Expiry of {key} failed: {e}")
+
+
+class StorageJanitor:
+    """Deletes files of a downloads folder and keeps count of what it reclaimed.
+
+    Bytes and files are counted per reason ('expired', 'quota', 'orphaned',
+    ...) and reported by `stats`.
+    """
+
+    def __init__(self, root, quota_bytes, low_watermark=0.8):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        # Evicting stops once usage is below this share of the quota, so a
+        # folder at the limit isn't trimmed again after every download
+        self.low_watermark = low_watermark
+        self.reclaimed_bytes = Counter()
+        self.removed_files = Counter()
+        self._lock = threading.Lock()
+
+    def files(self):
+        """(mtime, size, path) of every file below root, oldest first."""
+        found = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, st.st_size, path))
+        found.sort()
+        return found
+
+    def usage(self):
+        return sum(size for _, size, _ in self.files())
+
+    def count(self, reason, size, files=1):
+        if not files:
+            return
+        with self._lock:
+            self.reclaimed_bytes[reason] += size
+            self.removed_files[reason] += files
+
+    def remove(self, path, reason):
+        """Deletes one file; returns the bytes freed (0 if it was gone already)."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        self.count(reason, size)
+        return size
+
+    def job_files(self, folder=None):
+        """(job id, path) of the job files directly in folder (root by default)."""
+        folder = folder or self.root
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return []
+        return [(match.group('job_id'), os.path.join(folder, name))
+                for name in names if (match := JOB_FILE.match(name))]
+
+    def files_of(self, job_id, folder=None):
+        """Paths of one job's files directly in folder (root by default)."""
+        folder = folder or self.root
+        return glob.glob(os.path.join(glob.escape(folder), glob.escape(job_id) + '_*'))
+
+    def stats(self):
+        usage = self.usage()
+        with self._lock:
+            return {
+                'usage_bytes': usage,
+                'quota_bytes': self.quota_bytes,
+                'reclaimed_bytes': dict(self.reclaimed_bytes),
+                'removed_files': dict(self.removed_files),
+            }
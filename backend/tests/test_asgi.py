@@ -0,0 +1,52 @@
+import time
+import uuid
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def asgi_client(app):
+    pytest.importorskip('fastapi')
+    from fastapi.testclient import TestClient
+    import asgi
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+@pytest.fixture
+def session():
+    import sessions
+    session_id = str(uuid.uuid4())
+    sessions.download_sessions[session_id] = {'status': 'downloading', 'progress': 10, 'file_path': None,
+                                              'error': None}
+    yield session_id
+    sessions.download_sessions.pop(session_id, None)
+
+
+def test_status_wait_returns_as_soon_as_the_session_changes(asgi_client, session):
+    import sessions
+    timer = threading.Timer(0.3, sessions.update_session, (session,), {'progress': 50})
+    timer.start()
+    started = time.monotonic()
+    response = asgi_client.get(f'/status/{session}', params={'wait': 10})
+    elapsed = time.monotonic() - started
+    timer.join()
+    assert response.json() == {'status': 'downloading', 'progress': 50}
+    assert 0.25 < elapsed < 5
+
+
+def test_status_wait_gives_up_after_the_time_asked_for(asgi_client, session):
+    started = time.monotonic()
+    response = asgi_client.get(f'/status/{session}', params={'wait': 0.5})
+    assert response.json() == {'status': 'downloading', 'progress': 10}
+    assert 0.45 < time.monotonic() - started < 5
+
+
+def test_status_wait_skips_finished_and_unknown_sessions(asgi_client, session):
+    import sessions
+    sessions.download_sessions[session].update(status='error', error='gone')
+    started = time.monotonic()
+    assert asgi_client.get(f'/status/{session}', params={'wait': 10}).json()['status'] == 'error'
+    assert asgi_client.get(f'/status/{uuid.uuid4()}', params={'wait': 10}).status_code == 404
+    assert time.monotonic() - started < 5
@@ -0,0 +1,23 @@
+import time
+
+
+def test_chunk_hooks_are_throttled_before_they_reach_the_session(app, monkeypatch):
+    import sessions
+    downloader = sessions.downloader
+    clock = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+    reported = []
+
+    def _download(url, quality, mode, job_id, outtmpl, postprocessor_hooks, audio_format):
+        # 1000 chunks of one 10 MB file over 10 seconds
+        for i in range(1, 1001):
+            clock[0] = i * 0.01
+            downloader._progress_hook(job_id, {'status': 'downloading', 'filename': 'clip.m4a',
+                                               'downloaded_bytes': i * 10_000, 'total_bytes': 10_000_000})
+        return 'clip.m4a'
+
+    monkeypatch.setattr(downloader, '_download', _download)
+    downloader.download('https://youtu.be/clip', '128kbps', 'audio_only', progress_callback=reported.append)
+    # At most 4 updates a second, each further on than the one before
+    assert 10 <= len(reported) <= 41
+    assert reported == sorted(reported) and reported[-1] >= 99
@@ -0,0 +1,46 @@
+import sys
+import time
+import threading
+
+from scheduler import DownloadScheduler
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_batch_items_are_scheduler_jobs_of_their_own(app, monkeypatch):
+    sessions = sys.modules['sessions']
+    scheduler = DownloadScheduler(slots=2, max_queue=10)
+    monkeypatch.setattr(sessions, 'scheduler', scheduler)
+    monkeypatch.setattr(sessions, 'BATCH_WORKERS', 3)
+    running = []
+    finish = threading.Event()
+
+    def download_item(item, quality, mode, progress_callback=None, postprocessor_hooks=None,
+                      audio_format='auto'):
+        running.append(item['session_id'])
+        finish.wait(5)
+        return f"/tmp/{item['id']}.mp4"
+
+    monkeypatch.setattr(sessions.downloader, 'download_item', download_item)
+    items = [{'id': f'video{i}', 'url': f'https://youtu.be/video{i}', 'title': None} for i in range(5)]
+    batch_id = sessions.queue_batch('playlist', items, '720p', 'video_audio')
+    session_ids = [item['session_id'] for item in items]
+
+    # Two videos take both download slots, a third waits in the queue, the
+    # rest wait for the batch to submit them
+    wait_until(lambda: len(running) == 2)
+    wait_until(lambda: scheduler.position(session_ids[2]) == 1)
+    assert running == session_ids[:2]
+    assert all(scheduler.position(session_id) is None for session_id in session_ids[3:])
+    assert all(sessions.download_sessions[session_id]['status'] == 'queued' for session_id in session_ids[2:])
+
+    finish.set()
+    wait_until(lambda: all(sessions.download_sessions[session_id]['status'] == 'completed'
+                           for session_id in session_ids))
+    assert running == session_ids
+    assert sessions.batch_sessions[batch_id]['items'] == items
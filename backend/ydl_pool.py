@@ -0,0 +1,103 @@
+# Copied from shared/ydl_pool.py by shared/sync.py: edit that file, not this copy
+import os
+import json
+import threading
+import importlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Idle YoutubeDL sessions kept for reuse, over all option profiles
+POOL_SIZE = int(os.environ.get('YDL_POOL_SIZE', 4))
+
+# Options that change what extract_info returns or how it talks to the site.
+# The rest (output template, format, hooks, postprocessors...) only matter
+# for downloading and would split the pool into single-use profiles.
+EXTRACT_OPTIONS = (
+    'quiet', 'no_warnings', 'extractor_args', 'http_headers', 'nocheckcertificate',
+    'cookiefile', 'proxy', 'source_address', 'extract_flat', 'playlistend',
+)
+
+
+def extract_options(ydl_opts):
+    """The part of ydl_opts that extraction depends on."""
+    return {key: value for key, value in ydl_opts.items() if key in EXTRACT_OPTIONS}
+
+
+class YoutubeDLPool:
+    """Warm, reusable YoutubeDL sessions keyed by their options.
+
+    A YoutubeDL keeps its extractor instances (with YouTube's player JS and
+    signature function caches), its cookie jar and its HTTP connections for as
+    long as it lives, so reusing one skips that setup on every extraction.
+    A session is used by one thread at a time: `session` hands out an idle one
+    of the same profile or builds a new one, and at most max_idle are kept,
+    the least recently used profile being closed first.
+    """
+
+    def __init__(self, max_idle=POOL_SIZE):
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle = OrderedDict()  # profile -> idle sessions
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def profile(ydl_opts):
+        return json.dumps(ydl_opts, sort_keys=True, default=repr)
+
+    @contextmanager
+    def session(self, ydl_opts):
+        key = self.profile(ydl_opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            ydl = idle.pop() if idle else None
+            if ydl is not None:
+                self._count -= 1
+                self.reused += 1
+            else:
+                self.created += 1
+        if ydl is None:
+            # yt-dlp is imported on first use; see preload_yt_dlp()
+            import yt_dlp
+            ydl = yt_dlp.YoutubeDL(ydl_opts)
+        try:
+            yield ydl
+        finally:
+            self._release(key, ydl)
+
+    def _release(self, key, ydl):
+        closing = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(ydl)
+            self._idle.move_to_end(key)
+            self._count += 1
+            while self._count > self.max_idle:
+                oldest_key, oldest = next(iter(self._idle.items()))
+                closing.append(oldest.pop(0))
+                if not oldest:
+                    del self._idle[oldest_key]
+                self._count -= 1
+        for session in closing:
+            session.close()
+
+    def stats(self):
+        with self._lock:
+            return {'idle': self._count, 'profiles': len(self._idle),
+                    'created': self.created, 'reused': self.reused}
+
+
+ydl_pool = YoutubeDLPool()
+
+
+def preload_yt_dlp():
+    """Imports yt-dlp on a background thread.
+
+    Importing it takes a few hundred milliseconds, so the window or the web
+    worker starts without it and it is loaded while the first screen or
+    request is already being served. PRELOAD_YT_DLP=0 turns it off.
+    """
+    if os.environ.get('PRELOAD_YT_DLP', '1') == '0':
+        return
+    threading.Thread(target=importlib.import_module, args=('yt_dlp',), name='yt-dlp-preload',
+                     daemon=True).start()
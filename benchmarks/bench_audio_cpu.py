@@ -0,0 +1,94 @@
+"""CPU cost of audio downloads: stream copy vs MP3 re-encoding, in CPU seconds per audio hour.
+
+Runs yt-dlp's FFmpegExtractAudio postprocessor, the same step the apps run
+after an audio download, on generated tracks in the formats YouTube serves:
+
+  copy  preferredcodec 'best': the native stream is kept (m4a as is, opus
+        from webm remuxed to .opus)
+  mp3   preferredcodec 'mp3': decoded and re-encoded with libmp3lame
+
+The CPU time of ffmpeg/ffprobe (all child processes) is measured with
+getrusage, so it does not depend on how many cores the machine has. Making
+the source tracks is not counted.
+
+    python benchmarks/bench_audio_cpu.py
+    python benchmarks/bench_audio_cpu.py --ffmpeg C:/ffmpeg/bin/ffmpeg.exe --minutes 30
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# (name, extension, ffmpeg encoder arguments) like YouTube's formats 251 and 140
+SOURCES = [
+    ('opus/webm', 'webm', ['-c:a', 'libopus', '-b:a', '160k']),
+    ('aac/m4a', 'm4a', ['-c:a', 'aac', '-b:a', '128k']),
+]
+MODES = [
+    ('copy', {'preferredcodec': 'best'}),
+    ('mp3', {'preferredcodec': 'mp3', 'preferredquality': '192'}),
+]
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def make_source(ffmpeg, path, seconds, encoder_args):
+    # Pink noise under a tone: closer to music for the encoders than silence
+    subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+                    '-f', 'lavfi', '-i', f'anoisesrc=d={seconds}:c=pink:a=0.2',
+                    '-f', 'lavfi', '-i', f'sine=f=440:d={seconds}',
+                    '-filter_complex', 'amix=inputs=2,aformat=channel_layouts=stereo', '-ar', '48000',
+                    *encoder_args, path], check=True)
+
+
+def extract(ffmpeg, source, ext, workdir, options):
+    """(CPU seconds, wall seconds, output path) of one FFmpegExtractAudio run on a copy of source."""
+    import yt_dlp
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP
+
+    path = os.path.join(workdir, f'track.{ext}')
+    shutil.copyfile(source, path)
+    with yt_dlp.YoutubeDL({'ffmpeg_location': ffmpeg, 'quiet': True, 'noprogress': True}) as ydl:
+        pp = FFmpegExtractAudioPP(ydl, **options)
+        cpu, started = children_cpu(), time.perf_counter()
+        _, info = pp.run({'filepath': path, 'ext': ext})
+        return children_cpu() - cpu, time.perf_counter() - started, info['filepath']
+
+
+def run(ffmpeg, minutes, runs):
+    seconds = int(minutes * 60)
+    workdir = tempfile.mkdtemp(prefix='bench_audio_')
+    try:
+        print(f'{minutes:g} min tracks, CPU seconds per audio hour (median of {runs})')
+        for name, ext, encoder_args in SOURCES:
+            source = os.path.join(workdir, f'source.{ext}')
+            make_source(ffmpeg, source, seconds, encoder_args)
+            for mode, options in MODES:
+                samples = []
+                for _ in range(runs):
+                    out_dir = tempfile.mkdtemp(dir=workdir)
+                    samples.append(extract(ffmpeg, source, ext, out_dir, options))
+                cpu, wall, output = sorted(samples)[len(samples) // 2]
+                per_hour = cpu * 3600 / seconds
+                print(f'  {name:10} {mode:5} {per_hour:8.2f} CPU s/h  {wall:6.2f} s wall  '
+                      f'-> {os.path.splitext(output)[1]} {os.path.getsize(output) / 1e6:.1f} MB')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ffmpeg', default=shutil.which('ffmpeg'), help='ffmpeg binary (default: from PATH)')
+    parser.add_argument('--minutes', type=float, default=10, help='length of the generated tracks')
+    parser.add_argument('--runs', type=int, default=3, help='runs per measurement; the median is reported')
+    args = parser.parse_args()
+    if not args.ffmpeg:
+        sys.exit('ffmpeg was not found; pass --ffmpeg')
+    run(args.ffmpeg, args.minutes, args.runs)
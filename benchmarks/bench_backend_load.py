@@ -0,0 +1,228 @@
+"""Flask (gunicorn gthread, as in the Procfile) vs the ASGI backend (uvicorn) under 1k connections.
+
+Downloads are simulated (progress for --download-seconds, then a small file),
+so only the servers are measured. Two phases, each with --connections
+concurrent clients:
+
+  events  every client follows /events/<id> of one running download, while a
+          probe measures how long a plain /status request takes meanwhile
+  status  every client sends /status/<id> requests back to back on a
+          keep-alive connection for --seconds
+
+    python benchmarks/bench_backend_load.py --server both --connections 1000
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import json
+import shutil
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+SERVER_MODULE = '''
+import os
+import time
+import downloader
+
+
+def download(self, url, quality, mode, progress_callback=None, job_id=None, postprocessor_hooks=None):
+    seconds = float(os.environ['BENCH_DOWNLOAD_SECONDS'])
+    for percent in range(100):
+        progress_callback(percent)
+        time.sleep(seconds / 100)
+    path = os.path.join(os.environ['BENCH_DIR'], job_id + '_bench.mp4')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 65536)
+    return path
+
+
+downloader.YoutubeDownloader.download = download
+from {module} import app
+'''
+
+COMMANDS = {
+    'flask': ['-m', 'gunicorn', '-k', 'gthread', '--threads', '16', '-b', '127.0.0.1:{port}',
+              '--backlog', '4096', '--worker-connections', '4096', 'bench_app:app'],
+    'asgi': ['-m', 'uvicorn', '--host', '127.0.0.1', '--port', '{port}', '--backlog', '4096',
+             '--log-level', 'warning', '--no-access-log', 'bench_app:app'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def request(reader, writer, method, path, port, body=None):
+    """One HTTP/1.1 request on an open keep-alive connection; returns (status, body)."""
+    head = f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+    if body is not None:
+        head += f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+    writer.write(head.encode() + b'\r\n' + (body or b''))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def call(port, method, path, body=None, timeout=30):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        return await asyncio.wait_for(request(reader, writer, method, path, port, body), timeout)
+    finally:
+        writer.close()
+
+
+async def follow_events(port, session_id, started, timeout):
+    """Seconds until the first event and until 'completed' (None if not seen in time)."""
+    first = completed = None
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return first, completed
+    try:
+        writer.write(f'GET /events/{session_id} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+                     'Connection: close\r\n\r\n'.encode())
+        async with asyncio.timeout(timeout):
+            while line := await reader.readline():
+                if line.startswith(b'data:'):
+                    now = time.perf_counter() - started
+                    first = first if first is not None else now
+                    if b'"completed"' in line:
+                        completed = now
+    except (TimeoutError, OSError):
+        pass
+    finally:
+        writer.close()
+    return first, completed
+
+
+async def probe_status(port, session_id, stop):
+    latencies, timeouts = [], 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            await call(port, 'GET', f'/status/{session_id}', timeout=5)
+            latencies.append(time.perf_counter() - started)
+        except (TimeoutError, OSError):
+            timeouts += 1
+        await asyncio.sleep(0.25)
+    return latencies, timeouts
+
+
+async def events_phase(port, connections, download_seconds):
+    body = json.dumps({'url': 'https://example.com/bench', 'quality': '720p'}).encode()
+    status, response = await call(port, 'POST', '/download', body)
+    if status != 200:
+        raise RuntimeError(f'/download answered HTTP {status}')
+    session_id = json.loads(response)['session_id']
+
+    started = time.perf_counter()
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_status(port, session_id, stop))
+    results = await asyncio.gather(*(follow_events(port, session_id, started, download_seconds + 30)
+                                     for _ in range(connections)))
+    stop.set()
+    latencies, timeouts = await probe
+    firsts = [first for first, _ in results if first is not None]
+    done = [completed for _, completed in results if completed is not None]
+    print(f'  events: {len(firsts)}/{connections} streams got a first event, '
+          f'p50 {percentile(firsts, 50):.2f} s  p99 {percentile(firsts, 99):.2f} s; '
+          f'{len(done)} saw completion (download took {download_seconds:.0f} s)')
+    print(f'          /status probe meanwhile: p50 {percentile(latencies, 50) * 1000:.0f} ms  '
+          f'p99 {percentile(latencies, 99) * 1000:.0f} ms  timeouts {timeouts}')
+    return session_id
+
+
+async def status_client(port, session_id, deadline, latencies):
+    errors = 0
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return 1
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _ = await asyncio.wait_for(
+                    request(reader, writer, 'GET', f'/status/{session_id}', port), 10)
+            except (TimeoutError, OSError, asyncio.IncompleteReadError, IndexError):
+                return errors + 1
+            if status != 200:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+    return errors
+
+
+async def status_phase(port, session_id, connections, seconds):
+    latencies = []
+    started = time.perf_counter()
+    errors = await asyncio.gather(*(status_client(port, session_id, started + seconds, latencies)
+                                    for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+    print(f'  status: {len(latencies) / elapsed:8.0f} req/s  p50 {percentile(latencies, 50) * 1000:.0f} ms  '
+          f'p99 {percentile(latencies, 99) * 1000:.0f} ms  errors {sum(errors)}')
+
+
+def run(server, connections, seconds, download_seconds):
+    workdir = tempfile.mkdtemp(prefix='bench_load_')
+    with open(os.path.join(workdir, 'bench_app.py'), 'w') as f:
+        f.write(SERVER_MODULE.format(module='app' if server == 'flask' else 'asgi'))
+    env = dict(os.environ, BENCH_DIR=workdir, BENCH_DOWNLOAD_SECONDS=str(download_seconds),
+               JOB_JOURNAL_PATH=os.path.join(workdir, 'journal.jsonl'),
+               PYTHONPATH=os.pathsep.join([workdir, os.path.abspath(BACKEND_DIR)]))
+    port = free_port()
+    cmd = [sys.executable] + [arg.format(port=port) for arg in COMMANDS[server]]
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError('Server did not start')
+                time.sleep(0.2)
+
+        print(f'{server}: {connections} connections')
+        session_id = asyncio.run(events_phase(port, connections, download_seconds))
+        asyncio.run(status_phase(port, session_id, connections, seconds))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=['flask', 'asgi', 'both'], default='both')
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--download-seconds', type=float, default=10)
+    args = parser.parse_args()
+    # Both ends of every connection live on this machine
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, 4 * args.connections + 256)), hard))
+    for server in (['flask', 'asgi'] if args.server == 'both' else [args.server]):
+        run(server, args.connections, args.seconds, args.download_seconds)
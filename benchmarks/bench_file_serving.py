@@ -0,0 +1,127 @@
+"""Throughput and server CPU per GB for /api/file of the VladPos web app.
+
+Starts the app under gunicorn (sendfile path) or the werkzeug dev server
+(plain Python copy) with one completed job, then fetches the file whole and
+in ranges. Server CPU is read from /proc, so CPU figures need Linux.
+
+    python benchmarks/bench_file_serving.py --server gunicorn --size-mb 512
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+import http.client
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'VladPos_YT_Downloader')
+CHUNK = 1024 * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def tree_cpu_seconds(pid):
+    """utime + stime of a process and all its descendants (Linux only)."""
+    total = 0.0
+    ticks = os.sysconf('SC_CLK_TCK')
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        total += (int(fields[11]) + int(fields[12])) / ticks
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        return total
+    return total + sum(tree_cpu_seconds(c) for c in children)
+
+
+def fetch(port, job_id, byte_range=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Range': f'bytes={byte_range[0]}-{byte_range[1]}'} if byte_range else {}
+    conn.request('GET', f'/api/file/{job_id}', headers=headers)
+    response = conn.getresponse()
+    expected = 206 if byte_range else 200
+    if response.status != expected:
+        raise RuntimeError(f'Expected HTTP {expected}, got {response.status}')
+    received = 0
+    while True:
+        chunk = response.read(CHUNK)
+        if not chunk:
+            break
+        received += len(chunk)
+    conn.close()
+    return received
+
+
+def run(server, size_mb, repeat):
+    workdir = tempfile.mkdtemp(prefix='bench_serving_')
+    env = dict(os.environ, JOB_STORE='sqlite', JOB_STORE_PATH=os.path.join(workdir, 'jobs.sqlite3'),
+               PYTHONPATH=os.path.abspath(APP_DIR))
+    proc = None
+    try:
+        entry_dir = os.path.join(workdir, 'downloads', 'cache', 'bench')
+        os.makedirs(entry_dir)
+        size = size_mb * CHUNK
+        block = os.urandom(CHUNK)
+        with open(os.path.join(entry_dir, 'bench.mp4'), 'wb') as f:
+            for _ in range(size_mb):
+                f.write(block)
+
+        sys.path.insert(0, os.path.abspath(APP_DIR))
+        from job_store import SQLiteJobStore
+        SQLiteJobStore(env['JOB_STORE_PATH']).set('bench', {
+            'status': 'completed', 'text': None, 'progress': 100, 'filename': 'cache/bench/bench.mp4',
+            'downloaded_mb': '', 'total_mb': '', 'timestamp': time.time() + 3600,
+        })
+
+        port = free_port()
+        if server == 'gunicorn':
+            cmd = [sys.executable, '-m', 'gunicorn', '-w', '1', '-b', f'127.0.0.1:{port}', 'app:app']
+        else:
+            cmd = [sys.executable, '-c', f'import app; app.app.run(port={port}, threaded=True)']
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError('Server did not start')
+                time.sleep(0.2)
+        fetch(port, 'bench', (0, 0))  # warm up the worker
+
+        half = size // 2
+        modes = {
+            'full': [None],
+            'range': [(0, half - 1), (half, size - 1)],
+        }
+        print(f'{server}: {size_mb} MB file, {repeat} rounds')
+        for name, ranges in modes.items():
+            cpu_before = tree_cpu_seconds(proc.pid)
+            started = time.perf_counter()
+            received = sum(fetch(port, 'bench', r) for _ in range(repeat) for r in ranges)
+            elapsed = time.perf_counter() - started
+            cpu = tree_cpu_seconds(proc.pid) - cpu_before
+            gb = received / 1024 ** 3
+            print(f'  {name:<6} {received / CHUNK / elapsed:9.1f} MB/s   server CPU {cpu / gb:6.2f} s/GB')
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'], default='gunicorn')
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=4)
+    args = parser.parse_args()
+    run(args.server, args.size_mb, args.repeat)
@@ -0,0 +1,104 @@
+"""Per-request latency of /api/formats of the VladPos web app, cold vs warm YoutubeDL sessions.
+
+cold: every request builds (and closes) its own YoutubeDL, as before the pool
+warm: requests reuse pooled sessions with their extractors and connections
+
+The info cache is bypassed so every request really extracts. By default the
+URL is a small video served from this process (generic extractor, no network
+needed); pass --url with a YouTube link to measure the real thing.
+
+    python benchmarks/bench_formats_warm.py --requests 50
+    python benchmarks/bench_formats_warm.py --url https://www.youtube.com/watch?v=dQw4w9WgXcQ
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import http.server
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'VladPos_YT_Downloader')
+CLIP = b'\x00\x00\x00\x18ftypmp42' + b'\x00' * 65536
+
+
+class ClipHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real site
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(CLIP)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.do_HEAD()
+        self.wfile.write(CLIP)
+
+    def log_message(self, *args):
+        pass
+
+
+class ClipServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # cold sessions drop their keep-alive connections
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def measure(client, url, requests, vary):
+    latencies = []
+    for i in range(requests):
+        started = time.perf_counter()
+        response = client.post('/api/formats', json={'url': f'{url}?n={i}' if vary else url})
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/formats failed: {response.get_json()}")
+    return latencies
+
+
+def run(url, requests):
+    workdir = tempfile.mkdtemp(prefix='bench_formats_')
+    server = None
+    try:
+        vary = url is None
+        if url is None:
+            server = ClipServer(('127.0.0.1', 0), ClipHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f'http://127.0.0.1:{server.server_port}/clip.mp4'
+
+        os.environ['JOB_EXECUTION'] = 'thread'
+        os.chdir(workdir)
+        sys.path.insert(0, os.path.abspath(APP_DIR))
+        import app
+        from ydl_pool import ydl_pool
+        # Measure extraction itself, not the info cache
+        app.info_cache.get_or_extract = lambda key, extract: extract()
+        client = app.app.test_client()
+
+        print(f'{requests} requests for {url}')
+        for name, max_idle in (('cold', 0), ('warm', ydl_pool.max_idle or 4)):
+            ydl_pool.max_idle = max_idle
+            measure(client, url, 1, vary)  # imports, and the first session when warm
+            latencies = measure(client, url, requests, vary)
+            print(f'  {name}: p50 {percentile(latencies, 50) * 1000:7.1f} ms   '
+                  f'p95 {percentile(latencies, 95) * 1000:7.1f} ms')
+        print(f'  pool: {ydl_pool.stats()}')
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url')
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    run(args.url, args.requests)
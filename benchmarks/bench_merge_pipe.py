@@ -0,0 +1,154 @@
+"""Disk I/O and time of a video+audio download: piped into ffmpeg vs merged from temporary files.
+
+temp files  yt-dlp's own flow: both streams are written to .fNNN files, then
+            ffmpeg reads them back and writes the merged file
+piped       pipe_merge: both streams go from the network into ffmpeg, only the
+            merged file is written
+
+The streams are DASH-like files (fragmented MP4) made with ffmpeg and served
+with range support from this process, so no network is needed. "written" is
+what this process and ffmpeg wrote to disk (getrusage block counts, so it
+needs a disk-backed --dir, not tmpfs); "read back" is the size of the
+temporary files ffmpeg reads again.
+
+    python benchmarks/bench_merge_pipe.py
+    python benchmarks/bench_merge_pipe.py --ffmpeg /usr/bin/ffmpeg --minutes 10 --dir /var/tmp
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import http.server
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+FRAGMENTED = ['-movflags', '+frag_keyframe+empty_moov+default_base_moof']
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    root = None
+
+    def do_GET(self):
+        path = os.path.join(self.root, os.path.basename(self.path))
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0 and (chunk := f.read(min(remaining, 1024 * 1024))):
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_sources(ffmpeg, directory, seconds):
+    common = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y']
+    subprocess.run([*common, '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '2500k', '-g', '60', *FRAGMENTED,
+                    '-f', 'mp4', os.path.join(directory, 'video.mp4')], check=True)
+    subprocess.run([*common, '-f', 'lavfi', '-i', f'sine=f=440:d={seconds}', '-c:a', 'aac', '-b:a', '128k',
+                    *FRAGMENTED, '-f', 'mp4', os.path.join(directory, 'audio.m4a')], check=True)
+
+
+def info_dict(base_url, directory):
+    def fmt(format_id, name, ext, **codecs):
+        return {'format_id': format_id, 'url': f'{base_url}/{name}', 'ext': ext, 'container': f'{ext}_dash',
+                'protocol': 'http', 'filesize': os.path.getsize(os.path.join(directory, name)),
+                'downloader_options': {'http_chunk_size': 10 * 1024 * 1024}, **codecs}
+
+    return {'id': 'bench', 'title': 'bench', 'extractor': 'generic', 'extractor_key': 'Generic',
+            'webpage_url': base_url, 'formats': [
+                fmt('137', 'video.mp4', 'mp4', vcodec='avc1', acodec='none', height=720),
+                fmt('140', 'audio.m4a', 'm4a', vcodec='none', acodec='mp4a.40.2', abr=128)]}
+
+
+def written_bytes():
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_oublock for u in usage) * 512
+
+
+def download(ffmpeg, info, out_dir, piped):
+    """(seconds, bytes written, bytes of temporary files, size of the result)."""
+    import yt_dlp
+    from pipe_merge import merge_streams_piped
+
+    temp_bytes = 0
+
+    def hook(d):
+        nonlocal temp_bytes
+        if d['status'] == 'finished' and not piped:
+            temp_bytes += d.get('total_bytes') or 0
+
+    opts = {'outtmpl': os.path.join(out_dir, '%(title)s.%(ext)s'), 'format': '137+140',
+            'merge_output_format': 'mp4', 'ffmpeg_location': ffmpeg, 'quiet': True, 'noprogress': True,
+            'progress_hooks': [hook]}
+    written, started = written_bytes(), time.perf_counter()
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        path = merge_streams_piped(ydl, info) if piped else None
+        if path is None:
+            if piped:
+                raise RuntimeError('the streams were not piped')
+            result = ydl.process_ie_result(dict(info), download=True)
+            path = result['requested_downloads'][-1]['filepath']
+        os.sync()  # count the writes of this run, not later ones
+        return time.perf_counter() - started, written_bytes() - written, temp_bytes, os.path.getsize(path)
+
+
+def run(ffmpeg, minutes, runs, directory):
+    sys.path.insert(0, APP_DIR)
+    workdir = tempfile.mkdtemp(prefix='bench_merge_', dir=directory)
+    server = None
+    try:
+        sources = os.path.join(workdir, 'sources')
+        os.makedirs(sources)
+        make_sources(ffmpeg, sources, int(minutes * 60))
+        RangeHandler.root = sources
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        info = info_dict(f'http://127.0.0.1:{server.server_port}', sources)
+
+        print(f'{minutes:g} min at 720p (median of {runs})')
+        for name, piped in (('temp files', False), ('piped', True)):
+            samples = []
+            for _ in range(runs):
+                out_dir = tempfile.mkdtemp(dir=workdir)
+                samples.append(download(ffmpeg, info, out_dir, piped))
+                shutil.rmtree(out_dir)
+            seconds, written, temp_bytes, size = sorted(samples)[len(samples) // 2]
+            print(f'  {name:10}  {seconds:6.2f} s  written {written / 1e6:7.1f} MB  '
+                  f'read back {temp_bytes / 1e6:7.1f} MB  result {size / 1e6:.1f} MB')
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ffmpeg', default=shutil.which('ffmpeg'), help='ffmpeg binary (default: from PATH)')
+    parser.add_argument('--minutes', type=float, default=5, help='length of the generated video')
+    parser.add_argument('--runs', type=int, default=3, help='runs per measurement; the median is reported')
+    parser.add_argument('--dir', help='where the files are written (default: the temp directory)')
+    args = parser.parse_args()
+    if not args.ffmpeg:
+        sys.exit('ffmpeg was not found; pass --ffmpeg')
+    run(args.ffmpeg, args.minutes, args.runs, args.dir)
@@ -0,0 +1,117 @@
+"""Per-chunk cost of the VladPos download progress hook.
+
+yt-dlp calls progress hooks once per received chunk. This feeds a simulated
+download through the previous hook (parse `_percent_str`, format the status
+text, write the job record on every call) and through the current one, the
+hook of workers.progress_hooks applied to the job by app.job_progress (raw
+numbers, throttled writes), for both job stores.
+
+    python benchmarks/bench_progress_hook.py --chunks 20000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'VladPos_YT_Downloader')
+CHUNK = 64 * 1024
+
+
+def chunk_events(chunks, duration):
+    """Progress dicts of one download spread evenly over `duration` seconds."""
+    total = chunks * CHUNK
+    for i in range(1, chunks + 1):
+        yield {
+            'status': 'downloading',
+            'downloaded_bytes': i * CHUNK,
+            'total_bytes': total,
+            '_percent_str': f'{i * 100.0 / chunks:5.1f}%',
+            'filename': 'bench.mp4',
+            'tmpfilename': 'bench.mp4.part',
+        }, i * duration / chunks
+
+
+def legacy_hook(app, job_id):
+    """The hook as it was before throttling, writing formatted text per chunk."""
+    def hook(d):
+        p_str = d.get('_percent_str', '0%').replace('%', '').strip()
+        downloaded = app.format_bytes(d.get('downloaded_bytes'))
+        total = app.format_bytes(d.get('total_bytes') or d.get('total_bytes_estimate'))
+        try:
+            progress = float(p_str)
+        except ValueError:
+            progress = 0
+        app.jobs.set(job_id, {
+            'status': 'downloading', 'text': f"Сваляне: {p_str}% ({downloaded} от {total})",
+            'progress': progress, 'filename': None, 'downloaded_mb': downloaded,
+            'total_mb': total, 'timestamp': time.time(),
+        })
+        app.broker.publish()
+    return hook
+
+
+def current_hook(app, job_id):
+    """The yt-dlp progress hook of a download job, as workers.download sets it up."""
+    import workers
+    hook, _ = workers.progress_hooks(app.job_progress(job_id, None))
+    return hook
+
+
+def measure(app, hook, chunks, duration):
+    # Hooks see wall-clock time through time.monotonic(); replay the simulated
+    # timeline so throttling behaves as in a download of `duration` seconds
+    real_monotonic = time.monotonic
+    writes = 0
+    real_set = app.jobs.set
+
+    def counting_set(*args):
+        nonlocal writes
+        writes += 1
+        real_set(*args)
+
+    app.jobs.set = counting_set
+    clock = [0.0]
+    time.monotonic = lambda: clock[0]
+    try:
+        started = time.perf_counter()
+        for d, at in chunk_events(chunks, duration):
+            clock[0] = at
+            hook(d)
+        elapsed = time.perf_counter() - started
+    finally:
+        time.monotonic = real_monotonic
+        app.jobs.set = real_set
+    return elapsed / chunks * 1e6, writes
+
+
+def run(chunks, duration):
+    workdir = tempfile.mkdtemp(prefix='bench_progress_')
+    cwd = os.getcwd()
+    sys.path.insert(0, os.path.abspath(APP_DIR))
+    try:
+        os.chdir(workdir)
+        import app
+        from job_store import MemoryJobStore, SQLiteJobStore
+        stores = {
+            'memory': MemoryJobStore(),
+            'sqlite': SQLiteJobStore(os.path.join(workdir, 'jobs.sqlite3')),
+        }
+        print(f'{chunks} chunks over a simulated {duration:.0f} s download')
+        for store_name, store in stores.items():
+            app.jobs = store
+            for hook_name, make_hook in (('legacy', legacy_hook), ('throttled', current_hook)):
+                per_chunk, writes = measure(app, make_hook(app, 'bench'), chunks, duration)
+                print(f'  {store_name:<7}{hook_name:<10}{per_chunk:8.1f} us/chunk  {writes:6d} status writes')
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--duration', type=float, default=60.0)
+    args = parser.parse_args()
+    run(args.chunks, args.duration)
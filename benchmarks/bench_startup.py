@@ -0,0 +1,212 @@
+"""Startup cost of the desktop app and the web workers, with a baseline to catch regressions.
+
+  imports  what importing each entry module costs (python -X importtime),
+           summed per top-level package
+  window   time from starting the desktop app until its window is shown,
+           for `python main.py` or, with --exe, the PyInstaller build
+  request  time from starting a web worker (gunicorn for the VladPos app,
+           uvicorn for the ASGI backend) until it answers its first request
+
+    python benchmarks/bench_startup.py --save startup.json
+    python benchmarks/bench_startup.py --baseline startup.json
+    python benchmarks/bench_startup.py --exe dist/YoutubeDownloaderPro/YoutubeDownloaderPro.exe
+
+With --baseline the run fails (exit status 1) if a time got worse by more
+than --tolerance percent.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import importlib.util
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DESKTOP_DIR = os.path.abspath(os.path.join(ROOT, 'python_desktop'))
+VLADPOS_DIR = os.path.abspath(os.path.join(ROOT, 'VladPos_YT_Downloader'))
+BACKEND_DIR = os.path.abspath(os.path.join(ROOT, 'backend'))
+
+# (name, app directory, module) whose import is measured
+IMPORTS = [
+    ('desktop', DESKTOP_DIR, 'main'),
+    ('desktop downloader', DESKTOP_DIR, 'downloader'),
+    ('vladpos', VLADPOS_DIR, 'app'),
+    ('backend flask', BACKEND_DIR, 'app'),
+    ('backend asgi', BACKEND_DIR, 'asgi'),
+]
+# (name, app directory, server command, path answered by the app)
+SERVERS = [
+    ('vladpos gunicorn', VLADPOS_DIR,
+     ['-m', 'gunicorn', '-w', '1', '-k', 'gthread', '-b', '127.0.0.1:{port}', 'app:app'], '/api/status/startup'),
+    ('backend uvicorn', BACKEND_DIR,
+     ['-m', 'uvicorn', '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning', 'asgi:app'],
+     '/status/startup'),
+]
+TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def environment(workdir, app_dir, **extra):
+    return dict(os.environ, PYTHONPATH=app_dir, JOB_JOURNAL_PATH=os.path.join(workdir, 'journal.jsonl'),
+                INFO_CACHE_DIR='', **extra)
+
+
+def import_profile(workdir, app_dir, module):
+    """(total seconds, {top-level package: seconds}) of importing module in a fresh interpreter."""
+    # The background import of yt-dlp would be counted as part of the module
+    env = environment(workdir, app_dir, PRELOAD_YT_DLP='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=workdir,
+                            env=env, capture_output=True, text=True, timeout=TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    packages, total = {}, 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1e6
+        if name.strip() == module:
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def time_to_window(workdir, command, cwd):
+    """Seconds from start until the desktop window is shown, and whether yt-dlp was loaded by then."""
+    probe = os.path.join(workdir, 'window.txt')
+    if os.path.exists(probe):
+        os.remove(probe)
+    started = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=cwd, env=dict(os.environ, STARTUP_PROBE=probe),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(probe):
+            if proc.poll() is not None or time.perf_counter() - started > TIMEOUT:
+                raise RuntimeError('The window was not shown')
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        time.sleep(0.05)  # let the file be written completely
+        with open(probe) as f:
+            return elapsed, f.read().strip()
+    finally:
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def time_to_first_request(workdir, app_dir, args, path):
+    port = free_port()
+    command = [sys.executable] + [arg.format(port=port) for arg in args]
+    started = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=workdir, env=environment(workdir, app_dir),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5).close()
+                break
+            except urllib.error.HTTPError:
+                break  # an error status is still an answer
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - started > TIMEOUT:
+                    raise RuntimeError('The server did not answer')
+                time.sleep(0.005)
+        return time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def median_of(runs, fn, *args):
+    return statistics.median(fn(*args) for _ in range(runs))
+
+
+def run(runs, exe, top):
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        print('imports')
+        for name, app_dir, module in IMPORTS:
+            try:
+                profiles = [import_profile(workdir, app_dir, module) for _ in range(runs)]
+            except RuntimeError as e:
+                print(f'  {name:20} skipped: {e}')
+                continue
+            total = statistics.median(total for total, _ in profiles)
+            packages = profiles[-1][1]
+            heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+            results[f'import {name}'] = total
+            print(f'  {name:20} {total * 1000:7.0f} ms   ' +
+                  ', '.join(f'{package} {seconds * 1000:.0f}' for package, seconds in heaviest))
+
+        print('window')
+        commands = [('desktop python', [sys.executable, 'main.py'])]
+        if importlib.util.find_spec('PySide6') is None:
+            print('  desktop python       skipped: PySide6 is not installed')
+            commands = []
+        if exe:
+            commands.append(('desktop frozen', [os.path.abspath(exe)]))
+        for name, command in commands:
+            times = [time_to_window(workdir, command, DESKTOP_DIR) for _ in range(runs)]
+            results[f'window {name}'] = statistics.median(elapsed for elapsed, _ in times)
+            print(f'  {name:20} {results[f"window {name}"] * 1000:7.0f} ms   ({times[-1][1]} when shown)')
+
+        print('first request')
+        for name, app_dir, args, path in SERVERS:
+            if importlib.util.find_spec(args[1]) is None:
+                print(f'  {name:20} skipped: {args[1]} is not installed')
+                continue
+            results[f'request {name}'] = median_of(runs, time_to_first_request, workdir, app_dir, args, path)
+            print(f'  {name:20} {results[f"request {name}"] * 1000:7.0f} ms')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change of every time against the baseline; True if none got worse than tolerance."""
+    ok = True
+    print(f'against the baseline (tolerance {tolerance:.0f}%)')
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        change = (seconds - before) / before * 100
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f'  {name:30} {before * 1000:7.0f} -> {seconds * 1000:7.0f} ms  {change:+6.1f}%'
+              + ('  REGRESSION' if regressed else ''))
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='runs per measurement; the median is reported')
+    parser.add_argument('--exe', help='PyInstaller build of the desktop app to time as well')
+    parser.add_argument('--top', type=int, default=5, help='heaviest packages listed per import')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier --save to compare with')
+    parser.add_argument('--tolerance', type=float, default=20, help='allowed slowdown in percent')
+    args = parser.parse_args()
+
+    results = run(args.runs, args.exe, args.top)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if not compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
@@ -0,0 +1,110 @@
+"""Lets the tests of every app run in one pytest session.
+
+backend/, VladPos_YT_Downloader/, python_desktop/ and shared/ each import
+their modules by flat name (app, events, scheduler...), and several names
+exist in more than one of them. Tests in a folder, and the modules they
+import, see that folder's app; tests in shared/tests that take the `app`
+fixture run against each web app in turn (see WEB_APPS).
+"""
+import os
+import sys
+import importlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SHARED_DIR = os.path.join(ROOT, 'shared')
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+VLADPOS_DIR = os.path.join(ROOT, 'VladPos_YT_Downloader')
+DESKTOP_DIR = os.path.join(ROOT, 'python_desktop')
+CODE_DIRS = (SHARED_DIR, BACKEND_DIR, VLADPOS_DIR, DESKTOP_DIR)
+# Settings that would make an app write outside its temporary folder
+APP_SETTINGS = ('JOB_JOURNAL_PATH', 'JOB_STORE', 'JOB_STORE_PATH', 'INFO_CACHE_DIR', 'JOB_EXECUTION')
+
+_current = None
+_put_aside = {}  # code dir -> its modules while another one is in use
+
+
+def _code_dir(module):
+    path = getattr(module, '__file__', None)
+    return path and os.path.dirname(os.path.abspath(path))
+
+
+def use_code_dir(code_dir):
+    """Makes flat imports load the modules of code_dir (one of CODE_DIRS).
+
+    The modules of the folder used before are put aside, not dropped, so
+    each app keeps one set of module objects for the whole session.
+    """
+    global _current
+    if code_dir == _current:
+        return
+    if _current:
+        _put_aside[_current] = {name: module for name, module in list(sys.modules.items())
+                                if _code_dir(module) == _current}
+    for name, module in list(sys.modules.items()):
+        if _code_dir(module) in CODE_DIRS:
+            del sys.modules[name]
+    sys.modules.update(_put_aside.pop(code_dir, {}))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path) not in CODE_DIRS]
+    sys.path.insert(0, code_dir)
+    _current = code_dir
+
+
+def code_dir_of(path):
+    """The code dir whose tests/ folder holds path, if any."""
+    for code_dir in CODE_DIRS:
+        if str(path).startswith(os.path.join(code_dir, 'tests') + os.sep):
+            return code_dir
+    return None
+
+
+def pytest_collectstart(collector):
+    # Test modules import app modules when they are collected
+    code_dir = code_dir_of(collector.path)
+    if code_dir:
+        use_code_dir(code_dir)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    # Before fixtures, so the `app` fixture can switch to another app
+    code_dir = code_dir_of(item.path)
+    if code_dir:
+        use_code_dir(code_dir)
+
+
+@pytest.fixture(scope='session')
+def load_app(tmp_path_factory):
+    """Imports the `app` module of a code dir once, with everything it writes in a temporary folder."""
+    apps = {}
+
+    def load(code_dir):
+        use_code_dir(code_dir)
+        if code_dir not in apps:
+            workdir = tmp_path_factory.mktemp(os.path.basename(code_dir))
+            for name in APP_SETTINGS:
+                os.environ.pop(name, None)
+            # The backend keeps its files in DOWNLOAD_DIR, VladPos in ./downloads
+            os.environ['DOWNLOAD_DIR'] = str(workdir / 'downloads')
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                apps[code_dir] = importlib.import_module('app')
+            finally:
+                os.chdir(cwd)
+        return apps[code_dir]
+
+    return load
+
+
+@pytest.fixture
+def app(request, load_app):
+    """The `app` module of the folder the test is in."""
+    return load_app(code_dir_of(request.path))
+
+
+@pytest.fixture(params=[BACKEND_DIR, VLADPOS_DIR], ids=['backend', 'vladpos'])
+def web_app(request, load_app):
+    """The `app` module of each web app in turn, for the tests they share."""
+    return load_app(request.param)
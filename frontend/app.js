@@ -11,6 +11,8 @@ const videoDuration = document.getElementById('videoDuration');
 const downloadOptions = document.getElementById('downloadOptions');
 const qualitySelect = document.getElementById('qualitySelect');
 const qualityLabel = document.getElementById('qualityLabel');
+const audioFormatSelection = document.getElementById('audioFormatSelection');
+const audioFormatSelect = document.getElementById('audioFormatSelect');
 const downloadBtn = document.getElementById('downloadBtn');
 const progressContainer = document.getElementById('progressContainer');
 const progressFill = document.getElementById('progressFill');
@@ -87,6 +89,7 @@ async function fetchVideoInfo() {
 function updateQualityOptions() {
     const mode = document.querySelector('input[name="mode"]:checked').value;
     qualitySelect.innerHTML = '<option value="">Избери качество</option>';
+    audioFormatSelection.classList.toggle('hidden', mode !== 'audio_only');
 
     if (!currentFormats) return;
 
@@ -114,6 +117,7 @@ async function startDownload() {
     const url = urlInput.value.trim();
     const quality = qualitySelect.value;
     const mode = document.querySelector('input[name="mode"]:checked').value;
+    const audio_format = audioFormatSelect.value;
 
     if (!quality) {
         showStatus('Моля, избери качество', 'error');
@@ -130,9 +134,14 @@ async function startDownload() {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ url, quality, mode })
+            body: JSON.stringify({ url, quality, mode, audio_format })
         });
 
+        if (response.status === 429) {
+            const retryAfter = response.headers.get('Retry-After') || '30';
+            throw new Error(`Сървърът е зает, опитай пак след ${retryAfter} сек.`);
+        }
+
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.error || 'Failed to start download');
@@ -144,8 +153,8 @@ async function startDownload() {
         // Show progress bar
         progressContainer.classList.remove('hidden');
 
-        // Start polling for status
-        pollDownloadStatus();
+        // Follow status updates (pushed, or polled as a fallback)
+        watchDownloadStatus();
 
     } catch (error) {
         showStatus(`Грешка: ${error.message}`, 'error');
@@ -154,6 +163,48 @@ async function startDownload() {
     }
 }
 
+// Handle one status update; returns true once the download is over
+function handleDownloadStatus(data) {
+    progressFill.style.width = `${data.progress}%`;
+    progressText.textContent = `${Math.round(data.progress)}%`;
+
+    if (data.status === 'completed') {
+        showStatus('Свалянето завърши! Започва изтегляне...', 'success');
+        downloadFile();
+        return true;
+    } else if (data.status === 'error') {
+        showStatus(`Грешка: ${data.error}`, 'error');
+        resetDownloadUI();
+        return true;
+    } else if (data.status === 'queued' && data.queue_position) {
+        progressText.textContent = `В опашка: ${data.queue_position}`;
+    }
+    return false;
+}
+
+// Receive status updates via Server-Sent Events, falling back to polling
+function watchDownloadStatus() {
+    if (!currentSessionId) return;
+
+    if (!window.EventSource) {
+        pollDownloadStatus();
+        return;
+    }
+
+    const events = new EventSource(`${API_BASE_URL}/events/${currentSessionId}`);
+    let finished = false;
+
+    events.onmessage = (event) => {
+        finished = handleDownloadStatus(JSON.parse(event.data));
+        if (finished) events.close();
+    };
+
+    events.onerror = () => {
+        events.close();
+        if (!finished) pollDownloadStatus();
+    };
+}
+
 // Poll Download Status
 async function pollDownloadStatus() {
     if (!currentSessionId) return;
@@ -167,17 +218,7 @@ async function pollDownloadStatus() {
 
         const data = await response.json();
 
-        // Update progress
-        progressFill.style.width = `${data.progress}%`;
-        progressText.textContent = `${Math.round(data.progress)}%`;
-
-        if (data.status === 'completed') {
-            showStatus('Свалянето завърши! Започва изтегляне...', 'success');
-            downloadFile();
-        } else if (data.status === 'error') {
-            showStatus(`Грешка: ${data.error}`, 'error');
-            resetDownloadUI();
-        } else {
+        if (!handleDownloadStatus(data)) {
             // Continue polling
             setTimeout(pollDownloadStatus, 500);
         }
@@ -1,14 +1,34 @@
 import os
 import sys
-import yt_dlp
+from info_cache import InfoCache, cache_key
+from progress import ProgressTracker, CombinedProgress
+from tuning import connection_budget, tuned_options
+from parallel_streams import fetch_streams_parallel
+from pipe_merge import merge_streams_piped
+from ydl_pool import ydl_pool, extract_options
+from ffmpeg_registry import FFmpegRegistry, audio_postprocessor, best_audio_format
 
 class YoutubeDownloader:
     def __init__(self, progress_callback=None):
         self.progress_callback = progress_callback
-        self.ffmpeg_path = self._find_ffmpeg()
+        self.progress_tracker = ProgressTracker()
+        self.combined_progress = CombinedProgress()
+        # Found and probed once; download_ffmpeg() makes it look again
+        self.ffmpeg = FFmpegRegistry(self._ffmpeg_candidates())
+        # get_info results are reused by download() and kept between runs
+        app_data_dir = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'YoutubeDownloaderPro')
+        self.info_cache = InfoCache(max_bytes=16 * 1024 * 1024, disk_dir=os.path.join(app_data_dir, 'info_cache'))
+
+    def _extract_info(self, ydl_opts, url):
+        """Info dict for a URL; only runs the extractor on a cache miss, on a warm pooled session."""
+        def extract():
+            with ydl_pool.session(extract_options(ydl_opts)) as ydl:
+                return ydl.sanitize_info(ydl.extract_info(url, download=False), remove_private_keys=True)
 
-    def _find_ffmpeg(self):
-        """Locates ffmpeg.exe in several potential locations."""
+        return self.info_cache.get_or_extract(cache_key(url, ydl_opts.get('extractor_args')), extract)
+
+    def _ffmpeg_candidates(self):
+        """Potential locations of ffmpeg.exe, best first."""
         locations = []
         
         # 1. User Application Data (for downloaded ffmpeg)
@@ -33,34 +53,25 @@ class YoutubeDownloader:
             os.path.join(script_dir, 'ffmpeg.exe'),
         ])
         
-        # Check all possible locations
-        for loc in locations:
-            if os.path.exists(loc):
-                return loc
-            
         # 4. Fallback to PATH
-        return 'ffmpeg'
+        locations.append('ffmpeg')
+        return locations
+
+    @property
+    def ffmpeg_path(self):
+        return self.ffmpeg.location or 'ffmpeg'
 
     def is_ffmpeg_available(self):
         """Checks if ffmpeg is available on the system."""
-        path = self._find_ffmpeg()
-        if path == 'ffmpeg':
-            import subprocess
-            try:
-                subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-                return True
-            except:
-                return False
-        return os.path.exists(path)
-
-    def download_ffmpeg(self, progress_callback=None):
-        """Downloads ffmpeg.exe for Windows."""
-        import requests
-        import zipfile
-        import io
-        
-        # Static build URL for Windows (gyan.dev)
-        url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
+        return self.ffmpeg.get() is not None
+
+    def download_ffmpeg(self, progress_callback=None, verify=True):
+        """Downloads ffmpeg.exe for Windows.
+
+        Raises ChecksumUnavailable when the published checksum can't be
+        fetched; verify=False, after the user agreed, installs it without.
+        """
+        from ffmpeg_bootstrap import bootstrap_ffmpeg, ChecksumUnavailable, CHECKSUM_URL
         app_data_dir = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'YoutubeDownloaderPro')
         os.makedirs(app_data_dir, exist_ok=True)
         ffmpeg_dest = os.path.join(app_data_dir, 'ffmpeg.exe')
@@ -69,44 +80,27 @@ class YoutubeDownloader:
             return True
 
         try:
-            response = requests.get(url, stream=True)
-            total_size = int(response.headers.get('content-length', 0))
-            
-            bytes_downloaded = 0
-            zip_buffer = io.BytesIO()
-
-            for chunk in response.iter_content(chunk_size=1024*1024):
-                if chunk:
-                    zip_buffer.write(chunk)
-                    bytes_downloaded += len(chunk)
-                    if progress_callback and total_size > 0:
-                        progress_callback(bytes_downloaded / total_size * 100)
-
-            with zipfile.ZipFile(zip_buffer) as z:
-                # Find ffmpeg.exe in the zip
-                for file_info in z.infolist():
-                    if file_info.filename.endswith('ffmpeg.exe'):
-                        # Extract only ffmpeg.exe
-                        with z.open(file_info) as source, open(ffmpeg_dest, 'wb') as target:
-                            import shutil
-                            shutil.copyfileobj(source, target)
-                        break
+            # Streamed to disk in parallel ranges, resumed after interruptions
+            # and verified before ffmpeg.exe is moved into place
+            bootstrap_ffmpeg(ffmpeg_dest, checksum_url=CHECKSUM_URL if verify else None,
+                             progress_callback=progress_callback)
             
-            # Update path
-            self.ffmpeg_path = ffmpeg_dest
+            # Probe the new binary on next use
+            self.ffmpeg.invalidate()
             return True
+        except ChecksumUnavailable:
+            raise  # the user decides whether to go on without it
         except Exception as e:
             raise Exception(f"Грешка при сваляне на FFmpeg: {str(e)}")
 
     def _progress_hook(self, d):
         if d['status'] == 'downloading':
-            p = d.get('_percent_str', '0%').replace('%', '')
-            try:
-                percent = float(p)
+            # Called per chunk; the tracker limits how often the UI is signalled.
+            # Video and audio streams count towards one combined percentage
+            downloaded, total = self.combined_progress.update(d)
+            if self.progress_tracker.update(downloaded, total):
                 if self.progress_callback:
-                    self.progress_callback(percent)
-            except ValueError:
-                pass
+                    self.progress_callback(self.progress_tracker.percent)
 
     def get_info(self, url):
         ydl_opts = {
@@ -120,32 +114,33 @@ class YoutubeDownloader:
                 }
             }
         }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                info = ydl.extract_info(url, download=False)
-                formats = info.get('formats', [])
-                
-                resolutions = set()
-                audio_bitrates = set()
-
-                for f in formats:
-                    if f.get('vcodec') != 'none' and f.get('height'):
-                        resolutions.add(f['height'])
-                    
-                    if f.get('acodec') != 'none' and f.get('abr'):
-                        audio_bitrates.add(int(f['abr']))
+        try:
+            info = self._extract_info(ydl_opts, url)
+            formats = info.get('formats', [])
+            
+            resolutions = set()
+            audio_bitrates = set()
+
+            for f in formats:
+                if f.get('vcodec') != 'none' and f.get('height'):
+                    resolutions.add(f['height'])
                 
-                return {
-                    'title': info.get('title', 'Unknown'),
-                    'resolutions': sorted(list(resolutions), reverse=True),
-                    'audio_bitrates': sorted(list(audio_bitrates), reverse=True),
-                    'duration': info.get('duration'),
-                    'thumbnail': info.get('thumbnail')
-                }
-            except Exception as e:
-                raise Exception(f"Error fetching info: {str(e)}")
+                if f.get('acodec') != 'none' and f.get('abr'):
+                    audio_bitrates.add(int(f['abr']))
+            
+            return {
+                'title': info.get('title', 'Unknown'),
+                'resolutions': sorted(list(resolutions), reverse=True),
+                'audio_bitrates': sorted(list(audio_bitrates), reverse=True),
+                'duration': info.get('duration'),
+                'thumbnail': info.get('thumbnail')
+            }
+        except Exception as e:
+            raise Exception(f"Error fetching info: {str(e)}")
 
-    def download(self, url, save_path, resolution='720', mode='video_audio'):
+    def download(self, url, save_path, resolution='720', mode='video_audio', audio_format='auto'):
+        self.progress_tracker = ProgressTracker()
+        self.combined_progress = CombinedProgress()
         common_opts = {
             'outtmpl': os.path.join(save_path, '%(title)s.%(ext)s'),
             'progress_hooks': [self._progress_hook],
@@ -165,36 +160,60 @@ class YoutubeDownloader:
         }
         
         # ... (rest of mode logic stays same)
-        if mode == 'audio_only':
-            bitrate = resolution if resolution else '192' 
+        # The cheapest postprocessing the ffmpeg found can do; without it files
+        # are kept as YouTube serves them
+        ffmpeg = self.ffmpeg.get()
+        
+        if mode == 'audio_only' and ffmpeg is None:
+            ydl_opts = {
+                **common_opts,
+                'format': 'bestaudio[ext=m4a]/bestaudio',
+            }
+        elif mode == 'audio_only':
+            # The native stream is only copied unless MP3 is really needed
+            # (audio_format 'mp3', or 'auto' when ffmpeg can't keep its codec)
+            bitrate = str(resolution or '192')
+            postprocessor = audio_postprocessor(ffmpeg, audio_format,
+                                                int(bitrate) if bitrate.isdigit() else None,
+                                                best_audio_format(self._extract_info(common_opts, url)))
             ydl_opts = {
                 **common_opts,
                 'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': str(bitrate),
-                }],
+                'postprocessors': [postprocessor],
             }
         elif mode == 'video_only':
             ydl_opts = {
                 **common_opts,
                 'format': f'bestvideo[height<={resolution}]/best',
             }
-        else:
+        elif ffmpeg is not None and ffmpeg.can_mux('mp4'):
             ydl_opts = {
                 **common_opts,
                 'format': f'bestvideo[height<={resolution}]+bestaudio/best[height<={resolution}]',
                 'merge_output_format': 'mp4',
             }
+        else:
+            # Nothing to merge with: a single file that has both
+            ydl_opts = {
+                **common_opts,
+                'format': f'best[height<={resolution}]/best',
+            }
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
-            
-            # If it was an audio download, the extension changed to .mp3
-            if mode == 'audio_only':
-                filename = os.path.splitext(filename)[0] + '.mp3'
+        import yt_dlp  # loaded on first use (or by preload_yt_dlp) so the window opens sooner
+        with connection_budget.lease() as connections, yt_dlp.YoutubeDL({**ydl_opts, **tuned_options(connections)}) as ydl:
+            if mode == 'video_audio':
+                # Straight from the network into ffmpeg when the streams allow it
+                # (not on Windows, which can't hand ffmpeg the second pipe)
+                merged = merge_streams_piped(ydl, self._extract_info(ydl_opts, url), self.combined_progress)
+                if merged:
+                    return merged
+                # Otherwise fetch both streams at once; the pass below then only merges
+                fetch_streams_parallel(ydl, self._extract_info(ydl_opts, url), self.combined_progress)
+            info = ydl.process_ie_result(self._extract_info(ydl_opts, url), download=True)
+            # Where the file ended up after postprocessing (audio extraction
+            # changes its extension)
+            downloads = info.get('requested_downloads') or [{}]
+            filename = downloads[-1].get('filepath') or ydl.prepare_filename(info)
             
             # Check if file exists and has size > 0
             if not os.path.exists(filename):
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+
+# Static build for Windows (gyan.dev); its SHA-256 is published next to it
+FFMPEG_URL = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
+CHECKSUM_URL = FFMPEG_URL + '.sha256'
+# Ranges of the archive downloaded at once
+PARTS = 4
+CHUNK_SIZE = 1024 * 1024
+# Attempts per range before the download gives up (the next run resumes it)
+RETRIES = 5
+TIMEOUT = 30
+# How often the progress of the ranges is written next to the partial file
+STATE_INTERVAL = 1.0
+
+_CONTENT_RANGE_RE = re.compile(r'bytes \d+-\d+/(\d+)')
+
+
+class BootstrapError(Exception):
+    pass
+
+
+class ChecksumUnavailable(BootstrapError):
+    """The published checksum could not be fetched, so the archive can't be verified."""
+
+
+class ArchiveDownload:
+    """Downloads a file to disk in parallel ranges and resumes where it stopped.
+
+    The data goes straight into path; path + '.json' records how much of each
+    range is written, so a later run (after a network error or a restart)
+    only fetches the rest. Servers without range support get one plain
+    download that starts over every time.
+    """
+
+    def __init__(self, url, path, parts=PARTS, progress_callback=None):
+        self.url = url
+        self.path = path
+        self.state_path = path + '.json'
+        self.parts = parts
+        self.progress_callback = progress_callback
+        self._lock = threading.Lock()
+        self._saved_at = 0
+        self._downloaded = 0
+        self._reported = -1
+
+    def run(self):
+        size, validator = self._probe()
+        state = self._load_state(size, validator)
+        if state is None:
+            state = {'url': self.url, 'size': size, 'validator': validator, 'ranges': self._split(size)}
+            with open(self.path, 'wb') as f:
+                if size:
+                    f.truncate(size)
+        self.state = state
+        self._downloaded = sum(r['done'] for r in state['ranges'])
+        self._report()
+
+        try:
+            if size is None:
+                self._fetch_whole()
+            else:
+                with ThreadPoolExecutor(max_workers=len(state['ranges'])) as pool:
+                    for future in [pool.submit(self._fetch_range, r) for r in state['ranges']]:
+                        future.result()
+        finally:
+            self._save_state(force=True)
+
+    def discard(self):
+        for path in (self.path, self.state_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _probe(self):
+        """(size, validator) of the file; size is None if ranges are not supported."""
+        with requests.get(self.url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            # Ranged requests go to where the URL redirects to
+            self.url = response.url
+            match = _CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+            if response.status_code != 206 or not match:
+                return None, None
+            return int(match.group(1)), response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+    def _split(self, size):
+        if not size:
+            return [{'start': 0, 'end': None, 'done': 0}]
+        step = -(-size // self.parts)
+        return [{'start': start, 'end': min(start + step, size) - 1, 'done': 0}
+                for start in range(0, size, step)]
+
+    def _load_state(self, size, validator):
+        # Only resumes the same file: same size and ETag/Last-Modified. Without
+        # a validator a changed file can't be told apart, so it starts over
+        if size is None or validator is None or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('size') != size or state.get('validator') != validator \
+                or os.path.getsize(self.path) != size:
+            return None
+        return state
+
+    def _save_state(self, force=False):
+        if self.state['size'] is None:
+            return  # nothing to resume without ranges
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved_at < STATE_INTERVAL:
+                return
+            self._saved_at = now
+            tmp_path = f'{self.state_path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.state_path)
+
+    def _advance(self, count):
+        with self._lock:
+            self._downloaded += count
+        self._report()
+        self._save_state()
+
+    def _report(self):
+        size = self.state['size']
+        if not self.progress_callback or not size:
+            return
+        # Under the lock, so the ranges' threads report every percent once
+        # and in order
+        with self._lock:
+            percent = int(self._downloaded * 100 / size)
+            if percent > self._reported:
+                self._reported = percent
+                self.progress_callback(percent)
+
+    def _fetch_range(self, part):
+        length = part['end'] - part['start'] + 1
+        attempt = 0
+        while part['done'] < length:
+            try:
+                headers = {'Range': f"bytes={part['start'] + part['done']}-{part['end']}"}
+                with requests.get(self.url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                    # HTTP errors (a 503 on the way) are retried like network errors
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise BootstrapError(f"Сървърът върна HTTP {response.status_code} за част от файла")
+                    # Unbuffered, so the saved state never runs ahead of the file
+                    with open(self.path, 'r+b', buffering=0) as f:
+                        f.seek(part['start'] + part['done'])
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            chunk = chunk[:length - part['done']]
+                            f.write(chunk)
+                            part['done'] += len(chunk)
+                            self._advance(len(chunk))
+                            if part['done'] >= length:
+                                break
+            except requests.RequestException:
+                attempt += 1
+                if attempt > RETRIES:
+                    raise
+                self._save_state(force=True)
+                time.sleep(min(2 ** attempt, 10))
+
+    def _fetch_whole(self):
+        with requests.get(self.url, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            total = int(response.headers.get('Content-Length', 0))
+            with open(self.path, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    self._downloaded += len(chunk)
+                    if self.progress_callback and total:
+                        self.progress_callback(self._downloaded * 100 / total)
+
+
+def expected_sha256(checksum_url):
+    """Published SHA-256 of the archive; raises ChecksumUnavailable if it can't be fetched."""
+    try:
+        response = requests.get(checksum_url, timeout=TIMEOUT)
+        response.raise_for_status()
+        digest = response.text.split()[0].lower()
+    except (requests.RequestException, IndexError) as e:
+        raise ChecksumUnavailable(f"Контролната сума на FFmpeg не може да бъде изтеглена: {e}") from e
+    if not re.fullmatch(r'[0-9a-f]{64}', digest):
+        raise ChecksumUnavailable("Контролната сума на FFmpeg е в непознат формат")
+    return digest
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def install_member(archive_path, member_name, dest):
+    """Extracts the archive member ending in member_name to dest, atomically."""
+    with zipfile.ZipFile(archive_path) as z:
+        member = next((m for m in z.infolist() if m.filename.endswith(member_name)), None)
+        if member is None:
+            raise BootstrapError(f"{member_name} липсва в архива")
+        tmp_path = dest + '.tmp'
+        try:
+            # Reading the member checks its CRC as well
+            with z.open(member) as source, open(tmp_path, 'wb') as target:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def bootstrap_ffmpeg(dest, url=FFMPEG_URL, checksum_url=CHECKSUM_URL, member_name='ffmpeg.exe',
+                     parts=PARTS, progress_callback=None):
+    """Downloads the ffmpeg archive next to dest, verifies it and installs the binary as dest.
+
+    An interrupted download is resumed by the next call. The published
+    checksum is fetched first; if that fails ChecksumUnavailable is raised
+    before anything is downloaded. Only with checksum_url=None, which the
+    user has to agree to, is the archive checked by the CRCs of the ZIP alone.
+    """
+    expected = expected_sha256(checksum_url) if checksum_url else None
+    archive_name = os.path.basename(urlparse(url).path) or 'ffmpeg.zip'
+    download = ArchiveDownload(url, os.path.join(os.path.dirname(dest), archive_name + '.part'),
+                               parts, progress_callback)
+    download.run()
+
+    if expected and file_sha256(download.path) != expected:
+        download.discard()
+        raise BootstrapError("Контролната сума на архива не съвпада")
+    try:
+        install_member(download.path, member_name, dest)
+    except zipfile.BadZipFile:
+        download.discard()
+        raise
+    download.discard()
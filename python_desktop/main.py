@@ -4,25 +4,43 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLineEdit, QPushButton, QComboBox, 
                              QRadioButton, QButtonGroup, QLabel, QFileDialog, 
                              QProgressBar, QMessageBox)
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt, QThread, QTimer, Signal
 from downloader import YoutubeDownloader
+from thumbnail_cache import ThumbnailCache
+from ydl_pool import preload_yt_dlp
 
-import requests
 from PySide6.QtGui import QPixmap, QImage, QIcon
 
+# Pause after the last edit of the URL before its info is fetched on its own
+FETCH_DEBOUNCE_MS = 500
+# Set by benchmarks/bench_startup.py: once the window is shown this file is
+# written and the app quits (works for the PyInstaller build as well)
+STARTUP_PROBE = os.environ.get('STARTUP_PROBE')
+
+def report_startup():
+    with open(STARTUP_PROBE, 'w') as f:
+        f.write('yt_dlp loaded' if 'yt_dlp' in sys.modules else 'yt_dlp not loaded')
+    QApplication.quit()
+
 class FFmpegDownloadThread(QThread):
     progress = Signal(float)
     finished = Signal()
     error = Signal(str)
+    # The checksum could not be fetched; the user may install without it
+    unverified = Signal(str)
 
-    def __init__(self, downloader):
+    def __init__(self, downloader, verify=True):
         super().__init__()
         self.downloader = downloader
+        self.verify = verify
 
     def run(self):
+        from ffmpeg_bootstrap import ChecksumUnavailable
         try:
-            self.downloader.download_ffmpeg(progress_callback=self.progress.emit)
+            self.downloader.download_ffmpeg(progress_callback=self.progress.emit, verify=self.verify)
             self.finished.emit()
+        except ChecksumUnavailable as e:
+            self.unverified.emit(str(e))
         except Exception as e:
             self.error.emit(str(e))
 
@@ -31,13 +49,14 @@ class DownloadThread(QThread):
     finished = Signal(str)
     error = Signal(str)
 
-    def __init__(self, downloader, url, save_path, resolution, mode):
+    def __init__(self, downloader, url, save_path, resolution, mode, audio_format='auto'):
         super().__init__()
         self.downloader = downloader
         self.url = url
         self.save_path = save_path
         self.resolution = resolution
         self.mode = mode
+        self.audio_format = audio_format
         self.downloader.progress_callback = self.update_progress
 
     def update_progress(self, p):
@@ -45,11 +64,49 @@ class DownloadThread(QThread):
 
     def run(self):
         try:
-            filename = self.downloader.download(self.url, self.save_path, self.resolution, self.mode)
+            filename = self.downloader.download(self.url, self.save_path, self.resolution, self.mode,
+                                                self.audio_format)
             self.finished.emit(filename)
         except Exception as e:
             self.error.emit(str(e))
 
+class MetadataThread(QThread):
+    # Every result carries the generation of the fetch, so the window can
+    # drop the results of a URL that was changed in the meantime
+    info_ready = Signal(int, object)
+    thumbnail_ready = Signal(int, QImage)
+    error = Signal(int, str)
+
+    def __init__(self, downloader, thumbnails, url, generation):
+        super().__init__()
+        self.downloader = downloader
+        self.thumbnails = thumbnails
+        self.url = url
+        self.generation = generation
+
+    def run(self):
+        try:
+            info = self.downloader.get_info(self.url)
+        except Exception as e:
+            if not self.isInterruptionRequested():
+                self.error.emit(self.generation, str(e))
+            return
+        if self.isInterruptionRequested():
+            return
+        self.info_ready.emit(self.generation, info)
+
+        if not info.get('thumbnail'):
+            return
+        try:
+            data = self.thumbnails.get(info['thumbnail'])
+        except Exception:
+            return
+        # Decoding and scaling happen here; the GUI thread only shows the result
+        image = QImage()
+        if not self.isInterruptionRequested() and image.loadFromData(data):
+            self.thumbnail_ready.emit(self.generation,
+                                      image.scaled(320, 180, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -67,10 +124,21 @@ class MainWindow(QMainWindow):
         self.save_directory = os.path.join(os.path.expanduser("~"), "Downloads")
         self.current_resolutions = []
         self.current_bitrates = []
+        app_data_dir = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'YoutubeDownloaderPro')
+        self.thumbnails = ThumbnailCache(os.path.join(app_data_dir, 'thumbnails'))
+        # Incremented for every fetch; results of older generations are dropped
+        self.fetch_generation = 0
+        self.fetch_manual = False
+        self.metadata_threads = set()
+        # Closed while fetches were still running: closes once they end
+        self.closing = False
+        self.fetch_timer = QTimer(self)
+        self.fetch_timer.setSingleShot(True)
+        self.fetch_timer.setInterval(FETCH_DEBOUNCE_MS)
+        self.fetch_timer.timeout.connect(lambda: self.fetch_metadata(manual=False))
         
         self.init_ui()
         # Показване на прозореца първо и след това проверка за FFmpeg
-        from PySide6.QtCore import QTimer
         QTimer.singleShot(100, self.check_ffmpeg)
 
     def check_ffmpeg(self):
@@ -83,17 +151,18 @@ class MainWindow(QMainWindow):
             else:
                 QMessageBox.warning(self, "Внимание", "Без FFmpeg някои функции (като аудио конвертиране) няма да работят.")
 
-    def start_ffmpeg_download(self):
+    def start_ffmpeg_download(self, verify=True):
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.status_label.setText("Сваляне на FFmpeg... Моля изчакайте.")
         self.download_btn.setEnabled(False)
         self.fetch_btn.setEnabled(False)
 
-        self.ffmpeg_thread = FFmpegDownloadThread(self.downloader)
+        self.ffmpeg_thread = FFmpegDownloadThread(self.downloader, verify)
         self.ffmpeg_thread.progress.connect(self.progress_bar.setValue)
         self.ffmpeg_thread.finished.connect(self.on_ffmpeg_finished)
         self.ffmpeg_thread.error.connect(self.on_ffmpeg_error)
+        self.ffmpeg_thread.unverified.connect(self.on_ffmpeg_unverified)
         self.ffmpeg_thread.start()
 
     def on_ffmpeg_finished(self):
@@ -103,6 +172,16 @@ class MainWindow(QMainWindow):
         self.status_label.setText("FFmpeg е инсталиран успешно!")
         QMessageBox.information(self, "Успех", "FFmpeg беше изтеглен и инсталиран успешно.")
 
+    def on_ffmpeg_unverified(self, err):
+        reply = QMessageBox.question(self, "Без проверка",
+                                     f"{err}\n\nБез нея не може да се провери дали архивът е изтеглен цял и "
+                                     "непроменен. Желаете ли да инсталирате FFmpeg без проверка?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.start_ffmpeg_download(verify=False)
+        else:
+            self.on_ffmpeg_error(err)
+
     def on_ffmpeg_error(self, err):
         self.download_btn.setEnabled(True)
         self.fetch_btn.setEnabled(True)
@@ -125,10 +204,11 @@ class MainWindow(QMainWindow):
         url_layout = QHBoxLayout()
         self.url_input = QLineEdit()
         self.url_input.setPlaceholderText("Постави линк от Youtube...")
+        self.url_input.textChanged.connect(self.on_url_changed)
         url_layout.addWidget(self.url_input)
         
         self.fetch_btn = QPushButton("Извлечи информация")
-        self.fetch_btn.clicked.connect(self.fetch_metadata)
+        self.fetch_btn.clicked.connect(lambda: self.fetch_metadata(manual=True))
         url_layout.addWidget(self.fetch_btn)
         layout.addLayout(url_layout)
 
@@ -157,7 +237,7 @@ class MainWindow(QMainWindow):
         self.radio_both = QRadioButton("Видео и аудио (MP4)")
         self.radio_both.setChecked(True)
         self.radio_video = QRadioButton("Видео")
-        self.radio_audio = QRadioButton("Аудио(MP3)")
+        self.radio_audio = QRadioButton("Аудио")
         
         self.mode_group.addButton(self.radio_both)
         self.mode_group.addButton(self.radio_video)
@@ -177,6 +257,19 @@ class MainWindow(QMainWindow):
         res_layout.addWidget(self.res_combo)
         options_layout.addLayout(res_layout)
 
+        # Audio only: keep the native stream or convert to MP3
+        self.audio_format_widget = QWidget()
+        audio_format_layout = QHBoxLayout(self.audio_format_widget)
+        audio_format_layout.setContentsMargins(0, 0, 0, 0)
+        audio_format_layout.addWidget(QLabel("Формат:"))
+        self.audio_format_combo = QComboBox()
+        self.audio_format_combo.addItem("Автоматично", 'auto')
+        self.audio_format_combo.addItem("Оригинален (M4A/Opus, без прекодиране)", 'original')
+        self.audio_format_combo.addItem("MP3", 'mp3')
+        audio_format_layout.addWidget(self.audio_format_combo)
+        self.audio_format_widget.setVisible(False)
+        options_layout.addWidget(self.audio_format_widget)
+
         layout.addWidget(self.options_group)
 
         path_layout = QHBoxLayout()
@@ -201,42 +294,74 @@ class MainWindow(QMainWindow):
         self.status_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.status_label)
 
-    def fetch_metadata(self):
+    def on_url_changed(self, text):
+        # A pasted or edited link is fetched once typing pauses; whatever was
+        # being fetched for the previous text is cancelled
+        self.cancel_fetch()
+        if text.strip().startswith(('http://', 'https://')):
+            self.fetch_timer.start()
+        else:
+            self.fetch_timer.stop()
+
+    def cancel_fetch(self):
+        self.fetch_generation += 1
+        for thread in self.metadata_threads:
+            thread.requestInterruption()
+
+    def fetch_metadata(self, manual=True):
         url = self.url_input.text().strip()
         if not url:
             return
-        
+
+        self.fetch_timer.stop()
+        self.cancel_fetch()
+        self.fetch_manual = manual
         self.status_label.setText("Извличане на информация за видеото...")
-        self.fetch_btn.setEnabled(False)
-        QApplication.processEvents()
 
-        try:
-            info = self.downloader.get_info(url)
-            self.video_title.setText(info['title'])
-            self.status_label.setText(f"Заредено: {info['title']}")
-            
-            if info['thumbnail']:
-                try:
-                    data = requests.get(info['thumbnail']).content
-                    pixmap = QPixmap()
-                    pixmap.loadFromData(data)
-                    self.thumb_label.setPixmap(pixmap.scaled(320, 180, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-                except:
-                    self.thumb_label.setText("No Preview")
-
-            self.current_resolutions = info.get('resolutions', [])
-            self.current_bitrates = info.get('audio_bitrates', [])
-            
-            self.update_dropdown_options()
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Грешка", str(e))
-            self.status_label.setText("Грешка в извличането на информация за видеото.")
-        finally:
-            self.fetch_btn.setEnabled(True)
+        thread = MetadataThread(self.downloader, self.thumbnails, url, self.fetch_generation)
+        thread.info_ready.connect(self.on_info_ready)
+        thread.thumbnail_ready.connect(self.on_thumbnail_ready)
+        thread.error.connect(self.on_metadata_error)
+        thread.finished.connect(self.on_metadata_thread_finished)
+        self.metadata_threads.add(thread)
+        thread.start()
+
+    def on_metadata_thread_finished(self):
+        # Runs on the GUI thread once run() has returned; the wait only covers
+        # the thread's last steps after emitting finished
+        thread = self.sender()
+        thread.wait()
+        self.metadata_threads.discard(thread)
+        if self.closing and not self.metadata_threads:
+            self.close()
+
+    def on_info_ready(self, generation, info):
+        if generation != self.fetch_generation:
+            return
+        self.video_title.setText(info['title'])
+        self.status_label.setText(f"Заредено: {info['title']}")
+        self.thumb_label.setText("Зареждане..." if info['thumbnail'] else "No Preview")
+
+        self.current_resolutions = info.get('resolutions', [])
+        self.current_bitrates = info.get('audio_bitrates', [])
+        
+        self.update_dropdown_options()
+
+    def on_thumbnail_ready(self, generation, image):
+        if generation == self.fetch_generation:
+            self.thumb_label.setPixmap(QPixmap.fromImage(image))
+
+    def on_metadata_error(self, generation, err):
+        if generation != self.fetch_generation:
+            return
+        self.status_label.setText("Грешка в извличането на информация за видеото.")
+        # A link that is still being typed only shows the status line
+        if self.fetch_manual:
+            QMessageBox.critical(self, "Грешка", err)
 
     def update_dropdown_options(self):
         self.res_combo.clear()
+        self.audio_format_widget.setVisible(self.radio_audio.isChecked())
         
         if self.radio_audio.isChecked():
             self.quality_label.setText("Качество:")
@@ -273,7 +398,8 @@ class MainWindow(QMainWindow):
         self.download_btn.setEnabled(False)
         self.status_label.setText("Сваля се...")
 
-        self.thread = DownloadThread(self.downloader, url, self.save_directory, selection, mode)
+        self.thread = DownloadThread(self.downloader, url, self.save_directory, selection, mode,
+                                     self.audio_format_combo.currentData())
         self.thread.progress.connect(self.progress_bar.setValue)
         self.thread.finished.connect(self.on_finished)
         self.thread.error.connect(self.on_error)
@@ -291,6 +417,18 @@ class MainWindow(QMainWindow):
             import subprocess
             subprocess.run(['explorer', '/select,', os.path.normpath(filename)])
 
+    def closeEvent(self, event):
+        self.cancel_fetch()
+        # A fetch can't be stopped halfway through extract_info, and a QThread
+        # destroyed while it runs takes the process down: the window hides
+        # and closes for good when the last fetch has finished
+        if self.metadata_threads:
+            self.closing = True
+            self.hide()
+            event.ignore()
+            return
+        super().closeEvent(event)
+
     def on_error(self, err):
         self.download_btn.setEnabled(True)
         self.status_label.setText("Получена грешка")
@@ -301,4 +439,8 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    if STARTUP_PROBE:
+        QTimer.singleShot(0, report_startup)
+    # The window is up; yt-dlp loads in the background meanwhile
+    QTimer.singleShot(0, preload_yt_dlp)
     sys.exit(app.exec())
\ No newline at end of file
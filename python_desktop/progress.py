@@ -0,0 +1,105 @@
+# Copied from shared/progress.py by shared/sync.py: edit that file, not this copy
+import time
+import threading
+from collections import deque
+
+# Status writes per second allowed for one download
+MAX_UPDATES_PER_SECOND = 4
+# Seconds of samples used for the speed/ETA moving average
+SPEED_WINDOW = 5.0
+
+
+class ProgressTracker:
+    """Raw progress counters of one download.
+
+    yt-dlp calls its progress hooks for every chunk; `update` only stores the
+    numbers and says whether the change is worth publishing: the whole percent
+    moved on (or a second passed) and the rate limit allows it. Formatting for
+    display is left to whoever reads the status.
+    """
+
+    def __init__(self, max_rate=MAX_UPDATES_PER_SECOND, window=SPEED_WINDOW):
+        self.min_interval = 1.0 / max_rate
+        self.window = window
+        self.downloaded = 0
+        self.total = None
+        self._samples = deque()
+        self._published_at = 0.0
+        self._published_percent = -1
+        self._source = None
+
+    def update(self, downloaded, total, source=None, now=None):
+        """Records a progress event; returns True when it should be published."""
+        now = time.monotonic() if now is None else now
+        if source != self._source or (downloaded or 0) < self.downloaded:
+            # A new file (e.g. the audio stream after the video), or the same
+            # one downloaded again, starts over
+            self._source = source
+            self._samples.clear()
+            self._published_percent = -1
+        self.downloaded = downloaded or 0
+        self.total = total or None
+
+        self._samples.append((now, self.downloaded))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+        elapsed = now - self._published_at
+        if elapsed < self.min_interval:
+            return False
+        if int(self.percent) == self._published_percent and elapsed < 1.0:
+            return False
+        self._published_at = now
+        self._published_percent = int(self.percent)
+        return True
+
+    @property
+    def percent(self):
+        if not self.total:
+            return 0.0
+        return min(100.0, self.downloaded * 100.0 / self.total)
+
+    @property
+    def speed(self):
+        """Bytes per second over the sample window, or None before two samples."""
+        if len(self._samples) < 2:
+            return None
+        (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+        if t1 <= t0:
+            return None
+        return (b1 - b0) / (t1 - t0)
+
+    @property
+    def eta(self):
+        """Seconds left at the current speed, or None when unknown."""
+        speed = self.speed
+        if not speed or not self.total:
+            return None
+        return max(0.0, (self.total - self.downloaded) / speed)
+
+
+class CombinedProgress:
+    """Progress of one download summed over every file it fetches.
+
+    A `bestvideo+bestaudio` selection fetches two files; reporting each on its
+    own makes the percentage fall back to 0 when the second one starts, or
+    jump between the two when they run at the same time.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def expect(self, filename, size):
+        """Registers a file before it starts, so the total is right from the beginning."""
+        with self._lock:
+            self._files.setdefault(filename, (0, size or 0))
+
+    def update(self, d):
+        """Records a 'downloading' hook dict; returns (downloaded, total) over all files."""
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        with self._lock:
+            expected = self._files.get(d.get('filename'), (0, 0))[1]
+            self._files[d.get('filename')] = (d.get('downloaded_bytes') or 0, total or expected)
+            return (sum(done for done, _ in self._files.values()),
+                    sum(size for _, size in self._files.values()))
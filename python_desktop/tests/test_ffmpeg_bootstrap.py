@@ -0,0 +1,167 @@
+import io
+import os
+import time
+import hashlib
+import zipfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ffmpeg_bootstrap
+from ffmpeg_bootstrap import bootstrap_ffmpeg, BootstrapError, ChecksumUnavailable
+
+FFMPEG = os.urandom(200 * 1024)
+
+
+def make_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as z:
+        z.writestr('ffmpeg-release/bin/ffmpeg.exe', FFMPEG)
+    return buffer.getvalue()
+
+
+ARCHIVE = make_archive()
+BLOCK = 4096
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """Serves ARCHIVE and its checksum as the server's settings say, recording the Range headers."""
+    ranges = True  # honours Range
+    etag = '"v1"'
+    checksum = hashlib.sha256(ARCHIVE).hexdigest()
+    cut_after = None  # bytes of a range sent before the connection drops
+    unavailable = 0  # ranges answered with 503 first
+    requested = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.endswith('.sha256'):
+            return self._send(200, f'{self.checksum}  ffmpeg.zip\n'.encode()) if self.checksum \
+                else self._send(404, b'')
+        header = self.headers.get('Range')
+        self.requested.append(header)
+        with self.lock:
+            refused = self.unavailable and header != 'bytes=0-0'
+            if refused:
+                type(self).unavailable -= 1
+        if refused:
+            return self._send(503, b'')
+        if not (header and self.ranges):
+            return self._send(200, ARCHIVE)
+        first, _, last = header[len('bytes='):].partition('-')
+        start, end = int(first), min(int(last), len(ARCHIVE) - 1) if last else len(ARCHIVE) - 1
+        self._send(206, ARCHIVE[start:end + 1], {'Content-Range': f'bytes {start}-{end}/{len(ARCHIVE)}'})
+
+    def _send(self, status, body, headers=()):
+        self.send_response(status)
+        for name, value in dict(headers).items():
+            self.send_header(name, value)
+        if self.etag:
+            self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status == 206 and self.cut_after and len(body) > 1:
+            body = body[:self.cut_after]
+        try:
+            for offset in range(0, len(body), BLOCK):
+                self.wfile.write(body[offset:offset + BLOCK])
+                self.wfile.flush()
+                time.sleep(0.001)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    class Handler(ArchiveHandler):
+        requested = []
+
+    monkeypatch.setattr(ffmpeg_bootstrap, 'CHUNK_SIZE', BLOCK)
+    monkeypatch.setattr(ffmpeg_bootstrap.time, 'sleep', lambda seconds: None)  # retry backoff
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    Handler.url = f'http://127.0.0.1:{httpd.server_port}/ffmpeg.zip'
+    yield Handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def run(server, tmp_path, **kwargs):
+    dest = str(tmp_path / 'ffmpeg.exe')
+    bootstrap_ffmpeg(dest, url=server.url, checksum_url=server.url + '.sha256', **kwargs)
+    with open(dest, 'rb') as f:
+        return f.read()
+
+
+def part_starts(parts=4):
+    step = -(-len(ARCHIVE) // parts)
+    return {f'bytes={start}-' for start in range(0, len(ARCHIVE), step)}
+
+
+def test_interrupted_download_resumes_where_each_range_stopped(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg_bootstrap, 'RETRIES', 0)
+    server.cut_after = 8 * BLOCK
+    with pytest.raises(Exception):
+        run(server, tmp_path)
+    assert not (tmp_path / 'ffmpeg.exe').exists()
+
+    server.cut_after = None
+    del server.requested[:]
+    assert run(server, tmp_path) == FFMPEG
+    # No range of the second run starts over from the beginning of its part
+    starts = {header.split('-')[0] + '-' for header in server.requested[1:]}
+    assert len(starts) == 4 and not starts & part_starts(), server.requested
+    assert os.listdir(tmp_path) == ['ffmpeg.exe']
+
+
+def test_download_without_a_validator_starts_over(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg_bootstrap, 'RETRIES', 0)
+    server.etag = None
+    server.cut_after = 8 * BLOCK
+    with pytest.raises(Exception):
+        run(server, tmp_path)
+
+    server.cut_after = None
+    del server.requested[:]
+    assert run(server, tmp_path) == FFMPEG
+    starts = {header.split('-')[0] + '-' for header in server.requested[1:]}
+    assert starts == part_starts(), server.requested
+
+
+def test_http_errors_of_a_range_are_retried(server, tmp_path):
+    server.unavailable = 2
+    assert run(server, tmp_path) == FFMPEG
+    # The probe, the four ranges and the two that got a 503 first
+    assert server.unavailable == 0 and len(server.requested) == 7, server.requested
+
+
+def test_server_without_range_support_gets_a_plain_download(server, tmp_path):
+    server.ranges = False
+    assert run(server, tmp_path) == FFMPEG
+    assert os.listdir(tmp_path) == ['ffmpeg.exe']
+
+
+def test_checksum_mismatch_installs_nothing(server, tmp_path):
+    server.checksum = '0' * 64
+    with pytest.raises(BootstrapError, match='не съвпада'):
+        run(server, tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_missing_checksum_stops_before_the_download(server, tmp_path):
+    server.checksum = None
+    with pytest.raises(ChecksumUnavailable):
+        run(server, tmp_path)
+    assert server.requested == [] and os.listdir(tmp_path) == []
+
+
+def test_unverified_install_when_the_checksum_is_opted_out(server, tmp_path):
+    server.checksum = None
+    dest = str(tmp_path / 'ffmpeg.exe')
+    bootstrap_ffmpeg(dest, url=server.url, checksum_url=None)
+    with open(dest, 'rb') as f:
+        assert f.read() == FFMPEG
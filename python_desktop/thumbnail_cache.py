@@ -0,0 +1,63 @@
+import os
+import hashlib
+import threading
+
+
+class ThumbnailCache:
+    """Thumbnails on disk, keyed by their URL and bounded by max_bytes.
+
+    Reading a file marks it as used (mtime), so when the cache grows past
+    max_bytes the least recently shown thumbnails are deleted first.
+    """
+
+    def __init__(self, disk_dir, max_bytes=50 * 1024 * 1024, timeout=10):
+        self.disk_dir = disk_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        os.makedirs(disk_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        return os.path.join(self.disk_dir, hashlib.sha1(url.encode()).hexdigest() + '.img')
+
+    def get(self, url):
+        """Image bytes of the thumbnail, downloaded only on a cache miss."""
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            pass
+
+        import requests
+        response = requests.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.content
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._prune()
+        except OSError:
+            pass  # a thumbnail that can't be cached is still shown
+        return data
+
+    def _prune(self):
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith('.img'):
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
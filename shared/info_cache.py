@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+# Upper bound for how long an info dict is reused
+MAX_TTL = 6 * 3600
+# Drop entries this long before their signed format URLs stop working
+EXPIRY_MARGIN = 300
+
+_VIDEO_ID_RE = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([0-9A-Za-z_-]{11})')
+_LIST_ID_RE = re.compile(r'[?&]list=([0-9A-Za-z_-]+)')
+_EXPIRE_PATH_RE = re.compile(r'/expire/(\d+)')
+
+
+def video_id_from_url(url):
+    """Canonical YouTube video id of a URL (or bare id); other URLs are returned as-is."""
+    url = url.strip()
+    if re.fullmatch(r'[0-9A-Za-z_-]{11}', url):
+        return url
+    match = _VIDEO_ID_RE.search(url)
+    return match.group(1) if match else url
+
+
+def cache_key(url, extractor_args=None):
+    """Info cache key of a URL: its video id, plus the playlist id of a list= parameter.
+
+    yt-dlp extracts watch?v=X&list=PL... as the playlist, so it must not share
+    an entry with watch?v=X.
+    """
+    key = video_id_from_url(url)
+    match = _LIST_ID_RE.search(url)
+    if match and key != url.strip():  # a playlist URL without a video is its own key
+        key += f"|list={match.group(1)}"
+    return f"{key}|{json.dumps(extractor_args or {}, sort_keys=True)}"
+
+
+def url_expiry(info):
+    """Earliest expiry (unix time) of the signed format URLs in an info dict, if any."""
+    expiries = []
+    for f in info.get('formats') or []:
+        url = f.get('url') or ''
+        expire = parse_qs(urlparse(url).query).get('expire')
+        if expire and expire[0].isdigit():
+            expiries.append(int(expire[0]))
+            continue
+        match = _EXPIRE_PATH_RE.search(url)
+        if match:
+            expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+class SingleFlight:
+    """Runs fn once for all concurrent callers of do() with the same key."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+        try:
+            call['result'] = fn()
+            return call['result']
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+class InfoCache:
+    """LRU cache of sanitized yt-dlp info dicts, bounded by their JSON size in bytes.
+
+    Entries live until shortly before their signed URLs expire (at most max_ttl).
+    With disk_dir set, entries are also written there so they survive restarts
+    and can be shared between processes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, max_ttl=MAX_TTL):
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries = OrderedDict()  # key -> (expires_at, json blob)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def get(self, key):
+        """Returns a private copy of the cached info dict, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] <= now:
+                self._remove(key)
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                return json.loads(entry[1])
+
+        entry = self._load(key, now)
+        if entry is None:
+            return None
+        with self._lock:
+            self._insert(key, *entry)
+        return json.loads(entry[1])
+
+    def put(self, key, info):
+        """Caches an info dict; it must already be JSON-serializable (YoutubeDL.sanitize_info)."""
+        now = time.time()
+        expires_at = now + self.max_ttl
+        expiry = url_expiry(info)
+        if expiry is not None:
+            expires_at = min(expires_at, expiry - EXPIRY_MARGIN)
+        if expires_at <= now:
+            return
+        blob = json.dumps(info)
+        with self._lock:
+            self._insert(key, expires_at, blob)
+        self._store(key, expires_at, blob)
+
+    def get_or_extract(self, key, extract):
+        """Cached info dict for key; concurrent misses share a single extract() call."""
+        info = self.get(key)
+        if info is not None:
+            return info
+
+        def load():
+            # The previous flight for this key may have filled the cache already
+            info = self.get(key)
+            if info is None:
+                info = extract()
+                self.put(key, info)
+            return json.dumps(info)
+
+        return json.loads(self._flight.do(key, load))
+
+    def _insert(self, key, expires_at, blob):
+        if key in self._entries:
+            self._remove(key)
+        if len(blob) > self.max_bytes:
+            return
+        self._entries[key] = (expires_at, blob)
+        self._size += len(blob)
+        while self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, blob = self._entries.pop(key)
+        self._size -= len(blob)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def _load(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                expires_at, blob = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if expires_at <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return expires_at, blob
+
+    def _store(self, key, expires_at, blob):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump([expires_at, blob], f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process owns the journal
+    fcntl = None
+
+# States after which a job is never resumed; later records don't change them
+FINAL_STATES = ('completed', 'error', 'dropped')
+# Finished jobs are kept in the journal (and servable) this long
+FINISHED_TTL = 3600
+
+# Leftovers of an interrupted yt-dlp/ffmpeg run, named "<job id>_<title>..."
+PARTIAL_FILE = re.compile(
+    r'^(?P<job_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})_.*'
+    r'(\.part(-Frag\d+)?|\.ytdl|\.temp\.\w+|\.f\d[\w-]*\.\w+)$'
+)
+
+
+class JobJournal:
+    """Append-only log of job transitions, replayed when a worker starts.
+
+    Every record is one JSON line {'job_id', 'state', 'owner', 'at', ...}.
+    Records of one job are merged in order, so the last state and the latest
+    value of every field win (final states are never undone). Each worker
+    process holds a lock on its own owner file for as long as it lives; on
+    startup `recover` claims the unfinished jobs of owners that are gone, so
+    with several gunicorn workers each interrupted job is resumed exactly once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.owner = uuid.uuid4().hex
+        self._owners_dir = path + '.owners'
+        self._lock = threading.Lock()
+        os.makedirs(self._owners_dir, exist_ok=True)
+        self._owner_file = open(os.path.join(self._owners_dir, self.owner), 'w')
+        if fcntl:
+            fcntl.flock(self._owner_file, fcntl.LOCK_EX)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        # Appends share the lock; replay and compaction take it exclusively
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def record(self, job_id, state, **fields):
+        line = json.dumps(dict(fields, job_id=job_id, state=state, owner=self.owner, at=time.time()))
+        with self._lock, self._file_lock(exclusive=False):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _replay(self):
+        jobs = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn write of a crashed process
+                    job = jobs.setdefault(entry['job_id'], {})
+                    if job.get('state') in FINAL_STATES:
+                        continue
+                    job.update(entry)
+        except OSError:
+            pass
+        return jobs
+
+    def _owner_alive(self, owner):
+        if owner == self.owner:
+            return True
+        path = os.path.join(self._owners_dir, owner)
+        if fcntl is None:
+            return False
+        try:
+            with open(path, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+
+    def recover(self, now=None):
+        """Replays the journal once at startup.
+
+        Returns (jobs, claimed): every job still in the journal by job id, and
+        the ids of unfinished jobs of dead workers, now owned by this one.
+        Finished jobs older than FINISHED_TTL are dropped and the file is
+        rewritten without them.
+        """
+        now = time.time() if now is None else now
+        with self._lock, self._file_lock(exclusive=True):
+            jobs = {job_id: job for job_id, job in self._replay().items()
+                    if job['state'] not in FINAL_STATES or job['at'] + FINISHED_TTL > now}
+            alive = {}
+            claimed = []
+            for job_id, job in jobs.items():
+                if job['state'] in FINAL_STATES:
+                    continue
+                if job['owner'] not in alive:
+                    alive[job['owner']] = self._owner_alive(job['owner'])
+                if not alive[job['owner']]:
+                    job['owner'] = self.owner
+                    claimed.append(job_id)
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for job in jobs.values():
+                    f.write(json.dumps(job) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            return jobs, claimed
+
+
+def reclaim_partials(folder, jobs, min_age=60, now=None):
+    """Deletes partial files in folder whose job is gone or finished.
+
+    Files of jobs that are still running (or being resumed) are kept, since
+    yt-dlp continues from them; so are files modified in the last min_age
+    seconds. Returns the number of bytes and files freed.
+    """
+    now = time.time() if now is None else now
+    freed = files = 0
+    for name in os.listdir(folder):
+        match = PARTIAL_FILE.match(name)
+        if not match:
+            continue
+        job = jobs.get(match.group('job_id'))
+        if job and job['state'] not in FINAL_STATES:
+            continue
+        path = os.path.join(folder, name)
+        try:
+            st = os.stat(path)
+            if st.st_mtime + min_age > now:
+                continue
+            os.remove(path)
+            freed += st.st_size
+            files += 1
+        except OSError:
+            pass
+    return freed, files
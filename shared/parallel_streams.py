@@ -0,0 +1,66 @@
+import os
+import threading
+
+from tuning import connection_budget
+
+
+def fetch_streams_parallel(ydl, info, progress=None):
+    """Downloads the separate streams of a merged format selection concurrently.
+
+    yt-dlp fetches the video and the audio stream one after the other. This
+    fetches them at the same time, under the file names yt-dlp gives them, so a
+    following `ydl.process_ie_result(info, download=True)` finds both already
+    on disk and starts the merge straight away. `info` is modified by format
+    selection; pass a copy. Returns False when there is nothing to fetch
+    separately (a single format, or a downloader that merges by itself) or
+    no connection of tuning.connection_budget is free for each stream.
+    """
+    # Imported here so importing this module doesn't load yt-dlp
+    import yt_dlp
+    from yt_dlp.downloader import get_suitable_downloader
+    from yt_dlp.utils import prepend_extension
+
+    selected = ydl.process_ie_result(info, download=False)
+    formats = selected.get('requested_formats') or []
+    if len(formats) < 2 or get_suitable_downloader(dict(selected), ydl.params) is not None:
+        return False
+
+    base = os.path.splitext(ydl.prepare_filename(selected, 'temp'))[0]
+    # Each stream gets an equal share of the job's fragment connections
+    params = dict(ydl.params, concurrent_fragment_downloads=max(
+        1, ydl.params.get('concurrent_fragment_downloads', 1) // len(formats)))
+    errors = []
+
+    def fetch(fmt, filename):
+        stream_info = dict(selected)
+        del stream_info['requested_formats']
+        stream_info.update(fmt)
+        try:
+            with yt_dlp.YoutubeDL(params) as stream_ydl:
+                success, _ = stream_ydl.dl(filename, stream_info)
+            if not success:
+                errors.append(Exception(f"Download of format {fmt['format_id']} failed"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = []
+    for fmt in formats:
+        filename = prepend_extension(f"{base}.{fmt['ext']}", f"f{fmt['format_id']}", fmt['ext'])
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        if progress is not None:
+            progress.expect(filename, fmt.get('filesize') or fmt.get('filesize_approx'))
+        threads.append(threading.Thread(target=fetch, args=(fmt, filename), daemon=True))
+    # Every stream holds at least one connection while they run together. A job
+    # that can't get them without waiting leaves the streams to yt-dlp, one
+    # after the other (waiting while holding its own could deadlock)
+    granted = ydl.params.get('concurrent_fragment_downloads') or 1
+    with connection_budget.top_up(granted, len(formats)) as extra:
+        if granted + extra < len(formats):
+            return False
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return True
@@ -0,0 +1,45 @@
+import os
+import mimetypes
+from urllib.parse import quote
+from flask import request, send_file, current_app
+
+# When nginx fronts the app, set X_ACCEL_REDIRECT_PREFIX to an `internal`
+# location aliased to the downloads folder and nginx sends the file itself.
+# For Apache/lighttpd set the app's USE_X_SENDFILE config instead.
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+
+
+def content_disposition(download_name):
+    fallback = download_name.encode('ascii', 'ignore').decode().replace('"', '') or 'download'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(download_name)}"
+
+
+def send_download(path, download_name, root):
+    """Serves a finished download with Range, If-Range, ETag and HEAD support.
+
+    The body is sent without copying through Python wherever possible: by the
+    fronting proxy (X-Accel-Redirect / X-Sendfile), or by the WSGI server's
+    file_wrapper (gunicorn uses sendfile(2)), also for 206 partial responses.
+    """
+    if X_ACCEL_REDIRECT_PREFIX:
+        response = current_app.response_class(mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+        relpath = os.path.relpath(path, root).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(relpath)
+        response.headers['Content-Disposition'] = content_disposition(download_name)
+        return response
+
+    response = send_file(path, as_attachment=True, download_name=download_name,
+                         conditional=True, etag=True)
+
+    # werkzeug streams ranges through a Python wrapper; hand the server a file
+    # positioned at the range start instead, with Content-Length already set.
+    # Only gunicorn stops at Content-Length; other servers would send the
+    # file to its end
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if response.status_code == 206 and file_wrapper is not None and not current_app.config['USE_X_SENDFILE'] \
+            and request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn/'):
+        f = open(path, 'rb')
+        f.seek(response.content_range.start)
+        response.response.close()
+        response.response = file_wrapper(f)
+    return response
@@ -0,0 +1,86 @@
+"""Copies the modules in shared/ into the apps that use them.
+
+backend/, VladPos_YT_Downloader/ and python_desktop/ are each deployed from
+their own folder (Render's root directory, the PyInstaller build of the desktop
+app), so they can't import a package that lives next to them. Each app keeps a
+copy of the modules it needs instead, generated from the one source here: edit
+the module in shared/, then run
+
+    python shared/sync.py           # rewrites the copies
+    python shared/sync.py --check   # lists copies that differ, exit code 1
+
+shared/tests runs the check, so a copy edited by hand fails the tests.
+"""
+import os
+import sys
+import argparse
+
+SHARED_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SHARED_DIR)
+
+BACKEND = 'backend'
+VLADPOS = 'VladPos_YT_Downloader'
+DESKTOP = 'python_desktop'
+# Module -> apps that get a copy of it
+MODULES = {
+    'ffmpeg_registry': (BACKEND, VLADPOS, DESKTOP),
+    'info_cache': (BACKEND, VLADPOS, DESKTOP),
+    'pipe_merge': (BACKEND, VLADPOS, DESKTOP),
+    'tuning': (BACKEND, VLADPOS, DESKTOP),
+    'ydl_pool': (BACKEND, VLADPOS, DESKTOP),
+    'progress': (BACKEND, VLADPOS, DESKTOP),
+    'parallel_streams': (BACKEND, DESKTOP),
+    'journal': (BACKEND, VLADPOS),
+    'scheduler': (BACKEND, VLADPOS),
+    'storage': (BACKEND, VLADPOS),
+    'zip_stream': (BACKEND, VLADPOS),
+    'events': (BACKEND, VLADPOS),
+    'serving': (BACKEND, VLADPOS),
+}
+HEADER = "# Copied from shared/{name}.py by shared/sync.py: edit that file, not this copy\n"
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8', newline='') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def expected(name):
+    """Contents of an app's copy of a shared module."""
+    return HEADER.format(name=name) + _read(os.path.join(SHARED_DIR, f'{name}.py'))
+
+
+def copies():
+    """(module name, path) of every copy."""
+    for name, apps in MODULES.items():
+        for app in apps:
+            yield name, os.path.join(ROOT, app, f'{name}.py')
+
+
+def stale():
+    """Paths of copies that are missing or differ from their shared module."""
+    return [path for name, path in copies() if _read(path) != expected(name)]
+
+
+def sync():
+    """Rewrites the stale copies; returns their paths."""
+    paths = stale()
+    for name, path in copies():
+        if path in paths:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(expected(name))
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--check', action='store_true', help="only list the copies that differ")
+    args = parser.parse_args()
+    paths = stale() if args.check else sync()
+    for path in paths:
+        print(os.path.relpath(path, ROOT))
+    if args.check and paths:
+        sys.exit(1)
@@ -0,0 +1,27 @@
+import os
+
+# Event stream of one job, by app folder
+EVENTS_PATH = {'backend': '/events/missing', 'VladPos_YT_Downloader': '/api/events/missing'}
+
+
+def test_event_streams_past_the_limit_get_503(web_app, monkeypatch):
+    app = web_app
+    monkeypatch.setattr(app, 'stream_limit', app.StreamLimit(2))
+    client = app.app.test_client()
+    path = EVENTS_PATH[os.path.basename(os.path.dirname(app.__file__))]
+
+    open_streams = [client.get(path) for _ in range(2)]
+    assert [r.status_code for r in open_streams] == [200, 200]
+    refused = client.get(path)
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After']
+
+    open_streams[0].close()
+    assert client.get(path).status_code == 200
+
+
+def test_stream_limit_leaves_threads_for_other_requests(web_app, monkeypatch):
+    monkeypatch.delenv('SSE_MAX_STREAMS', raising=False)
+    assert [web_app.max_streams(threads) for threads in (1, 4, 8, 16, 32)] == [1, 2, 6, 12, 24]
+    monkeypatch.setenv('SSE_MAX_STREAMS', '3')
+    assert web_app.max_streams(16) == 3
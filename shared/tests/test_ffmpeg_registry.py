@@ -0,0 +1,109 @@
+import os
+import sys
+
+import pytest
+
+from ffmpeg_registry import FFmpeg, FFmpegRegistry, audio_postprocessor, best_audio_format
+
+ALL_MUXERS = {'ipod', 'mp4', 'opus', 'ogg', 'mp3', 'flac'}
+COPY = {'key': 'FFmpegExtractAudio', 'preferredcodec': 'best'}
+MP3 = {'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '128'}
+
+# Answers like ffmpeg does, appending each call to calls.log
+FAKE_FFMPEG = '''#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+case "$2" in
+  -version) echo "ffmpeg version 6.1-test Copyright";;
+  -muxers) printf ' Formats:\\n --\\n  E ipod  iPod\\n  E mp3   MP3\\n';;
+  -encoders) printf 'Encoders:\\n ------\\n A..... aac  AAC\\n';;
+esac
+'''
+
+
+def ffmpeg(muxers=ALL_MUXERS, encoders=('libmp3lame',)):
+    return FFmpeg('/usr/bin/ffmpeg', '/usr/bin/ffprobe', '6.0', set(muxers), set(encoders))
+
+
+def audio(ext, acodec, abr):
+    return {'format_id': f'{acodec}-{abr}', 'ext': ext, 'acodec': acodec, 'vcodec': 'none', 'abr': abr}
+
+
+@pytest.mark.parametrize('source', [
+    audio('webm', 'opus', 160),
+    audio('webm', 'opus', 48),
+    audio('m4a', 'mp4a.40.2', 129),
+    audio('m4a', 'mp4a.40.5', 48),
+])
+def test_auto_copies_sources_above_and_below_the_bitrate(source):
+    assert audio_postprocessor(ffmpeg(), 'auto', 128, source) == COPY
+
+
+def test_auto_reencodes_only_what_ffmpeg_cant_write_as_it_is():
+    no_opus = ffmpeg(ALL_MUXERS - {'opus'})
+    assert audio_postprocessor(no_opus, 'auto', 128, audio('webm', 'opus', 160)) == MP3
+    # m4a files are kept untouched, no muxer needed
+    assert audio_postprocessor(ffmpeg(set()), 'auto', 128, audio('m4a', 'mp4a.40.2', 48)) == COPY
+    # A codec FFmpegExtractAudio can't copy, and without an MP3 encoder a copy anyway
+    assert audio_postprocessor(ffmpeg(), 'auto', 128, audio('webm', 'ec-3', 384)) == MP3
+    assert audio_postprocessor(ffmpeg(encoders=()), 'auto', 128, audio('webm', 'ec-3', 384)) == COPY
+
+
+def test_explicit_formats():
+    source = audio('webm', 'opus', 48)
+    assert audio_postprocessor(ffmpeg(), 'mp3', 128, source) == MP3
+    assert audio_postprocessor(ffmpeg(), 'original', 128, source) == COPY
+    assert audio_postprocessor(None, 'mp3', 128, source) is None
+    with pytest.raises(ValueError):
+        audio_postprocessor(ffmpeg(), 'flac', 128, source)
+
+
+def test_best_audio_format_skips_video():
+    formats = [audio('m4a', 'mp4a.40.2', 129), audio('webm', 'opus', 160),
+               {'format_id': '18', 'ext': 'mp4', 'acodec': 'mp4a.40.2', 'vcodec': 'avc1', 'abr': 192}]
+    assert best_audio_format({'formats': formats})['format_id'] == 'opus-160'
+    assert best_audio_format({'formats': formats[2:]}) is None
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    if sys.platform == 'win32':
+        pytest.skip("the fake ffmpeg is a shell script")
+    path = tmp_path / 'ffmpeg'
+    path.write_text(FAKE_FFMPEG)
+    path.chmod(0o755)
+    return path
+
+
+def probes(ffmpeg):
+    log = ffmpeg.parent / 'calls.log'
+    return log.read_text().count('-version') if log.exists() else 0
+
+
+def test_ffmpeg_is_probed_once(fake_ffmpeg):
+    registry = FFmpegRegistry([str(fake_ffmpeg.parent / 'missing'), str(fake_ffmpeg)])
+    found = registry.get()
+    assert (found.version, found.can_mux('ipod'), found.can_encode('aac')) == ('6.1-test', True, True)
+    assert registry.get() is found and registry.location == str(fake_ffmpeg)
+    assert probes(fake_ffmpeg) == 1
+
+
+def test_changed_binary_or_invalidate_probes_again(fake_ffmpeg):
+    registry = FFmpegRegistry([str(fake_ffmpeg)])
+    registry.get()
+    registry.invalidate()
+    registry.get()
+    assert probes(fake_ffmpeg) == 2
+    fake_ffmpeg.write_text(FAKE_FFMPEG + '# updated\n')
+    registry.get()
+    assert probes(fake_ffmpeg) == 3
+
+
+def test_no_ffmpeg_is_remembered_until_invalidated(fake_ffmpeg, tmp_path):
+    missing = tmp_path / 'bin' / 'ffmpeg'
+    registry = FFmpegRegistry([str(missing)])
+    assert registry.get() is None
+    missing.parent.mkdir()
+    os.replace(fake_ffmpeg, missing)
+    assert registry.get() is None
+    registry.invalidate()
+    assert registry.get().path == str(missing)
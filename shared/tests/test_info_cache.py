@@ -0,0 +1,16 @@
+from info_cache import cache_key
+
+
+def test_playlist_urls_get_their_own_key():
+    video = cache_key('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+    in_list = cache_key('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf')
+    other_list = cache_key('https://www.youtube.com/watch?list=PLx0sYbCqOb8TBPRdmBHs5Iftvv9TPboYG&v=dQw4w9WgXcQ')
+    assert len({video, in_list, other_list}) == 3
+    assert cache_key('https://youtu.be/dQw4w9WgXcQ?list=PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf') == in_list
+
+
+def test_other_parameters_share_the_video_key():
+    video = cache_key('dQw4w9WgXcQ')
+    assert cache_key('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s') == video
+    assert cache_key('https://youtu.be/dQw4w9WgXcQ') == video
+    assert cache_key('dQw4w9WgXcQ', {'youtube': {'player_client': ['ios']}}) != video
@@ -0,0 +1,26 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.mark.parametrize('app_dir, module', [
+    ('backend', 'app'),
+    ('backend', 'asgi'),
+    ('VladPos_YT_Downloader', 'app'),
+    ('python_desktop', 'downloader'),
+])
+def test_entry_modules_start_without_yt_dlp(app_dir, module, tmp_path):
+    if module == 'asgi':
+        pytest.importorskip('fastapi')
+    # yt-dlp is loaded on first use (or by preload_yt_dlp), not at import
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, app_dir), PRELOAD_YT_DLP='0',
+               DOWNLOAD_DIR=str(tmp_path / 'downloads'))
+    for name in ('JOB_JOURNAL_PATH', 'JOB_STORE', 'JOB_STORE_PATH', 'INFO_CACHE_DIR', 'JOB_EXECUTION'):
+        env.pop(name, None)
+    result = subprocess.run([sys.executable, '-c', f"import sys, {module}; print('yt_dlp' in sys.modules)"],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert result.stdout.splitlines()[-1:] == ['False'], result.stderr
@@ -0,0 +1,144 @@
+import io
+import os
+
+import pytest
+
+pytest.importorskip('yt_dlp')
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+
+import pipe_merge
+
+DATA = bytes(range(256)) * 64
+
+
+class Response:
+    """Serves DATA from the requested offset and fails after `fail_after` bytes."""
+
+    def __init__(self, start, fail_after=None):
+        self.status = 206
+        self.headers = {'Content-Range': f'bytes {start}-{len(DATA) - 1}/{len(DATA)}'}
+        self._body = io.BytesIO(DATA[start:])
+        self._left = fail_after
+
+    def read(self, n):
+        if self._left is not None:
+            if self._left == 0:
+                raise TransportError('connection reset')
+            n = min(n, self._left)
+            self._left -= n
+        return self._body.read(n)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeYDL:
+    def __init__(self, respond, **params):
+        self.params = params
+        self.requests = []
+        self.warnings = []
+        self._respond = respond
+
+    def urlopen(self, request):
+        start = int(request.headers.get('Range', 'bytes=0-')[len('bytes='):].split('-')[0])
+        self.requests.append(start)
+        return self._respond(start, len(self.requests))
+
+    def report_warning(self, message):
+        self.warnings.append(message)
+
+
+class Forbidden:
+    status = 403
+    reason = 'Forbidden'
+    headers = {}
+
+    def __init__(self, url):
+        self.url = url
+
+    def close(self):
+        pass
+
+
+def stream(ydl):
+    fmt = {'format_id': '140', 'url': 'http://media/audio', 'filesize': len(DATA)}
+    pipe = io.BytesIO()
+    pipe_merge._stream(ydl, fmt, pipe, lambda done, size: None)
+    return pipe.getvalue()
+
+
+def test_failures_after_progress_dont_use_up_the_retries(monkeypatch):
+    monkeypatch.setattr(pipe_merge, 'BLOCK_SIZE', 1024)
+    # Every response breaks off after 1 KB: far more failures than RETRIES,
+    # but each one brought data
+    ydl = FakeYDL(lambda start, n: Response(start, fail_after=1024))
+    assert stream(ydl) == DATA
+    assert len(ydl.requests) > pipe_merge.RETRIES + 1
+
+
+def test_failures_in_a_row_are_raised():
+    ydl = FakeYDL(lambda start, n: Response(start, fail_after=0))
+    with pytest.raises(TransportError):
+        stream(ydl)
+    assert len(ydl.requests) == pipe_merge.RETRIES + 1
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='piping needs inherited descriptors')
+def test_http_error_falls_back_to_the_usual_merge(tmp_path):
+    # Stands in for ffmpeg: reads both inputs to the end
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_text('#!/bin/sh\ncat > /dev/null\n')
+    ffmpeg.chmod(0o755)
+    formats = [
+        {'format_id': '137', 'ext': 'mp4', 'container': 'mp4_dash', 'protocol': 'https',
+         'url': 'http://media/video', 'vcodec': 'avc1', 'acodec': 'none', 'filesize': len(DATA)},
+        {'format_id': '140', 'ext': 'm4a', 'container': 'm4a_dash', 'protocol': 'https',
+         'url': 'http://media/audio', 'vcodec': 'none', 'acodec': 'mp4a', 'filesize': len(DATA)},
+    ]
+
+    class MergeYDL(FakeYDL):
+        def urlopen(self, request):
+            if request.url.endswith('audio'):
+                raise HTTPError(Forbidden(request.url))
+            return Response(0)
+
+        def process_ie_result(self, info, download=False):
+            return dict(info, requested_formats=formats)
+
+        def prepare_filename(self, info):
+            return str(tmp_path / 'video.mp4')
+
+    ydl = MergeYDL(None, ffmpeg_location=str(ffmpeg))
+    assert pipe_merge.merge_streams_piped(ydl, {'id': 'video'}) is None
+    assert 'HTTP Error 403' in ydl.warnings[0]
+    # The partly merged file is gone
+    assert os.listdir(tmp_path) == ['ffmpeg']
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='piping needs inherited descriptors')
+def test_full_budget_leaves_the_streams_to_the_usual_download(tmp_path, monkeypatch):
+    from tuning import ConnectionBudget
+
+    budget = ConnectionBudget(1, str(tmp_path / 'connections'))
+    monkeypatch.setattr(pipe_merge, 'connection_budget', budget)
+    formats = [
+        {'format_id': '137', 'ext': 'mp4', 'container': 'mp4_dash', 'protocol': 'https',
+         'url': 'http://media/video', 'vcodec': 'avc1', 'acodec': 'none'},
+        {'format_id': '140', 'ext': 'm4a', 'container': 'm4a_dash', 'protocol': 'https',
+         'url': 'http://media/audio', 'vcodec': 'none', 'acodec': 'mp4a'},
+    ]
+
+    class MergeYDL(FakeYDL):
+        def process_ie_result(self, info, download=False):
+            return dict(info, requested_formats=formats)
+
+        def prepare_filename(self, info):
+            return str(tmp_path / 'video.mp4')
+
+    ydl = MergeYDL(None, ffmpeg_location='/bin/true', concurrent_fragment_downloads=1)
+    with budget.lease(1):  # the job's own connection, the only one
+        assert pipe_merge.merge_streams_piped(ydl, {'id': 'video'}) is None
+    assert ydl.requests == []
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import glob
+import time
+import signal
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+MEDIA = os.urandom(2 * 1024 * 1024)
+
+# Starts the download through the app's API on the first run; on the restart
+# the journal resumes it. Streamed audio is kept as served, without ffmpeg
+WORKER = '''
+import sys, json, time
+import app
+client = app.app.test_client()
+start, status, payload, id_key = json.loads(sys.argv[2])
+if sys.argv[1] == 'start':
+    response = client.post(start, json=dict(payload, url=sys.argv[3]))
+    print(response.get_json()[id_key], flush=True)
+    time.sleep(60)
+else:
+    while client.get(status + sys.argv[3]).get_json().get('status') not in ('completed', 'error'):
+        time.sleep(0.1)
+    print(json.dumps(client.get(status + sys.argv[3]).get_json()), flush=True)
+'''
+
+# Per app: download route, status route, request body and the id it returns
+APIS = {
+    'backend': ('/download', '/status/', {'quality': '128kbps', 'mode': 'audio_only'}, 'session_id'),
+    'vladpos': ('/api/download', '/api/status/', {'type': 'audio', 'stream': True}, 'job_id'),
+}
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+APP_DIRS = {'backend': os.path.join(ROOT, 'backend'), 'vladpos': os.path.join(ROOT, 'VladPos_YT_Downloader')}
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Serves MEDIA slowly, honouring Range, and records the Range headers it gets."""
+    ranges = []
+
+    def do_GET(self):
+        start, end = 0, len(MEDIA) - 1
+        header = self.headers.get('Range')
+        if header:
+            self.ranges.append(header)
+            first, _, last = header[len('bytes='):].partition('-')
+            start, end = int(first), min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(MEDIA)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'audio/mp4')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        try:
+            for offset in range(start, end + 1, 32 * 1024):
+                self.wfile.write(MEDIA[offset:min(offset + 32 * 1024, end + 1)])
+                time.sleep(0.02)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def media_url():
+    MediaHandler.ranges = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/audio.m4a'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('app_name', APIS)
+def test_download_killed_partway_resumes_after_restart(app_name, tmp_path, media_url):
+    pytest.importorskip('yt_dlp')
+    # The backend keeps its files in DOWNLOAD_DIR, VladPos in ./downloads: the same folder here
+    download_dir = tmp_path / 'downloads'
+    env = dict(os.environ, PYTHONPATH=APP_DIRS[app_name], DOWNLOAD_DIR=str(download_dir),
+               FFMPEG_PATH=str(tmp_path / 'no-ffmpeg'), DOWNLOAD_CONNECTION_BUDGET_DIR=str(tmp_path / 'connections'))
+    for name in ('JOB_JOURNAL_PATH', 'JOB_STORE', 'JOB_STORE_PATH', 'INFO_CACHE_DIR', 'JOB_EXECUTION'):
+        env.pop(name, None)
+    api = json.dumps(APIS[app_name])
+
+    worker = subprocess.Popen([sys.executable, '-c', WORKER, 'start', api, media_url],
+                              cwd=tmp_path, env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        job_id = worker.stdout.readline().strip()
+        deadline = time.monotonic() + 30
+        while not any(os.path.getsize(path) > 256 * 1024
+                      for path in glob.glob(str(download_dir / '**' / '*.part'), recursive=True)):
+            assert worker.poll() is None and time.monotonic() < deadline
+            time.sleep(0.05)
+        worker.send_signal(signal.SIGKILL)
+    finally:
+        worker.kill()
+        worker.wait()
+        worker.stdout.close()
+
+    restarted = subprocess.run([sys.executable, '-c', WORKER, 'resume', api, job_id],
+                               cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    status = json.loads(restarted.stdout.splitlines()[-1])  # after yt-dlp's progress lines
+    assert status['status'] == 'completed', status
+    # The restart asked for the rest of the .part file, not the whole file again
+    assert any(not header.startswith('bytes=0-') for header in MediaHandler.ranges), MediaHandler.ranges
+    finished = [path for path in glob.glob(str(download_dir / '**' / '*'), recursive=True)
+                if os.path.isfile(path) and not path.endswith('.part')]
+    assert any(open(path, 'rb').read() == MEDIA for path in finished), finished
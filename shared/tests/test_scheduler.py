@@ -0,0 +1,67 @@
+import os
+import time
+import threading
+
+import pytest
+
+from scheduler import DownloadScheduler, QueueFull
+
+# Download route of each app, by app folder, and a request body it accepts
+DOWNLOAD = {
+    'backend': ('/download', {'quality': '128kbps', 'mode': 'audio_only'}),
+    'VladPos_YT_Downloader': ('/api/download', {'type': 'audio'}),
+}
+
+
+def start(scheduler, job_id, fn):
+    """Submits a job and waits until a worker has taken it off the queue."""
+    scheduler.submit(job_id, fn)
+    while scheduler.position(job_id) is not None:
+        time.sleep(0.01)
+
+
+def test_queued_jobs_run_by_priority_then_in_order():
+    scheduler = DownloadScheduler(slots=1, max_queue=3)
+    release = threading.Event()
+    ran = []
+    done = threading.Event()
+
+    def job(job_id):
+        if job_id == 'blocker':
+            release.wait(5)
+        ran.append(job_id)
+        if len(ran) == 4:
+            done.set()
+
+    start(scheduler, 'blocker', job)
+    scheduler.submit('video-1', job, priority=1)
+    scheduler.submit('video-2', job, priority=1)
+    scheduler.submit('audio', job, priority=0)
+    assert [scheduler.position(j) for j in ('audio', 'video-1', 'video-2')] == [1, 2, 3]
+    release.set()
+    assert done.wait(5)
+    assert ran == ['blocker', 'audio', 'video-1', 'video-2']
+
+
+def test_full_queue_raises_with_a_retry_estimate():
+    scheduler = DownloadScheduler(slots=2, max_queue=1)
+    release = threading.Event()
+    for job_id in ('a', 'b'):
+        start(scheduler, job_id, lambda job_id: release.wait(5))
+    scheduler.submit('c', lambda job_id: None)
+    with pytest.raises(QueueFull) as e:
+        scheduler.submit('d', lambda job_id: None)
+    # A place frees up about every average job duration / slots
+    assert e.value.retry_after == 30
+    release.set()
+
+
+def test_full_queue_answers_429_with_retry_after(web_app, monkeypatch):
+    def submit(*args, **kwargs):
+        raise web_app.QueueFull(7)  # the app's own copy of the class
+
+    monkeypatch.setattr(web_app.scheduler, 'submit', submit)
+    path, body = DOWNLOAD[os.path.basename(os.path.dirname(web_app.__file__))]
+    response = web_app.app.test_client().post(path, json=dict(body, url='https://www.youtube.com/watch?v=dQw4w9WgXcQ'))
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
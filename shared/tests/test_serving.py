@@ -0,0 +1,72 @@
+import os
+
+import pytest
+from flask import Flask
+from werkzeug.wsgi import FileWrapper
+
+import serving
+from serving import send_download, content_disposition
+
+DATA = os.urandom(64 * 1024)
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / 'song.m4a').write_bytes(DATA)
+    app = Flask(__name__)
+    app.config['USE_X_SENDFILE'] = False
+
+    @app.route('/file', methods=['GET'])
+    def download():
+        return send_download(str(tmp_path / 'song.m4a'), 'Песен.m4a', str(tmp_path))
+
+    return app.test_client()
+
+
+def test_whole_file_with_validators(client):
+    response = client.get('/file')
+    assert response.status_code == 200 and response.data == DATA
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag']
+    assert "filename*=UTF-8''%D0%9F%D0%B5%D1%81%D0%B5%D0%BD.m4a" in response.headers['Content-Disposition']
+
+
+@pytest.mark.parametrize('server', ['werkzeug/3.0', 'gunicorn/23.0'])
+def test_range_gets_206_with_just_that_part(client, server):
+    environ = {'wsgi.file_wrapper': FileWrapper, 'SERVER_SOFTWARE': server}
+    response = client.get('/file', headers={'Range': 'bytes=1000-1999'}, environ_overrides=environ)
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 1000-1999/{len(DATA)}'
+    assert response.headers['Content-Length'] == '1000'
+    if server.startswith('gunicorn/'):
+        # The file from the range start on, which gunicorn cuts at Content-Length
+        assert response.data == DATA[1000:]
+    else:
+        assert response.data == DATA[1000:2000]
+
+
+def test_if_range_resumes_only_the_same_file(client):
+    etag = client.get('/file').headers['ETag']
+    same = client.get('/file', headers={'Range': 'bytes=60000-', 'If-Range': etag})
+    assert same.status_code == 206 and same.data == DATA[60000:]
+    changed = client.get('/file', headers={'Range': 'bytes=60000-', 'If-Range': '"another-file"'})
+    assert changed.status_code == 200 and changed.data == DATA
+
+
+def test_unsatisfiable_range_and_head(client):
+    assert client.get('/file', headers={'Range': f'bytes={len(DATA)}-'}).status_code == 416
+    head = client.head('/file')
+    assert head.status_code == 200 and head.data == b''
+    assert head.headers['Content-Length'] == str(len(DATA))
+
+
+def test_proxy_sends_the_file_when_configured(client, monkeypatch):
+    monkeypatch.setattr(serving, 'X_ACCEL_REDIRECT_PREFIX', '/protected/')
+    response = client.get('/file')
+    assert response.headers['X-Accel-Redirect'] == '/protected/song.m4a'
+    assert response.data == b''
+
+
+def test_content_disposition_keeps_non_ascii_names():
+    assert content_disposition('Песен "1".m4a') == \
+        "attachment; filename=\" 1.m4a\"; filename*=UTF-8''%D0%9F%D0%B5%D1%81%D0%B5%D0%BD%20%221%22.m4a"
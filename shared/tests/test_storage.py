@@ -0,0 +1,38 @@
+import time
+import uuid
+import threading
+
+from storage import ExpiryScheduler, StorageJanitor
+
+
+def test_moved_deadlines_expire_in_their_new_order():
+    expired = []
+    done = threading.Event()
+
+    def on_expire(key):
+        expired.append(key)
+        if len(expired) == 3:
+            done.set()
+
+    expiry = ExpiryScheduler(on_expire)
+    now = time.time()
+    expiry.schedule('a', now + 0.1)
+    expiry.schedule('b', now + 0.2)
+    expiry.schedule('c', now + 0.3)
+    expiry.schedule('a', now + 0.4)  # later: the queued entry is re-queued when it comes due
+    expiry.schedule('c', now + 0.05)  # earlier: a new entry goes ahead of the others
+    expiry.schedule('d', now + 0.15)
+    expiry.cancel('d')
+    assert done.wait(5)
+    assert expired == ['c', 'b', 'a']
+    assert len(expiry) == 0
+
+
+def test_files_of_one_job(tmp_path):
+    job_id, other = str(uuid.uuid4()), str(uuid.uuid4())
+    for name in (f'{job_id}_Song.m4a.part', f'{job_id}_Song.m4a.ytdl', f'{other}_Song.m4a', 'cache'):
+        (tmp_path / name).write_bytes(b'x')
+    janitor = StorageJanitor(str(tmp_path), 1024)
+    assert sorted(janitor.files_of(job_id)) == [str(tmp_path / f'{job_id}_Song.m4a.part'),
+                                                str(tmp_path / f'{job_id}_Song.m4a.ytdl')]
+    assert janitor.files_of(str(uuid.uuid4())) == []
@@ -0,0 +1,6 @@
+import sync
+
+
+def test_app_copies_match_shared_modules():
+    # Fix with `python shared/sync.py` after editing the module in shared/
+    assert sync.stale() == []
@@ -0,0 +1,91 @@
+import os
+import sys
+import signal
+import threading
+import subprocess
+
+from tuning import ConnectionBudget
+
+SHARED_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_budgets_on_one_folder_share_the_connections(tmp_path):
+    # Two processes' budgets, as two gunicorn workers would have
+    first = ConnectionBudget(4, str(tmp_path))
+    second = ConnectionBudget(4, str(tmp_path))
+    with first.lease(3) as taken:
+        assert taken == 3
+        with second.lease(4) as rest:
+            assert rest == 1
+
+
+def test_release_wakes_a_waiting_job(tmp_path):
+    budget = ConnectionBudget(1, str(tmp_path))
+    got = []
+    with budget.lease(1):
+        waiter = threading.Thread(target=lambda: got.append(budget.acquire(1)))
+        waiter.start()
+        waiter.join(0.5)
+        assert waiter.is_alive()
+    waiter.join(5)
+    assert got == [[0]]
+
+
+def test_connections_of_a_killed_process_are_freed(tmp_path):
+    holder = subprocess.Popen(
+        [sys.executable, '-c',
+         'import sys, time; from tuning import ConnectionBudget; '
+         'budget = ConnectionBudget(2, sys.argv[1]); budget.acquire(2); '
+         'print("held", flush=True); time.sleep(60)',
+         str(tmp_path)],
+        cwd=SHARED_DIR, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'held'
+        budget = ConnectionBudget(2, str(tmp_path))
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(budget.acquire(2)), daemon=True)
+        waiter.start()
+        waiter.join(0.5)
+        assert waiter.is_alive()
+        holder.send_signal(signal.SIGKILL)
+        waiter.join(5)
+        assert got and len(got[0]) == 2
+    finally:
+        holder.kill()
+        holder.wait()
+        holder.stdout.close()
+
+
+def test_top_up_leases_only_what_is_missing(tmp_path):
+    budget = ConnectionBudget(3, str(tmp_path))
+    with budget.lease(1), budget.top_up(1, 2) as extra:
+        assert extra == 1
+        with budget.lease(3) as rest:
+            assert rest == 1
+    with budget.top_up(4, 2) as extra:
+        assert extra == 0
+
+
+def test_jobs_topping_up_a_full_budget_dont_deadlock(tmp_path):
+    # Every connection is held by a single-connection job that would like a
+    # second one for its other stream
+    budget = ConnectionBudget(4, str(tmp_path))
+    other_worker = ConnectionBudget(4, str(tmp_path))
+    extras = []
+    arrived = threading.Barrier(4)
+
+    def job(budget):
+        with budget.lease(1):
+            arrived.wait(5)
+            with budget.top_up(1, 2) as extra:
+                extras.append(extra)
+            arrived.wait(5)
+
+    jobs = [threading.Thread(target=job, args=(b,), daemon=True)
+            for b in (budget, budget, other_worker, other_worker)]
+    for thread in jobs:
+        thread.start()
+    for thread in jobs:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in jobs)
+    assert extras == [0, 0, 0, 0]
@@ -0,0 +1,46 @@
+import pytest
+
+from ydl_pool import YoutubeDLPool, extract_options
+
+
+class FakeYoutubeDL:
+    def __init__(self, params):
+        self.params = params
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    yt_dlp = pytest.importorskip('yt_dlp')
+    monkeypatch.setattr(yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    return YoutubeDLPool(max_idle=2)
+
+
+def test_sessions_are_reused_per_profile(pool):
+    with pool.session({'quiet': True}) as first:
+        pass
+    with pool.session({'quiet': True}) as again:
+        assert again is first
+        # Busy sessions are not handed out twice
+        with pool.session({'quiet': True}) as concurrent:
+            assert concurrent is not first
+    with pool.session({'quiet': True, 'proxy': 'http://proxy'}) as other:
+        assert other is not first
+    assert pool.stats() == {'idle': 2, 'profiles': 2, 'created': 3, 'reused': 1}
+
+
+def test_least_recently_used_profile_is_closed_past_max_idle(pool):
+    sessions = []
+    for proxy in ('a', 'b', 'c'):
+        with pool.session({'proxy': proxy}) as ydl:
+            sessions.append(ydl)
+    assert [ydl.closed for ydl in sessions] == [True, False, False]
+    assert pool.stats()['idle'] == 2
+
+
+def test_download_only_options_dont_split_the_profiles():
+    opts = {'quiet': True, 'outtmpl': 'x.%(ext)s', 'format': 'bestaudio', 'progress_hooks': [print]}
+    assert extract_options(opts) == {'quiet': True}
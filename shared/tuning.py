@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the budget covers this process only
+    fcntl = None
+
+# Fragments (DASH/HLS) one job fetches in parallel at most
+CONCURRENT_FRAGMENTS = int(os.environ.get('DOWNLOAD_CONCURRENT_FRAGMENTS', 4))
+# Connections all jobs on this machine may hold together, whichever gunicorn
+# worker or worker process runs them
+CONNECTION_BUDGET = int(os.environ.get('DOWNLOAD_CONNECTION_BUDGET', 16))
+# Lock files of the budget; processes using the same folder share it
+CONNECTION_BUDGET_DIR = (os.environ.get('DOWNLOAD_CONNECTION_BUDGET_DIR')
+                         or os.path.join(tempfile.gettempdir(), 'yt-downloader-connections'))
+# How often a job waiting for connections held by other processes looks again
+RETRY_INTERVAL = 0.2
+# Progressive files are requested in ranges of this size; YouTube throttles
+# single requests for a whole large file
+HTTP_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_HTTP_CHUNK_MB', 10)) * 1024 * 1024
+# Initial read buffer; yt-dlp grows it up to the chunk size on fast links
+BUFFER_SIZE = 1024 * 1024
+
+
+class ConnectionBudget:
+    """Connections shared by every download on this machine.
+
+    A job asks for up to CONCURRENT_FRAGMENTS connections and gets whatever is
+    free (at least one, waiting if none is), so parallel jobs together never
+    exceed the budget. Each connection is an exclusive lock on one of `total`
+    files in lock_dir: every process using that folder (gunicorn workers, the
+    worker processes of JOB_EXECUTION=process) draws from the same budget, and
+    the locks of a process that dies are released with it. Without lock_dir,
+    or without fcntl (Windows), the budget covers this process only.
+    """
+
+    def __init__(self, total, lock_dir=None):
+        self.total = max(1, total)
+        self.lock_dir = lock_dir if fcntl else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._free = list(range(self.total))  # slots no thread of this process holds
+        self._files = {}  # slot -> its locked file
+        self._cond = threading.Condition()
+
+    def _try_lock(self, slot):
+        """Locks a slot's file; False while another process holds it."""
+        if not self.lock_dir:
+            return True
+        f = open(os.path.join(self.lock_dir, f'slot-{slot}'), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._files[slot] = f
+        return True
+
+    def _take(self, wanted):
+        # Caller holds _cond
+        slots = []
+        for slot in list(self._free):
+            if len(slots) == wanted:
+                break
+            if self._try_lock(slot):
+                self._free.remove(slot)
+                slots.append(slot)
+        return slots
+
+    def acquire(self, wanted):
+        """Takes up to `wanted` connections, at least one; returns the slots to release."""
+        wanted = max(1, wanted)
+        with self._cond:
+            while True:
+                slots = self._take(wanted)
+                if slots:
+                    return slots
+                # Woken by a release in this process; other processes are polled
+                self._cond.wait(RETRY_INTERVAL if self.lock_dir else None)
+
+    def try_acquire(self, wanted):
+        """Takes up to `wanted` connections that are free right now, possibly none."""
+        with self._cond:
+            return self._take(wanted)
+
+    def release(self, slots):
+        with self._cond:
+            for slot in slots:
+                f = self._files.pop(slot, None)
+                if f:
+                    f.close()  # drops the lock
+                self._free.append(slot)
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, wanted=CONCURRENT_FRAGMENTS):
+        slots = self.acquire(wanted)
+        try:
+            yield len(slots)
+        finally:
+            self.release(slots)
+
+    @contextmanager
+    def top_up(self, granted, needed):
+        """Leases what a job holding `granted` connections lacks to open `needed` at once.
+
+        Never waits: a job waiting for more while it holds some could block
+        forever on jobs doing the same. Yields the number of connections
+        added, which may be too few; the job then opens its streams one
+        after another.
+        """
+        slots = self.try_acquire(needed - granted) if needed > granted else []
+        try:
+            yield len(slots)
+        finally:
+            self.release(slots)
+
+
+connection_budget = ConnectionBudget(CONNECTION_BUDGET, CONNECTION_BUDGET_DIR)
+
+
+def tuned_options(connections):
+    """yt-dlp options for a download allowed to use `connections` connections."""
+    return {
+        'concurrent_fragment_downloads': connections,
+        'http_chunk_size': HTTP_CHUNK_SIZE,
+        'buffersize': BUFFER_SIZE,
+    }
@@ -0,0 +1,61 @@
+import os
+import zipfile
+
+CHUNK = 1024 * 1024
+
+
+class _ZipSink:
+    """Write-only, unseekable file that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._parts = []
+        self._offset = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def unique_name(name, used):
+    """name, or "name (2).ext" etc. if an entry of that name is in the archive already."""
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{stem} ({n}){ext}"
+    used.add(candidate)
+    return candidate
+
+
+def stream_zip(files):
+    """Yields a ZIP archive of (name, path) pairs while it is being written.
+
+    Entries are stored uncompressed (audio and video are compressed already)
+    and `files` may be a generator that waits for downloads to finish, so the
+    client receives the first files while later ones are still downloading.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for name, path in files:
+            try:
+                src = open(path, 'rb')
+            except OSError:
+                continue  # removed in the meantime
+            with src, archive.open(name, 'w', force_zip64=True) as dest:
+                while chunk := src.read(CHUNK):
+                    dest.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()